@@ -5,15 +5,31 @@ import betterlogging as bl
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.fsm.storage.memory import MemoryStorage
-from aiogram.fsm.storage.redis import RedisStorage, DefaultKeyBuilder
 
+from infrastructure.api.cache import MemoryCache, RedisCache
+from infrastructure.api.resilience import CircuitBreaker
+from infrastructure.api.terminal import terminal_api
 from tgbot.config import load_config, Config
 from tgbot.handlers import routers_list
 from tgbot.middlewares.config import ConfigMiddleware
+from tgbot.middlewares.edit_batch import EditBatchMiddleware
+from tgbot.middlewares.fsm_buffer import FSMBufferMiddleware
+from tgbot.middlewares.ordering import CallbackDebounceMiddleware, ChatOrderMiddleware
+from tgbot.misc.callbacks import name_table
 from tgbot.services import broadcaster
+from tgbot.services.audit import audit_log, JsonlAuditSink, RedisAuditSink, TelegramAuditSink
+from tgbot.services.catalogue import customer_catalogue
+from tgbot.services.containers import active_containers
+from tgbot.services.file_ids import file_id_cache, RedisFileIdStore, SQLiteFileIdStore
+from tgbot.services.fsm_storage import create_redis, create_storage, migrate_legacy_keys
+from tgbot.services.outbox import registration_outbox, RedisOutboxStore, SQLiteOutboxStore
+from tgbot.supervisor import Supervisor, consume_updates
+from tgbot.webhook import run_webhook
 
 config = load_config(".env")
 bot = Bot(token=config.tg_bot.token, default=DefaultBotProperties(parse_mode='HTML'))
+# One connection pool for the FSM storage and every Redis-backed cache and queue.
+redis = create_redis(config.redis) if config.redis else None
 async def on_startup(bot: Bot, admin_ids: list[int]):
     await broadcaster.broadcast(bot, admin_ids, "Бот запущен!")
 
@@ -29,8 +45,15 @@ def register_global_middlewares(dp: Dispatcher, config: Config, session_pool=Non
     :param session_pool: Optional session pool object for the database using SQLAlchemy.
     :return: None
     """
+    # Double taps are dropped before they queue up behind the chat lock.
+    dp.callback_query.outer_middleware(CallbackDebounceMiddleware(config.misc.callback_debounce))
+
     middleware_types = [
         ConfigMiddleware(config),
+        # Must come before FSMBufferMiddleware, which starts from the state loaded under the lock.
+        ChatOrderMiddleware(),
+        FSMBufferMiddleware(),
+        EditBatchMiddleware(),
         # DatabaseMiddleware(session_pool),
     ]
 
@@ -65,6 +88,132 @@ def setup_logging():
     logger.info("Starting bot")
 
 
+def setup_terminal_api(dp: Dispatcher, config: Config):
+    """
+    Configure the shared terminal API client (pool, cache, timeouts and retries), the customer catalogue
+    and the active container index, and tie them to the dispatcher lifecycle.
+
+    :param dp: The dispatcher instance.
+    :param config: The configuration object from the loaded configuration.
+    :return: None
+    """
+    terminal_api.configure(
+        limit=config.terminal_api.limit,
+        limit_per_host=config.terminal_api.limit_per_host,
+        dns_cache_ttl=config.terminal_api.dns_cache_ttl,
+        keepalive_timeout=config.terminal_api.keepalive_timeout,
+    )
+    if redis:
+        cache = RedisCache(redis, max_size=config.terminal_api.cache_max_size,
+                           prefix=f"{config.redis.key_prefix}:terminal_cache")
+    else:
+        cache = MemoryCache(max_size=config.terminal_api.cache_max_size)
+    terminal_api.set_cache(
+        cache,
+        clients_ttl=config.terminal_api.clients_cache_ttl,
+        services_ttl=config.terminal_api.services_cache_ttl,
+        visits_ttl=config.terminal_api.visits_cache_ttl,
+    )
+    terminal_api.set_resilience(
+        connect_timeout=config.terminal_api.connect_timeout,
+        read_timeout=config.terminal_api.read_timeout,
+        upload_timeout=config.terminal_api.upload_timeout,
+        retries=config.terminal_api.retries,
+        backoff_base=config.terminal_api.backoff_base,
+        backoff_max=config.terminal_api.backoff_max,
+        breaker=CircuitBreaker(
+            failure_threshold=config.terminal_api.breaker_failure_threshold,
+            reset_timeout=config.terminal_api.breaker_reset_timeout,
+        ),
+    )
+    customer_catalogue.configure(
+        refresh_interval=config.terminal_api.catalogue_refresh_interval,
+        page_size=config.terminal_api.catalogue_page_size,
+    )
+    active_containers.configure(
+        refresh_interval=config.terminal_api.containers_refresh_interval,
+        page_size=config.terminal_api.containers_page_size,
+        max_age=config.terminal_api.containers_max_age,
+    )
+    dp.startup.register(terminal_api.startup)
+    dp.startup.register(customer_catalogue.start)
+    dp.startup.register(active_containers.start)
+    dp.shutdown.register(active_containers.stop)
+    dp.shutdown.register(customer_catalogue.stop)
+    dp.shutdown.register(terminal_api.shutdown)
+
+
+def setup_file_id_cache(config: Config):
+    """
+    Select the store that keeps Telegram file ids of container photos and documents.
+
+    :param config: The configuration object from the loaded configuration.
+    :return: None
+    """
+    if redis:
+        file_id_cache.set_store(RedisFileIdStore(redis, key=f"{config.redis.key_prefix}:telegram_file_ids"))
+    else:
+        file_id_cache.set_store(SQLiteFileIdStore(config.media.file_id_db_path))
+
+
+def setup_name_table(config: Config):
+    """
+    Keep the names referenced from callback data in Redis when it is enabled, so every process resolves them.
+
+    :param config: The configuration object from the loaded configuration.
+    :return: None
+    """
+    if redis:
+        name_table.set_cache(RedisCache(redis, max_size=100_000, prefix=f"{config.redis.key_prefix}:callback_names"))
+
+
+def setup_registration_outbox(dp: Dispatcher, config: Config):
+    """
+    Select the store of the container registration outbox and run its workers with the dispatcher.
+
+    :param dp: The dispatcher instance.
+    :param config: The configuration object from the loaded configuration.
+    :return: None
+    """
+    if redis:
+        store = RedisOutboxStore(redis, prefix=f"{config.redis.key_prefix}:outbox")
+    else:
+        store = SQLiteOutboxStore(config.outbox.db_path)
+    registration_outbox.configure(
+        store,
+        workers=config.outbox.workers,
+        max_attempts=config.outbox.max_attempts,
+        poll_interval=config.outbox.poll_interval,
+    )
+    # Registered after the terminal API startup, so the session is open before the first delivery.
+    # A delivery cut off at shutdown stays leased and is retried with the same idempotency key.
+    dp.startup.register(registration_outbox.start)
+    dp.shutdown.register(registration_outbox.stop)
+
+
+def setup_audit_log(dp: Dispatcher, config: Config):
+    """
+    Create the configured audit sinks and run the audit consumer with the dispatcher.
+
+    :param dp: The dispatcher instance.
+    :param config: The configuration object from the loaded configuration.
+    :return: None
+    """
+    sinks = []
+    if "telegram" in config.audit.sinks:
+        if config.audit.chat_id:
+            sinks.append(TelegramAuditSink(bot, config.audit.chat_id))
+        else:
+            logging.warning("Audit sink 'telegram' is enabled but AUDIT_CHAT_ID is not set")
+    if "jsonl" in config.audit.sinks:
+        sinks.append(JsonlAuditSink(config.audit.jsonl_path))
+    if "redis" in config.audit.sinks and redis:
+        sinks.append(RedisAuditSink(redis, key=f"{config.redis.key_prefix}:audit"))
+    audit_log.configure(sinks, batch_size=config.audit.batch_size, flush_interval=config.audit.flush_interval)
+    dp.startup.register(audit_log.start)
+    dp.shutdown.register(audit_log.stop)
+
+
 def get_storage(config):
     """
     Return storage based on the provided configuration.
@@ -76,30 +225,76 @@ def get_storage(config):
         Storage: The storage object based on the configuration.
 
     """
-    if config.tg_bot.use_redis:
-        return RedisStorage.from_url(
-            config.redis.dsn(),
-            key_builder=DefaultKeyBuilder(with_bot_id=True, with_destiny=True),
-        )
+    if redis:
+        return create_storage(redis, config.redis)
     else:
         return MemoryStorage()
 
 
-async def main():
-    setup_logging()
-
+async def create_dispatcher() -> Dispatcher:
+    """
+    Build the dispatcher with its storage, routers, middlewares and services.
 
+    :return: The dispatcher instance.
+    """
     storage = get_storage(config)
 
-
-    dp = Dispatcher(storage=storage)
+    if redis:
+        # Updates of one chat must not interleave even when they reach different bot processes.
+        dp = Dispatcher(storage=storage, events_isolation=storage.create_isolation())
+        await migrate_legacy_keys(redis, bot.id, config.redis)
+    else:
+        dp = Dispatcher(storage=storage)
 
     dp.include_routers(*routers_list)
 
     register_global_middlewares(dp, config)
+    setup_terminal_api(dp, config)
+    setup_file_id_cache(config)
+    setup_name_table(config)
+    setup_registration_outbox(dp, config)
+    setup_audit_log(dp, config)
+    return dp
+
+
+def run_worker(index: int, updates, processed):
+    """
+    Entry point of a supervisor worker process: handle the updates the supervisor routes to it.
+
+    :param index: Number of the worker.
+    :param updates: Queue the supervisor puts the updates of this worker in.
+    :param processed: Shared counter of handled updates.
+    :return: None
+    """
+    setup_logging()
+
+    async def serve():
+        dp = await create_dispatcher()
+        logging.info(f"Worker {index} started")
+        await consume_updates(dp, bot, updates, processed, config.webhook.max_concurrent_updates)
+        await bot.session.close()
+
+    asyncio.run(serve())
+
+
+async def main():
+    setup_logging()
+
+    if config.webhook.use_webhook and config.webhook.workers > 1:
+        if not redis:
+            raise RuntimeError("WEBHOOK_WORKERS > 1 needs USE_REDIS=true: workers share the FSM state through Redis")
+        await on_startup(bot, config.tg_bot.admin_ids)
+        await Supervisor(bot, config.webhook, run_worker, workers=config.webhook.workers).run()
+        return
+
+    dp = await create_dispatcher()
 
     await on_startup(bot, config.tg_bot.admin_ids)
-    await dp.start_polling(bot)
+    if config.webhook.use_webhook:
+        await run_webhook(dp, bot, config.webhook)
+    else:
+        await bot.delete_webhook()
+        await dp.start_polling(bot)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,108 @@
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+from urllib.parse import urlencode
+
+from redis.asyncio import Redis
+
+
+def make_key(endpoint: str, params: dict = None) -> str:
+    """Build a stable cache key from an endpoint and its query parameters."""
+    if not params:
+        return endpoint
+    return f"{endpoint}?{urlencode(sorted(params.items()))}"
+
+
+class BaseCache:
+    """Interface of the response caches used by TerminalAPI."""
+
+    async def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Any, ttl: int) -> None:
+        raise NotImplementedError
+
+    async def invalidate(self, prefix: str = "") -> int:
+        """Drop every entry whose key starts with prefix. Returns the number of dropped entries."""
+        raise NotImplementedError
+
+
+class MemoryCache(BaseCache):
+    """In-process cache with per-entry TTL and an LRU bound on the number of entries."""
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: int) -> None:
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def invalidate(self, prefix: str = "") -> int:
+        keys = [key for key in self._entries if key.startswith(prefix)]
+        for key in keys:
+            del self._entries[key]
+        return len(keys)
+
+
+class RedisCache(BaseCache):
+    """
+    Redis-backed cache shared between bot replicas.
+
+    Values are stored as JSON with a native Redis TTL. A sorted set of keys ordered by last access
+    keeps the number of entries within max_size, evicting the least recently used ones.
+    """
+
+    def __init__(self, redis: Redis, max_size: int = 1024, prefix: str = "terminal_cache"):
+        self.redis = redis
+        self.max_size = max_size
+        self.prefix = prefix
+        self._lru_key = f"{prefix}:__lru__"
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}:{key}"
+
+    async def get(self, key: str) -> Optional[Any]:
+        raw = await self.redis.get(self._key(key))
+        if raw is None:
+            return None
+        await self.redis.zadd(self._lru_key, {key: time.time()})
+        return json.loads(raw)
+
+    async def set(self, key: str, value: Any, ttl: int) -> None:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.set(self._key(key), json.dumps(value, ensure_ascii=False), ex=ttl)
+            pipe.zadd(self._lru_key, {key: time.time()})
+            pipe.zcard(self._lru_key)
+            *_, size = await pipe.execute()
+
+        if size > self.max_size:
+            evicted = await self.redis.zpopmin(self._lru_key, size - self.max_size)
+            if evicted:
+                await self.redis.delete(*(self._key(member.decode()) for member, _ in evicted))
+
+    async def invalidate(self, prefix: str = "") -> int:
+        keys = [key async for key in self.redis.scan_iter(match=f"{self._key(prefix)}*")
+                if key.decode() != self._lru_key]
+        if not keys:
+            return 0
+        members = [key.decode()[len(self.prefix) + 1:] for key in keys]
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.delete(*keys)
+            pipe.zrem(self._lru_key, *members)
+            await pipe.execute()
+        return len(keys)
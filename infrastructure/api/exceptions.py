@@ -0,0 +1,14 @@
+class TerminalAPIError(Exception):
+    """Base error of the terminal API client."""
+
+
+class TerminalAPIUnavailable(TerminalAPIError):
+    """The terminal API did not answer: timeouts, connection errors, 5xx after retries or an open circuit."""
+
+
+class TerminalAPIStatusError(TerminalAPIError):
+    """The terminal API answered, but with a status the client does not expect (auth, bad parameters)."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
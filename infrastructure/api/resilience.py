@@ -0,0 +1,77 @@
+import logging
+import random
+import time
+from typing import Optional
+
+from infrastructure.api.exceptions import TerminalAPIUnavailable
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Exponential backoff with full jitter for the given zero-based retry attempt."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """
+    Fails calls fast while the upstream is known to be down.
+
+    After failure_threshold consecutive failures the circuit opens and every call is rejected for
+    reset_timeout seconds. Then a single probe call is let through (half-open): success closes the
+    circuit, failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.rejected_calls = 0
+        self.times_opened = 0
+        self._probe_started: Optional[float] = None
+
+    def before_call(self) -> None:
+        """Raise TerminalAPIUnavailable if the call must not reach the upstream."""
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                self.rejected_calls += 1
+                raise TerminalAPIUnavailable("Circuit breaker is open")
+            self.state = self.HALF_OPEN
+
+        if self.state == self.HALF_OPEN:
+            now = time.monotonic()
+            # A probe that never reported back (e.g. cancelled) stops blocking after reset_timeout.
+            if self._probe_started is not None and now - self._probe_started < self.reset_timeout:
+                self.rejected_calls += 1
+                raise TerminalAPIUnavailable("Circuit breaker is half-open, probe in flight")
+            self._probe_started = now
+
+    def record_success(self) -> None:
+        if self.state != self.CLOSED:
+            logging.info("Terminal API circuit breaker closed")
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probe_started = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probe_started = None
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.times_opened += 1
+                logging.warning(f"Terminal API circuit breaker opened after {self.failures} failures")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def metrics(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "times_opened": self.times_opened,
+            "rejected_calls": self.rejected_calls,
+            "open_for_seconds": round(time.monotonic() - self.opened_at, 1) if self.state == self.OPEN else 0,
+        }
@@ -0,0 +1,53 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls with the same key into one upstream call.
+
+    The first caller starts the call as a task; everyone arriving while it is in flight awaits the
+    same task. Cancelling one caller does not cancel the shared call for the others.
+    """
+
+    def __init__(self):
+        self._calls: dict[str, asyncio.Task] = {}
+        self._callers: dict[str, int] = {}
+        self.upstream_calls = 0
+        self.coalesced_calls = 0
+        self.max_callers = 0
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            self._callers[key] = 1
+            self.upstream_calls += 1
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self._callers[key] += 1
+            self.coalesced_calls += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        if not task.cancelled():
+            # Mark the exception as retrieved in case every caller was cancelled meanwhile.
+            task.exception()
+        self._calls.pop(key, None)
+        callers = self._callers.pop(key, 1)
+        self.max_callers = max(self.max_callers, callers)
+        if callers > 1:
+            logging.debug(f"Single-flight request {key} served {callers} callers")
+
+    def metrics(self) -> dict:
+        return {
+            "upstream_requests": self.upstream_calls,
+            "coalesced_requests": self.coalesced_calls,
+            "avg_callers_per_request": round(
+                (self.upstream_calls + self.coalesced_calls) / self.upstream_calls, 2
+            ) if self.upstream_calls else None,
+            "max_callers_per_request": self.max_callers,
+            "in_flight": len(self._calls),
+        }
@@ -1,20 +1,193 @@
-from aiogram.client.session import aiohttp
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Optional
+
+import aiohttp
+
+from infrastructure.api.cache import BaseCache, MemoryCache, make_key
+from infrastructure.api.exceptions import TerminalAPIStatusError, TerminalAPIUnavailable
+from infrastructure.api.resilience import CircuitBreaker, backoff_delay
+from infrastructure.api.singleflight import SingleFlight
 
 
 class TerminalAPI:
     API_URL = "https://api.trains.uz/"
     PER_PAGE = 8
+    # Read timeouts (seconds) of endpoints known to be slower than the default one.
+    SLOW_ENDPOINTS = {
+        "customers/list/": 30.0,
+        "containers/containers_visit_list/": 20.0,
+        "containers/container_visit_statistics/": 20.0,
+    }
+
+    def __init__(self, limit: int = 100, limit_per_host: int = 30,
+                 dns_cache_ttl: int = 300, keepalive_timeout: float = 30.0,
+                 cache: Optional[BaseCache] = None, clients_cache_ttl: int = 300, services_cache_ttl: int = 300,
+                 visits_cache_ttl: int = 30):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.cache = cache if cache is not None else MemoryCache()
+        self.clients_cache_ttl = clients_cache_ttl
+        self.services_cache_ttl = services_cache_ttl
+        self.visits_cache_ttl = visits_cache_ttl
+        self.single_flight = SingleFlight()
+        self.breaker = CircuitBreaker()
+        self.connect_timeout = 5.0
+        self.read_timeout = 15.0
+        self.upload_timeout = 120.0
+        self.retries = 2
+        self.backoff_base = 0.5
+        self.backoff_max = 5.0
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def configure(self, limit: int, limit_per_host: int, dns_cache_ttl: int, keepalive_timeout: float):
+        """Set connection pool limits. Takes effect the next time the session is opened."""
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+
+    def set_cache(self, cache: BaseCache, clients_ttl: int, services_ttl: int, visits_ttl: int):
+        """Replace the listing cache backend and its TTLs (in seconds, 0 disables caching)."""
+        self.cache = cache
+        self.clients_cache_ttl = clients_ttl
+        self.services_cache_ttl = services_ttl
+        self.visits_cache_ttl = visits_ttl
+
+    def set_resilience(self, connect_timeout: float, read_timeout: float, upload_timeout: float,
+                       retries: int, backoff_base: float, backoff_max: float, breaker: CircuitBreaker):
+        """Set request timeouts, the retry policy for idempotent requests and the circuit breaker."""
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.upload_timeout = upload_timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker
+
+    async def invalidate_cache(self, endpoint: str = "") -> int:
+        """Drop cached listings for endpoints starting with the given path, e.g. "customers/"."""
+        return await self.cache.invalidate(endpoint)
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """Shared keep-alive session, opened lazily on first use."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                ttl_dns_cache=self.dns_cache_ttl,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def startup(self) -> None:
+        """Open the shared session. Registered on the dispatcher startup."""
+        _ = self.session
+
+    async def shutdown(self) -> None:
+        """Close the shared session and its pooled connections."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def fetch_data(self, url: str, params: dict = None, cache_ttl: int = 0) -> tuple[list, int]:
+        key = make_key(url.removeprefix(self.API_URL), params)
+        if cache_ttl:
+            cached = await self.cache.get(key)
+            if cached is not None:
+                results, count = cached
+                return results, count
+
+        data = await self._get_json(url, params)
+        if data is None:
+            return [], 0
+        results, count = data.get('results', []), data.get('count', 0)
+        if cache_ttl:
+            await self.cache.set(key, [results, count], cache_ttl)
+        return results, count
+
+    async def _get_json(self, url: str, params: dict = None) -> Optional[Any]:
+        """GET a JSON body, sharing one upstream request between identical concurrent calls."""
+        return await self.single_flight.do(make_key(url, params), lambda: self._request_json(url, params))
+
+    async def _request_json(self, url: str, params: dict = None) -> Optional[Any]:
+        """
+        The JSON body of a 200 answer, or None for a 404, which reads as "nothing there".
+        Raises TerminalAPIStatusError for any other status, so that it is not mistaken for an empty listing.
+        """
+        status, body = await self._request("GET", url, retry=True, params=params)
+        if status == 200:
+            return body
+        if status == 404:
+            return None
+        logging.error(f"GET {url} answered HTTP {status}: {body}")
+        raise TerminalAPIStatusError(status, f"GET {url} answered HTTP {status}")
 
-    async def fetch_data(self, url: str, params: dict = None) -> tuple[list, int]:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, params=params) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    return data.get('results', []), data.get('count', 0)
-        return [], 0
+    def _timeout(self, url: str, upload: bool) -> aiohttp.ClientTimeout:
+        if upload:
+            read_timeout = self.upload_timeout
+        else:
+            path = url.removeprefix(self.API_URL)
+            read_timeout = max([self.read_timeout] + [timeout for endpoint, timeout in self.SLOW_ENDPOINTS.items()
+                                                      if path.startswith(endpoint)])
+        return aiohttp.ClientTimeout(total=None, connect=self.connect_timeout, sock_read=read_timeout)
+
+    async def _request(self, method: str, url: str, retry: bool, upload: bool = False,
+                       **kwargs) -> tuple[int, Any]:
+        """
+        Send a request through the circuit breaker and return its status and JSON body.
+
+        Connection errors, timeouts and 5xx answers count as failures and are retried with jittered
+        exponential backoff when retry is set, which callers only do for idempotent requests.
+        Raises TerminalAPIUnavailable when no usable answer was received.
+        """
+        attempts = self.retries + 1 if retry else 1
+        error = None
+        for attempt in range(attempts):
+            self.breaker.before_call()
+            try:
+                async with self.session.request(method, url, timeout=self._timeout(url, upload), **kwargs) as resp:
+                    status = resp.status
+                    try:
+                        body = await resp.json(content_type=None)
+                    except ValueError:
+                        body = None
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = repr(e)
+            else:
+                if status < 500:
+                    self.breaker.record_success()
+                    return status, body
+                error = f"HTTP {status}"
+
+            self.breaker.record_failure()
+            if attempt + 1 < attempts:
+                delay = backoff_delay(attempt, self.backoff_base, self.backoff_max)
+                logging.warning(f"{method} {url} failed ({error}), retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+        logging.error(f"{method} {url} failed after {attempts} attempt(s): {error}")
+        raise TerminalAPIUnavailable(f"{method} {url} failed: {error}")
+
+    async def iter_pages(self, url: str, params: dict = None, page_size: int = 100) -> AsyncIterator[list]:
+        """Walk a paginated listing page by page, bypassing the cache."""
+        offset = 0
+        while True:
+            results, count = await self.fetch_data(url, params={**(params or {}), 'offset': offset, 'limit': page_size})
+            if not results:
+                return
+            yield results
+            offset += len(results)
+            if offset >= count:
+                return
 
     async def get_clients(self, offset: int, limit: int) -> tuple[list, int]:
-        return await self.fetch_data(f"{self.API_URL}customers/list/", params={'offset': offset, 'limit': limit})
+        return await self.fetch_data(f"{self.API_URL}customers/list/", params={'offset': offset, 'limit': limit},
+                                     cache_ttl=self.clients_cache_ttl)
 
     async def get_services(self, offset: int, limit: int,
                            customer_id: int,
@@ -28,7 +201,8 @@ class TerminalAPI:
 
         return await self.fetch_data(
             f"{self.API_URL}customers/contracts/services/by_company/active/{customer_id}/",
-            params=params
+            params=params,
+            cache_ttl=self.services_cache_ttl,
         )
 
     async def get_container(self, container_name: str) -> tuple[list, int]:
@@ -37,73 +211,53 @@ class TerminalAPI:
             params={'container_name': container_name}
         )
 
-    async def register_container(self, data: dict) -> tuple[dict, int]:
-        try:
-            async with aiohttp.ClientSession() as session:
-                headers = {'Content-Type': 'application/json'}
-                async with session.post(f"{self.API_URL}containers/container_visit_register/", json=data,
-                                        headers=headers) as resp:
-                    resp_json = await resp.json()
-
-                    return resp_json, resp.status
-        except aiohttp.ClientError as e:
-            print(f"Client error occurred: {e}")
-        except Exception as e:
-            print(f"An unexpected error occurred: {e}")
-        return {}, 500
-
-    async def add_photo(self, container_id: int, data: aiohttp.FormData) -> bool:
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(f"{self.API_URL}containers/files/container_visit/{container_id}/image/create/",
-                                        data=data) as resp:
-                    resp_json = await resp.json()
-                    return resp.status == 201
-        except aiohttp.ClientError as e:
-            print(f"Client error occurred: {e}")
-        except Exception as e:
-            print(f"An unexpected error occurred: {e}")
-        return False
-
-    async def add_document(self, container_id: int, data: aiohttp.FormData) -> bool:
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                        f"{self.API_URL}containers/files/container_visit/{container_id}/document/create/",
-                        data=data) as resp:
-                    resp_json = await resp.json()
-                    return resp.status == 201
-        except aiohttp.ClientError as e:
-            print(f"Client error occurred: {e}")
-        except Exception as e:
-            print(f"An unexpected error occurred: {e}")
-        return False
+    async def get_container_page(self, container_name: str, offset: int, limit: int) -> tuple[list, int]:
+        """One page of the visits of a container, cached briefly so that paging back and forth is instant."""
+        return await self.fetch_data(
+            f"{self.API_URL}containers/containers_visit_list/",
+            params={'container_name': container_name, 'offset': offset, 'limit': limit},
+            cache_ttl=self.visits_cache_ttl,
+        )
+
+    async def register_container(self, data: dict, idempotency_key: str = None) -> tuple[dict, int]:
+        """
+        Register a container visit. The request is only retried when an idempotency key is given,
+        otherwise a retry after a lost response could register the container twice.
+        """
+        headers = {'Content-Type': 'application/json'}
+        if idempotency_key:
+            headers['Idempotency-Key'] = idempotency_key
+        status, resp_json = await self._request("POST", f"{self.API_URL}containers/container_visit_register/",
+                                                retry=idempotency_key is not None, json=data, headers=headers)
+        return resp_json or {}, status
+
+    async def add_photo(self, container_id: int, data: aiohttp.FormData) -> Optional[dict]:
+        """Upload a container photo. Returns the created image record, or None if it was rejected."""
+        status, resp_json = await self._request(
+            "POST", f"{self.API_URL}containers/files/container_visit/{container_id}/image/create/",
+            retry=False, upload=True, data=data)
+        return (resp_json or {}) if status == 201 else None
+
+    async def add_document(self, container_id: int, data: aiohttp.FormData) -> Optional[dict]:
+        """Upload a container document. Returns the created document record, or None if it was rejected."""
+        status, resp_json = await self._request(
+            "POST", f"{self.API_URL}containers/files/container_visit/{container_id}/document/create/",
+            retry=False, upload=True, data=data)
+        return (resp_json or {}) if status == 201 else None
 
     async def get_photos(self, container_id: str) -> list:
-        async with aiohttp.ClientSession() as session:
-            url = f"{self.API_URL}containers/files/container_visit/{container_id}/images/download/"
-            async with session.get(url) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    return data
-                else:
-                    return []
+        url = f"{self.API_URL}containers/files/container_visit/{container_id}/images/download/"
+        data = await self._get_json(url)
+        return data if data is not None else []
 
     async def get_documents(self, container_id: str) -> list:
-        async with aiohttp.ClientSession() as session:
-            url = f"{self.API_URL}containers/files/container_visit/{container_id}/documents/download/"
-            async with session.get(url) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    return data
-                else:
-                    return []
+        url = f"{self.API_URL}containers/files/container_visit/{container_id}/documents/download/"
+        data = await self._get_json(url)
+        return data if data is not None else []
 
     async def get_statistics(self) -> dict:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f"{self.API_URL}containers/container_visit_statistics/") as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    return data
-                else:
-                    return {}
+        data = await self._get_json(f"{self.API_URL}containers/container_visit_statistics/")
+        return data if data is not None else {}
+
+
+terminal_api = TerminalAPI()
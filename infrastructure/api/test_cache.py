@@ -0,0 +1,43 @@
+from unittest.mock import patch
+
+import pytest
+
+from infrastructure.api.cache import MemoryCache, make_key
+
+
+def test_make_key_is_order_independent():
+    assert make_key("customers/list/", {'offset': 0, 'limit': 40}) == make_key("customers/list/",
+                                                                               {'limit': 40, 'offset': 0})
+    assert make_key("customers/list/") == "customers/list/"
+
+
+@pytest.mark.asyncio
+async def test_memory_cache_expires_entries():
+    cache = MemoryCache()
+    with patch("infrastructure.api.cache.time.monotonic", return_value=100.0):
+        await cache.set("customers/list/", [[], 0], ttl=10)
+        assert await cache.get("customers/list/") == [[], 0]
+    with patch("infrastructure.api.cache.time.monotonic", return_value=111.0):
+        assert await cache.get("customers/list/") is None
+
+
+@pytest.mark.asyncio
+async def test_memory_cache_evicts_least_recently_used():
+    cache = MemoryCache(max_size=2)
+    await cache.set("a", 1, ttl=60)
+    await cache.set("b", 2, ttl=60)
+    await cache.get("a")
+    await cache.set("c", 3, ttl=60)
+    assert await cache.get("b") is None
+    assert await cache.get("a") == 1
+    assert await cache.get("c") == 3
+
+
+@pytest.mark.asyncio
+async def test_memory_cache_invalidates_by_prefix():
+    cache = MemoryCache()
+    await cache.set("customers/list/?limit=40", 1, ttl=60)
+    await cache.set("customers/contracts/services/by_company/active/1/", 2, ttl=60)
+    await cache.set("containers/containers_visit_list/", 3, ttl=60)
+    assert await cache.invalidate("customers/") == 2
+    assert await cache.get("containers/containers_visit_list/") == 3
@@ -0,0 +1,42 @@
+from unittest.mock import patch
+
+import pytest
+
+from infrastructure.api.exceptions import TerminalAPIUnavailable
+from infrastructure.api.resilience import CircuitBreaker, backoff_delay
+
+
+def test_backoff_delay_is_capped():
+    for attempt in range(10):
+        assert 0 <= backoff_delay(attempt, base=0.5, cap=5.0) <= 5.0
+
+
+def test_breaker_opens_after_threshold_and_recovers():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    with patch("infrastructure.api.resilience.time.monotonic", return_value=100.0):
+        breaker.record_failure()
+        breaker.before_call()
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+        with pytest.raises(TerminalAPIUnavailable):
+            breaker.before_call()
+
+    with patch("infrastructure.api.resilience.time.monotonic", return_value=131.0):
+        breaker.before_call()
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        with pytest.raises(TerminalAPIUnavailable):
+            breaker.before_call()
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_failed_probe_reopens_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    with patch("infrastructure.api.resilience.time.monotonic", return_value=100.0):
+        breaker.record_failure()
+    with patch("infrastructure.api.resilience.time.monotonic", return_value=131.0):
+        breaker.before_call()
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+        with pytest.raises(TerminalAPIUnavailable):
+            breaker.before_call()
@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+from infrastructure.api.singleflight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_upstream_request():
+    single_flight = SingleFlight()
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {'total_containers': 1}
+
+    results = await asyncio.gather(*(single_flight.do("statistics", fetch) for _ in range(10)))
+
+    assert calls == 1
+    assert all(result == {'total_containers': 1} for result in results)
+    assert single_flight.metrics()["max_callers_per_request"] == 10
+    assert single_flight.metrics()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_shared_request():
+    single_flight = SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.01)
+        return 42
+
+    first = asyncio.create_task(single_flight.do("key", fetch))
+    second = asyncio.create_task(single_flight.do("key", fetch))
+    await asyncio.sleep(0)
+    first.cancel()
+
+    assert await second == 42
+
+
+@pytest.mark.asyncio
+async def test_errors_are_shared_and_not_cached():
+    single_flight = SingleFlight()
+
+    async def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        await single_flight.do("key", fail)
+    assert await single_flight.do("key", lambda: asyncio.sleep(0, result="ok")) == "ok"
@@ -0,0 +1,28 @@
+import pytest
+
+from infrastructure.api.exceptions import TerminalAPIStatusError
+from infrastructure.api.terminal import TerminalAPI
+
+
+def answering(status: int, body):
+    async def request(method, url, retry, upload=False, **kwargs):
+        return status, body
+
+    return request
+
+
+@pytest.mark.asyncio
+async def test_unexpected_status_is_not_an_empty_listing(monkeypatch):
+    api = TerminalAPI()
+    url = f"{api.API_URL}customers/list/"
+
+    monkeypatch.setattr(api, "_request", answering(200, {"results": [{"id": 1}], "count": 1}))
+    assert await api.fetch_data(url) == ([{"id": 1}], 1)
+
+    monkeypatch.setattr(api, "_request", answering(404, None))
+    assert await api.fetch_data(url) == ([], 0)
+
+    monkeypatch.setattr(api, "_request", answering(401, {"detail": "Invalid token"}))
+    with pytest.raises(TerminalAPIStatusError) as error:
+        await api.fetch_data(url)
+    assert error.value.status == 401
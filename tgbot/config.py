@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Optional
 
 from environs import Env
@@ -40,32 +40,369 @@ class RedisConfig:
         The port where Redis server is listening.
     redis_host : Optional(str)
         The host where Redis server is located.
+    redis_db : int
+        Number of the Redis database.
+    max_connections : int
+        Size of the connection pool shared by the FSM storage, caches and queues.
+    socket_timeout : float
+        Seconds to wait for a Redis reply before the command fails.
+    socket_connect_timeout : float
+        Seconds to wait for a connection to Redis.
+    health_check_interval : int
+        Idle seconds after which a pooled connection is checked before use.
+    key_prefix : str
+        Namespace all bot keys are stored under, so several bots can share one Redis.
+    state_ttl : int
+        Seconds an untouched FSM state (an abandoned wizard) is kept.
+    data_ttl : int
+        Seconds untouched FSM data is kept.
     """
 
     redis_pass: Optional[str]
     redis_port: Optional[int]
     redis_host: Optional[str]
+    redis_db: int = 0
+    max_connections: int = 50
+    socket_timeout: float = 5.0
+    socket_connect_timeout: float = 5.0
+    health_check_interval: int = 30
+    key_prefix: str = "terminal_bot"
+    state_ttl: int = 7 * 24 * 3600
+    data_ttl: int = 7 * 24 * 3600
 
     def dsn(self) -> str:
         """
         Constructs and returns a Redis DSN (Data Source Name) for this database configuration.
         """
         if self.redis_pass:
-            return f"redis://:{self.redis_pass}@{self.redis_host}:{self.redis_port}/0"
+            return f"redis://:{self.redis_pass}@{self.redis_host}:{self.redis_port}/{self.redis_db}"
         else:
-            return f"redis://{self.redis_host}:{self.redis_port}/0"
+            return f"redis://{self.redis_host}:{self.redis_port}/{self.redis_db}"
 
     @staticmethod
     def from_env(env: Env):
         """
         Creates the RedisConfig object from environment variables.
         """
-        redis_pass = env.str("REDIS_PASSWORD")
+        redis_pass = env.str("REDIS_PASSWORD", None)
         redis_port = env.int("REDIS_PORT")
         redis_host = env.str("REDIS_HOST")
+        redis_db = env.int("REDIS_DB", 0)
+        max_connections = env.int("REDIS_MAX_CONNECTIONS", 50)
+        socket_timeout = env.float("REDIS_SOCKET_TIMEOUT", 5.0)
+        socket_connect_timeout = env.float("REDIS_SOCKET_CONNECT_TIMEOUT", 5.0)
+        health_check_interval = env.int("REDIS_HEALTH_CHECK_INTERVAL", 30)
+        key_prefix = env.str("REDIS_KEY_PREFIX", "terminal_bot")
+        state_ttl = env.int("FSM_STATE_TTL", 7 * 24 * 3600)
+        data_ttl = env.int("FSM_DATA_TTL", 7 * 24 * 3600)
 
         return RedisConfig(
-            redis_pass=redis_pass, redis_port=redis_port, redis_host=redis_host
+            redis_pass=redis_pass,
+            redis_port=redis_port,
+            redis_host=redis_host,
+            redis_db=redis_db,
+            max_connections=max_connections,
+            socket_timeout=socket_timeout,
+            socket_connect_timeout=socket_connect_timeout,
+            health_check_interval=health_check_interval,
+            key_prefix=key_prefix,
+            state_ttl=state_ttl,
+            data_ttl=data_ttl,
+        )
+
+
+@dataclass
+class TerminalApiConfig:
+    """
+    Terminal API HTTP client configuration class.
+
+    Attributes
+    ----------
+    limit : int
+        Total number of simultaneous connections in the pool.
+    limit_per_host : int
+        Number of simultaneous connections to the same host.
+    dns_cache_ttl : int
+        Seconds to keep resolved DNS entries.
+    keepalive_timeout : float
+        Seconds an idle connection is kept open for reuse.
+    clients_cache_ttl : int
+        Seconds to cache customer listings (0 disables caching).
+    services_cache_ttl : int
+        Seconds to cache contract service listings (0 disables caching).
+    visits_cache_ttl : int
+        Seconds to cache pages of container search results (0 disables caching).
+    cache_max_size : int
+        Maximum number of cached listing pages.
+    catalogue_refresh_interval : int
+        Seconds between background refreshes of the local customer catalogue.
+    catalogue_page_size : int
+        Page size used when walking the customer list for the catalogue.
+    containers_refresh_interval : int
+        Seconds between background rebuilds of the local index of active containers.
+    containers_page_size : int
+        Page size used when walking the container visit list for the index.
+    containers_max_age : int
+        Seconds an index snapshot may be answered from; older snapshots fall back to the API. Containers
+        registered outside this bot process after the last rebuild are not seen for up to this long,
+        so a duplicate of one can pass the check; 0 confirms every number with the API.
+    connect_timeout : float
+        Seconds to wait for a connection to the terminal API.
+    read_timeout : float
+        Seconds to wait for response data (slow endpoints get more, see TerminalAPI.SLOW_ENDPOINTS).
+    upload_timeout : float
+        Seconds to wait for response data of photo and document uploads.
+    retries : int
+        Number of retries of idempotent requests after a failure.
+    backoff_base : float
+        Base delay in seconds of the jittered exponential backoff between retries.
+    backoff_max : float
+        Upper bound of the backoff delay in seconds.
+    breaker_failure_threshold : int
+        Consecutive failures after which the circuit breaker opens.
+    breaker_reset_timeout : float
+        Seconds the circuit breaker stays open before letting a probe request through.
+    """
+
+    limit: int = 100
+    limit_per_host: int = 30
+    dns_cache_ttl: int = 300
+    keepalive_timeout: float = 30.0
+    clients_cache_ttl: int = 300
+    services_cache_ttl: int = 300
+    visits_cache_ttl: int = 30
+    cache_max_size: int = 1024
+    catalogue_refresh_interval: int = 600
+    catalogue_page_size: int = 500
+    containers_refresh_interval: int = 300
+    containers_page_size: int = 1000
+    containers_max_age: int = 360
+    connect_timeout: float = 5.0
+    read_timeout: float = 15.0
+    upload_timeout: float = 120.0
+    retries: int = 2
+    backoff_base: float = 0.5
+    backoff_max: float = 5.0
+    breaker_failure_threshold: int = 5
+    breaker_reset_timeout: float = 30.0
+
+    @staticmethod
+    def from_env(env: Env):
+        """
+        Creates the TerminalApiConfig object from environment variables.
+        """
+        limit = env.int("TERMINAL_API_LIMIT", 100)
+        limit_per_host = env.int("TERMINAL_API_LIMIT_PER_HOST", 30)
+        dns_cache_ttl = env.int("TERMINAL_API_DNS_CACHE_TTL", 300)
+        keepalive_timeout = env.float("TERMINAL_API_KEEPALIVE_TIMEOUT", 30.0)
+        clients_cache_ttl = env.int("TERMINAL_API_CLIENTS_CACHE_TTL", 300)
+        services_cache_ttl = env.int("TERMINAL_API_SERVICES_CACHE_TTL", 300)
+        visits_cache_ttl = env.int("TERMINAL_API_VISITS_CACHE_TTL", 30)
+        cache_max_size = env.int("TERMINAL_API_CACHE_MAX_SIZE", 1024)
+        catalogue_refresh_interval = env.int("CUSTOMER_CATALOGUE_REFRESH_INTERVAL", 600)
+        catalogue_page_size = env.int("CUSTOMER_CATALOGUE_PAGE_SIZE", 500)
+        containers_refresh_interval = env.int("CONTAINER_INDEX_REFRESH_INTERVAL", 300)
+        containers_page_size = env.int("CONTAINER_INDEX_PAGE_SIZE", 1000)
+        containers_max_age = env.int("CONTAINER_INDEX_MAX_AGE", 360)
+        connect_timeout = env.float("TERMINAL_API_CONNECT_TIMEOUT", 5.0)
+        read_timeout = env.float("TERMINAL_API_READ_TIMEOUT", 15.0)
+        upload_timeout = env.float("TERMINAL_API_UPLOAD_TIMEOUT", 120.0)
+        retries = env.int("TERMINAL_API_RETRIES", 2)
+        backoff_base = env.float("TERMINAL_API_BACKOFF_BASE", 0.5)
+        backoff_max = env.float("TERMINAL_API_BACKOFF_MAX", 5.0)
+        breaker_failure_threshold = env.int("TERMINAL_API_BREAKER_FAILURE_THRESHOLD", 5)
+        breaker_reset_timeout = env.float("TERMINAL_API_BREAKER_RESET_TIMEOUT", 30.0)
+        return TerminalApiConfig(
+            limit=limit,
+            limit_per_host=limit_per_host,
+            dns_cache_ttl=dns_cache_ttl,
+            keepalive_timeout=keepalive_timeout,
+            clients_cache_ttl=clients_cache_ttl,
+            services_cache_ttl=services_cache_ttl,
+            visits_cache_ttl=visits_cache_ttl,
+            cache_max_size=cache_max_size,
+            catalogue_refresh_interval=catalogue_refresh_interval,
+            catalogue_page_size=catalogue_page_size,
+            containers_refresh_interval=containers_refresh_interval,
+            containers_page_size=containers_page_size,
+            containers_max_age=containers_max_age,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            upload_timeout=upload_timeout,
+            retries=retries,
+            backoff_base=backoff_base,
+            backoff_max=backoff_max,
+            breaker_failure_threshold=breaker_failure_threshold,
+            breaker_reset_timeout=breaker_reset_timeout,
+        )
+
+
+@dataclass
+class WebhookConfig:
+    """
+    Webhook configuration class.
+
+    Attributes
+    ----------
+    use_webhook : bool
+        Receive updates through the webhook server instead of long polling.
+    url : str
+        Public base URL Telegram sends updates to, e.g. https://bot.example.com.
+    path : str
+        Path of the webhook endpoint (proxied by nginx to this server).
+    host : str
+        Interface the webhook server listens on.
+    port : int
+        Port the webhook server listens on.
+    secret_token : Optional[str]
+        Secret Telegram sends in X-Telegram-Bot-Api-Secret-Token; requests without it are rejected.
+    max_concurrent_updates : int
+        Maximum number of updates processed at the same time.
+    max_connections : int
+        Maximum number of simultaneous connections Telegram opens to the webhook.
+    workers : int
+        Number of worker processes; more than one runs the supervisor, which needs Redis.
+    """
+
+    use_webhook: bool = False
+    url: str = ""
+    path: str = "/webhook"
+    host: str = "0.0.0.0"
+    port: int = 8000
+    secret_token: Optional[str] = None
+    max_concurrent_updates: int = 100
+    max_connections: int = 40
+    workers: int = 1
+
+    @staticmethod
+    def from_env(env: Env):
+        """
+        Creates the WebhookConfig object from environment variables.
+        """
+        use_webhook = env.bool("USE_WEBHOOK", False)
+        url = env.str("WEBHOOK_URL", "")
+        path = env.str("WEBHOOK_PATH", "/webhook")
+        host = env.str("WEBHOOK_HOST", "0.0.0.0")
+        port = env.int("WEBHOOK_PORT", 8000)
+        secret_token = env.str("WEBHOOK_SECRET", None)
+        max_concurrent_updates = env.int("WEBHOOK_MAX_CONCURRENT_UPDATES", 100)
+        max_connections = env.int("WEBHOOK_MAX_CONNECTIONS", 40)
+        workers = env.int("WEBHOOK_WORKERS", 1)
+        return WebhookConfig(
+            use_webhook=use_webhook,
+            url=url,
+            path=path,
+            host=host,
+            port=port,
+            secret_token=secret_token,
+            max_concurrent_updates=max_concurrent_updates,
+            max_connections=max_connections,
+            workers=workers,
+        )
+
+
+@dataclass
+class MediaConfig:
+    """
+    Media handling configuration class.
+
+    Attributes
+    ----------
+    file_id_db_path : str
+        SQLite file mapping terminal photo/document ids to Telegram file ids (used when Redis is off).
+    """
+
+    file_id_db_path: str = "file_ids.sqlite3"
+
+    @staticmethod
+    def from_env(env: Env):
+        """
+        Creates the MediaConfig object from environment variables.
+        """
+        file_id_db_path = env.str("FILE_ID_DB_PATH", "file_ids.sqlite3")
+        return MediaConfig(file_id_db_path=file_id_db_path)
+
+
+@dataclass
+class OutboxConfig:
+    """
+    Registration outbox configuration class.
+
+    Attributes
+    ----------
+    db_path : str
+        SQLite file queued container registrations are kept in (used when Redis is off).
+    workers : int
+        Number of registrations delivered to the terminal API at the same time.
+    max_attempts : int
+        Delivery attempts before a registration is given up and the user is notified.
+    poll_interval : float
+        Seconds between checks for registrations that are due for a retry.
+    """
+
+    db_path: str = "outbox.sqlite3"
+    workers: int = 4
+    max_attempts: int = 30
+    poll_interval: float = 2.0
+
+    @staticmethod
+    def from_env(env: Env):
+        """
+        Creates the OutboxConfig object from environment variables.
+        """
+        db_path = env.str("OUTBOX_DB_PATH", "outbox.sqlite3")
+        workers = env.int("OUTBOX_WORKERS", 4)
+        max_attempts = env.int("OUTBOX_MAX_ATTEMPTS", 30)
+        poll_interval = env.float("OUTBOX_POLL_INTERVAL", 2.0)
+        return OutboxConfig(
+            db_path=db_path,
+            workers=workers,
+            max_attempts=max_attempts,
+            poll_interval=poll_interval,
+        )
+
+
+@dataclass
+class AuditConfig:
+    """
+    Audit log configuration class.
+
+    Attributes
+    ----------
+    sinks : list[str]
+        Where audit events go: any of "telegram", "jsonl" and "redis".
+    chat_id : Optional[int]
+        Chat the "telegram" sink posts events to.
+    jsonl_path : str
+        File the "jsonl" sink appends events to.
+    batch_size : int
+        Maximum number of events written in one go.
+    flush_interval : float
+        Seconds the consumer waits for a batch to fill before writing it anyway.
+    """
+
+    sinks: list[str] = field(default_factory=lambda: ["jsonl"])
+    chat_id: Optional[int] = None
+    jsonl_path: str = "audit.jsonl"
+    batch_size: int = 20
+    flush_interval: float = 5.0
+
+    @staticmethod
+    def from_env(env: Env):
+        """
+        Creates the AuditConfig object from environment variables.
+        """
+        sinks = env.list("AUDIT_SINKS", ["jsonl"])
+        chat_id = env.int("AUDIT_CHAT_ID", None)
+        jsonl_path = env.str("AUDIT_JSONL_PATH", "audit.jsonl")
+        batch_size = env.int("AUDIT_BATCH_SIZE", 20)
+        flush_interval = env.float("AUDIT_FLUSH_INTERVAL", 5.0)
+        return AuditConfig(
+            sinks=sinks,
+            chat_id=chat_id,
+            jsonl_path=jsonl_path,
+            batch_size=batch_size,
+            flush_interval=flush_interval,
         )
 
 
@@ -81,9 +418,25 @@ class Miscellaneous:
     ----------
     other_params : str, optional
         A string used to hold other various parameters as required (default is None).
+    callback_debounce : float
+        Seconds within which a repeated identical button tap is ignored.
+    bulk_registration_concurrency : int
+        Registration requests of a train sent to the terminal API at the same time.
     """
 
     other_params: str = None
+    callback_debounce: float = 1.0
+    bulk_registration_concurrency: int = 8
+
+    @staticmethod
+    def from_env(env: Env):
+        """
+        Creates the Miscellaneous object from environment variables.
+        """
+        callback_debounce = env.float("CALLBACK_DEBOUNCE", 1.0)
+        bulk_registration_concurrency = env.int("BULK_REGISTRATION_CONCURRENCY", 8)
+        return Miscellaneous(callback_debounce=callback_debounce,
+                             bulk_registration_concurrency=bulk_registration_concurrency)
 
 
 @dataclass
@@ -99,6 +452,16 @@ class Config:
         Holds the settings related to the Telegram Bot.
     misc : Miscellaneous
         Holds the values for miscellaneous settings.
+    terminal_api : TerminalApiConfig
+        Holds the settings for the terminal API HTTP client.
+    media : MediaConfig
+        Holds the settings for container photos and documents.
+    webhook : WebhookConfig
+        Holds the settings for receiving updates through a webhook.
+    outbox : OutboxConfig
+        Holds the settings for the container registration outbox.
+    audit : AuditConfig
+        Holds the settings for the audit log.
     db : Optional[DbConfig]
         Holds the settings specific to the database (default is None).
     redis : Optional[RedisConfig]
@@ -107,6 +470,11 @@ class Config:
 
     tg_bot: TgBot
     misc: Miscellaneous
+    terminal_api: TerminalApiConfig = field(default_factory=TerminalApiConfig)
+    media: MediaConfig = field(default_factory=MediaConfig)
+    webhook: WebhookConfig = field(default_factory=WebhookConfig)
+    outbox: OutboxConfig = field(default_factory=OutboxConfig)
+    audit: AuditConfig = field(default_factory=AuditConfig)
     redis: Optional[RedisConfig] = None
 
 
@@ -123,9 +491,15 @@ def load_config(path: str = None) -> Config:
     env = Env()
     env.read_env(path)
 
+    tg_bot = TgBot.from_env(env)
     return Config(
-        tg_bot=TgBot.from_env(env),
+        tg_bot=tg_bot,
         # db=DbConfig.from_env(env),
-        # redis=RedisConfig.from_env(env),
-        misc=Miscellaneous(),
+        redis=RedisConfig.from_env(env) if tg_bot.use_redis else None,
+        misc=Miscellaneous.from_env(env),
+        terminal_api=TerminalApiConfig.from_env(env),
+        media=MediaConfig.from_env(env),
+        webhook=WebhookConfig.from_env(env),
+        outbox=OutboxConfig.from_env(env),
+        audit=AuditConfig.from_env(env),
     )
@@ -1,6 +1,8 @@
 """Import all routers and add them to routers_list."""
 from .admin import admin_router
+from .bulk import bulk_router
 from .document import document_router
+from .errors import errors_router
 from .menu import menu_router
 
 from .order import order_creation_router
@@ -8,10 +10,12 @@ from .order import order_creation_router
 from .statistics import statistic_router
 
 routers_list = [
+    errors_router,
     admin_router,
     statistic_router,
     menu_router,
     document_router,
+    bulk_router,
     order_creation_router,
 
 ]
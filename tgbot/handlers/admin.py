@@ -1,8 +1,18 @@
 from aiogram import Router
-from aiogram.filters import CommandStart
+from aiogram.filters import CommandStart, Command
 from aiogram.types import Message
 
+from infrastructure.api.terminal import terminal_api
 from tgbot.filters.admin import AdminFilter
+from tgbot.keyboards.inline import markup_cache
+from tgbot.middlewares.fsm_buffer import fsm_buffer_stats
+from tgbot.middlewares.ordering import ordering_stats
+from tgbot.services.audit import audit_log
+from tgbot.services.catalogue import customer_catalogue
+from tgbot.services.containers import active_containers
+from tgbot.services.file_ids import file_id_cache
+from tgbot.services.outbox import registration_outbox
+from tgbot.utils.message_manager import message_manager
 
 admin_router = Router()
 admin_router.message.filter(AdminFilter())
@@ -11,3 +21,34 @@ admin_router.message.filter(AdminFilter())
 @admin_router.message(CommandStart())
 async def admin_start(message: Message):
     await message.reply("Привет, админ")
+
+
+@admin_router.message(Command("clear_cache"))
+async def clear_cache(message: Message):
+    dropped = await terminal_api.invalidate_cache()
+    await message.reply(f"Кэш очищен. Удалено записей: <b>{dropped}</b>")
+
+
+def format_metrics(title: str, metrics: dict) -> str:
+    lines = [f"<b>{title}</b>"]
+    lines.extend(f"{key}: <code>{value}</code>" for key, value in metrics.items())
+    return "\n".join(lines)
+
+
+@admin_router.message(Command("metrics"))
+async def show_metrics(message: Message):
+    sections = [
+        format_metrics("Terminal API", terminal_api.breaker.metrics()),
+        format_metrics("Каталог клиентов", customer_catalogue.metrics()),
+        format_metrics("Активные контейнеры", active_containers.metrics()),
+        format_metrics("Объединение запросов", terminal_api.single_flight.metrics()),
+        format_metrics("Кэш file_id", file_id_cache.metrics()),
+        format_metrics("Очередь регистраций",
+                       {"pending": await registration_outbox.store.pending(), **registration_outbox.metrics()}),
+        format_metrics("Журнал аудита", audit_log.metrics()),
+        format_metrics("FSM (буфер)", fsm_buffer_stats.metrics()),
+        format_metrics("Очерёдность апдейтов", ordering_stats.metrics()),
+        format_metrics("Редактирование сообщений", message_manager.metrics()),
+        format_metrics("Кэш клавиатур", markup_cache.metrics()),
+    ]
+    await message.reply("\n\n".join(sections))
@@ -0,0 +1,284 @@
+import asyncio
+import html
+import logging
+
+from aiogram import Bot, Router, F
+from aiogram.filters import Command
+from aiogram.fsm.context import FSMContext
+from aiogram.types import Message, CallbackQuery
+from aiogram_calendar import SimpleCalendar, SimpleCalendarCallback
+
+from tgbot.config import Config
+from tgbot.handlers.order import search_clients, show_clients_list, show_services_list
+from tgbot.keyboards.inline import container_loading_markup, transport_type_markup, confirmation_markup, \
+    back_markup, calendar_markup
+from tgbot.misc.callbacks import ClientCallback, name_table
+from tgbot.misc.states import BulkContainers, BulkRegistration
+from tgbot.services.containers import active_containers
+from tgbot.services.train import TrainRow, parse_csv, parse_text, parse_xlsx, register_train
+from tgbot.utils.message_manager import message_manager
+from tgbot.utils.validators import ContainerNumberCheck, parse_container_numbers
+
+MAX_CONTAINERS = 200
+MAX_FILE_SIZE = 1024 * 1024
+MESSAGE_LIMIT = 4000
+# Commands sent while a list is expected are left to their own handlers.
+NOT_COMMAND = ~F.text.startswith("/")
+ROWS_PROMPT = ("Отправьте список контейнеров, по одному в строке: номер, размер и номер вагона "
+               "(например, <code>MSKU9070323 40HC 64512345</code>), или файл CSV/XLSX с этими столбцами. "
+               "Четвёртым столбцом можно указать продукт.")
+bulk_router = Router()
+
+
+@bulk_router.message(Command("check_containers"))
+async def ask_container_list(message: Message, state: FSMContext):
+    await state.set_state(BulkContainers.numbers)
+    await message.answer("Отправьте список номеров контейнеров, по одному в строке (например, весь состав).")
+
+
+def format_check_report(checks: list[ContainerNumberCheck], active: set[str]) -> str:
+    free = [check.number for check in checks if check.valid and check.number not in active]
+    present = [check.number for check in checks if check.valid and check.number in active]
+    invalid = [check for check in checks if not check.valid]
+
+    parts = [f"Проверено номеров: <b>{len(checks)}</b>"]
+    if free:
+        parts.append(f"✅ Можно оформить ({len(free)}):\n" + "\n".join(free))
+    if present:
+        parts.append(f"⚠️ Уже на терминале ({len(present)}):\n" + "\n".join(present))
+    if invalid:
+        parts.append(f"❌ С ошибками ({len(invalid)}):\n" + "\n".join(
+            f"{html.escape(check.raw)} — {check.error}" for check in invalid))
+    return "\n\n".join(parts)
+
+
+@bulk_router.message(BulkContainers.numbers, NOT_COMMAND)
+async def check_container_list(message: Message, state: FSMContext):
+    checks = parse_container_numbers(message.text or "")
+    if not checks:
+        await message.answer("Список пуст. Отправьте номера контейнеров, по одному в строке.")
+        return
+    if len(checks) > MAX_CONTAINERS:
+        await message.answer(f"Слишком много номеров: {len(checks)}. Отправьте не больше {MAX_CONTAINERS} за раз.")
+        return
+
+    await state.clear()
+    active = await active_containers.find_active(check.number for check in checks if check.valid)
+    await message.answer(format_check_report(checks, active))
+
+
+# Train registration: the fields shared by all containers are asked once, then the list of containers.
+
+@bulk_router.message(Command("register_train"))
+async def start_train(message: Message, state: FSMContext):
+    await state.clear()
+    await state.set_state(BulkRegistration.container_state)
+    await message.answer("Регистрация состава. Контейнеры:", reply_markup=container_loading_markup)
+
+
+@bulk_router.callback_query(BulkRegistration.container_state, F.data.in_({"loaded", "empty"}))
+async def train_container_state(call: CallbackQuery, state: FSMContext):
+    await state.update_data(container_state=call.data)
+    await state.set_state(BulkRegistration.customer_name)
+    await show_clients_list(call, state)
+
+
+bulk_router.message(BulkRegistration.customer_name, F.text)(search_clients)
+
+
+@bulk_router.callback_query(ClientCallback.filter(), BulkRegistration.customer_name)
+async def train_customer(callback: CallbackQuery, callback_data: ClientCallback, state: FSMContext):
+    customer_name = await name_table.resolve(callback_data.name) or f"#{callback_data.id}"
+    await state.update_data(customer_name=customer_name, customer_id=callback_data.id)
+    await state.set_state(BulkRegistration.container_owner)
+    await message_manager.update_message(callback, state, "Введите Собственника контейнеров:",
+                                         reply_markup=back_markup)
+
+
+@bulk_router.message(BulkRegistration.container_owner, NOT_COMMAND)
+async def train_container_owner(message: Message, state: FSMContext):
+    await state.update_data(container_owner=message.text)
+    await state.set_state(BulkRegistration.date)
+    await message_manager.update_message(message, state, "Выберите дату:", reply_markup=await calendar_markup())
+
+
+@bulk_router.callback_query(SimpleCalendarCallback.filter(), BulkRegistration.date)
+async def train_date(callback_query: CallbackQuery, callback_data: SimpleCalendarCallback, state: FSMContext):
+    selected, date = await SimpleCalendar(show_alerts=True).process_selection(callback_query, callback_data)
+    if selected:
+        await state.update_data(date=date.strftime('%Y-%m-%d'))
+        await state.set_state(BulkRegistration.transport_type)
+        await message_manager.update_message(callback_query, state, "Тип транспорта:",
+                                             reply_markup=transport_type_markup)
+
+
+@bulk_router.callback_query(BulkRegistration.transport_type, F.data.in_({"auto", "wagon"}))
+async def train_transport_type(callback: CallbackQuery, state: FSMContext):
+    await state.update_data(transport_type=callback.data, selected_services=[], selected_service_names=[])
+    await state.set_state(BulkRegistration.selected_services)
+    await show_services_list(callback, state)
+
+
+@bulk_router.callback_query(BulkRegistration.selected_services, F.data == "confirm_services")
+async def train_services(callback: CallbackQuery, state: FSMContext):
+    data = await state.get_data()
+    if not data.get('selected_services'):
+        await callback.answer("Пожалуйста, выберите хотя бы одну услугу.")
+        return
+    await state.set_state(BulkRegistration.rows)
+    await message_manager.update_message(callback, state, ROWS_PROMPT, reply_markup=back_markup)
+
+
+async def read_rows(message: Message, bot: Bot) -> list[TrainRow] | str:
+    """Rows of the pasted list or uploaded file, or the reason they could not be read."""
+    if message.text:
+        return parse_text(message.text)
+    document = message.document
+    if document is None:
+        return "Отправьте список текстом или файлом CSV/XLSX."
+    if document.file_size and document.file_size > MAX_FILE_SIZE:
+        return "Файл слишком большой, максимум 1 МБ."
+    file_name = (document.file_name or "").lower()
+    if not file_name.endswith((".csv", ".txt", ".xlsx")):
+        return "Поддерживаются файлы CSV и XLSX."
+    content = (await bot.download(document)).read()
+    if not file_name.endswith(".xlsx"):
+        return parse_csv(content)
+    try:
+        return parse_xlsx(content)
+    except Exception:
+        return "Не удалось прочитать файл XLSX."
+
+
+def format_rows(rows: list[TrainRow]) -> list[str]:
+    """Per-row table, split into messages that fit the Telegram limit."""
+    lines = [f"{row.line:>3} {row.container_name:<11} {row.container_size:<4} {row.wagon_number:<10} "
+             f"{row.result or row.error or 'ок'}" for row in rows]
+    messages = []
+    current = []
+    for line in lines:
+        line = html.escape(line)
+        if current and sum(len(item) + 1 for item in current) + len(line) > MESSAGE_LIMIT - 20:
+            messages.append("<pre>" + "\n".join(current) + "</pre>")
+            current = []
+        current.append(line)
+    if current:
+        messages.append("<pre>" + "\n".join(current) + "</pre>")
+    return messages
+
+
+@bulk_router.message(BulkRegistration.rows, NOT_COMMAND)
+async def train_rows(message: Message, state: FSMContext, bot: Bot):
+    rows = await read_rows(message, bot)
+    if isinstance(rows, str):
+        await message.answer(rows)
+        return
+    if not rows:
+        await message.answer("Список пуст. " + ROWS_PROMPT)
+        return
+    if len(rows) > MAX_CONTAINERS:
+        await message.answer(f"Слишком много контейнеров: {len(rows)}. Отправьте не больше {MAX_CONTAINERS} за раз.")
+        return
+
+    valid = [row for row in rows if row.error is None]
+    for table in format_rows(rows):
+        await message.answer(table)
+    if not valid:
+        await message.answer("Нет ни одной корректной строки. Исправьте список и отправьте снова.")
+        return
+    await state.update_data(train_rows=[[row.line, row.container_name, row.container_size, row.wagon_number,
+                                         row.product_name] for row in valid])
+    await state.set_state(BulkRegistration.confirmation)
+    await message_manager.update_message(
+        message, state,
+        f"Будет зарегистрировано контейнеров: {len(valid)} из {len(rows)}. Строки с ошибками пропускаются.",
+        reply_markup=confirmation_markup)
+
+
+# Train registrations running in the background, kept so they are not garbage collected mid-way.
+_registrations: set[asyncio.Task] = set()
+
+
+async def report_train(message: Message, rows: list[TrainRow], shared: dict, user_id: int, concurrency: int):
+    """Register the rows and post the summary and the per-row table to the chat once all are done."""
+    try:
+        await register_train(rows, shared, message.chat.id, user_id, concurrency=concurrency)
+    except Exception:
+        logging.exception(f"Train registration in chat {message.chat.id} failed")
+        await message.answer("Не удалось зарегистрировать состав, попробуйте ещё раз.")
+        return
+    counts = {}
+    for row in rows:
+        counts[row.status] = counts.get(row.status, 0) + 1
+    summary = [
+        f"Создано: <b>{counts.get('created', 0)}</b>",
+        f"Уже на терминале: <b>{counts.get('exists', 0)}</b>",
+        f"Отклонено: <b>{counts.get('rejected', 0) + counts.get('failed', 0)}</b>",
+    ]
+    if counts.get('queued'):
+        summary.append(f"В очереди (терминал недоступен, ID придёт позже): <b>{counts['queued']}</b>")
+    await message.answer("\n".join(summary))
+    for table in format_rows(rows):
+        await message.answer(table)
+
+
+def _registration_done(task: asyncio.Task) -> None:
+    _registrations.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logging.error(f"Reporting a train registration failed: {task.exception()!r}")
+
+
+@bulk_router.callback_query(BulkRegistration.confirmation, F.data == "confirm")
+async def train_confirm(callback: CallbackQuery, state: FSMContext, config: Config):
+    """Start the registration in the background, so the chat is not held up while the rows are sent."""
+    data = await state.get_data()
+    rows = [TrainRow(line=line, container_name=name, container_size=size, wagon_number=wagon, product_name=product)
+            for line, name, size, wagon, product in data['train_rows']]
+    await state.clear()
+    await callback.answer()
+    await callback.message.edit_text(f"Регистрирую контейнеры: {len(rows)}…")
+
+    task = asyncio.create_task(report_train(callback.message, rows, data, callback.from_user.id,
+                                            concurrency=config.misc.bulk_registration_concurrency))
+    _registrations.add(task)
+    task.add_done_callback(_registration_done)
+
+
+TRAIN_STEPS = [
+    BulkRegistration.container_state,
+    BulkRegistration.customer_name,
+    BulkRegistration.container_owner,
+    BulkRegistration.date,
+    BulkRegistration.transport_type,
+    BulkRegistration.selected_services,
+    BulkRegistration.rows,
+    BulkRegistration.confirmation,
+]
+
+
+@bulk_router.callback_query(BulkRegistration, F.data == "back")
+async def train_back(callback: CallbackQuery, state: FSMContext):
+    current = TRAIN_STEPS.index(await state.get_state())
+    if current == 0:
+        await state.clear()
+        await callback.message.edit_text("Регистрация состава отменена.")
+        return
+
+    previous = TRAIN_STEPS[current - 1]
+    await state.set_state(previous)
+    if previous == BulkRegistration.container_state:
+        await message_manager.update_message(callback, state, "Контейнеры:", reply_markup=container_loading_markup)
+    elif previous == BulkRegistration.customer_name:
+        await show_clients_list(callback, state)
+    elif previous == BulkRegistration.container_owner:
+        await message_manager.update_message(callback, state, "Введите Собственника контейнеров:",
+                                             reply_markup=back_markup)
+    elif previous == BulkRegistration.date:
+        await message_manager.update_message(callback, state, "Выберите дату:", reply_markup=await calendar_markup())
+    elif previous == BulkRegistration.transport_type:
+        await message_manager.update_message(callback, state, "Тип транспорта:", reply_markup=transport_type_markup)
+    elif previous == BulkRegistration.selected_services:
+        await show_services_list(callback, state)
+    else:
+        await message_manager.update_message(callback, state, ROWS_PROMPT, reply_markup=back_markup)
+    await callback.answer()
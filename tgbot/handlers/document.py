@@ -1,15 +1,26 @@
+import asyncio
+import logging
 import os
+import tempfile
+from datetime import date
+from typing import Optional
 
+import aiohttp
 from aiogram import Router
-from aiogram.client.session import aiohttp
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
-from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery, ContentType, FSInputFile
+from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery, ContentType, \
+    InputMediaPhoto, InputMediaDocument, FSInputFile
 from magic_filter import F
 
-from infrastructure.api.terminal import TerminalAPI
+from infrastructure.api.terminal import terminal_api
 from tgbot.handlers.order import API_URL
+from tgbot.misc.callbacks import ContainerAction, ContainerCallback, NameTable, SearchPageCallback, name_table
 from tgbot.misc.states import TerminalDocument
+from tgbot.services.export import iter_visit_rows, parse_export_args, write_csv, write_xlsx
+from tgbot.services.file_ids import file_id_cache
+from tgbot.services.media import relay_telegram_file, send_media_files, MediaFile
+from tgbot.utils.message_manager import message_manager
 
 document_router = Router()
 
@@ -20,175 +31,248 @@ async def get_container(message: Message, state: FSMContext):
     await state.set_state(TerminalDocument.container_number)
 
 
-@document_router.message(TerminalDocument.container_number)
-async def get_document(message: Message, state: FSMContext):
-    terminal_api = TerminalAPI()
-    response = await terminal_api.get_container(message.text)
-    containers_info_list = response[0]
+def format_visit(container: dict, offset: int, count: int) -> str:
+    response_parts = [
+        f"Визит <b>{offset + 1}</b> из <b>{count}</b>",
+        f"Контейнер: <b>{container['container']['name']} ({container['container']['size']})</b>",
+        f"Статус: <b>{container['container_state']}</b>",
+        f"Клиент: <b>{container['company']['name']}</b>",
+        f"Дата прибытия: <b>{container['entry_time']}</b>"
+    ]
 
-    if not containers_info_list:
-        await message.answer("Контейнер не найден")
+    for service in container['services']:
+        response_parts.append(f"Услуга: <b>{service['service_type']['name']}</b>")
 
-    for container in containers_info_list:
-        response_parts = [
-            f"Контейнер: <b>{container['container']['name']} ({container['container']['size']})</b>",
-            f"Статус: <b>{container['container_state']}</b>",
-            f"Клиент: <b>{container['company']['name']}</b>",
-            f"Дата прибытия: <b>{container['entry_time']}</b>"
-        ]
+    return "\n".join(response_parts)
 
-        for service in container['services']:
-            response_parts.append(f"Услуга: <b>{service['service_type']['name']}</b>")
 
-        response_message = "\n".join(response_parts)
+def create_visit_keyboard(container: dict, query_id: str, offset: int, count: int) -> InlineKeyboardMarkup:
+    def container_callback(action: ContainerAction) -> str:
+        return ContainerCallback(action=action, id=container['id'],
+                                 name=NameTable.short_id(container['container']['name'])).pack()
 
-        inline_keyboard = [
-            [
-                InlineKeyboardButton(text="Добавить фото",
-                                     callback_data=f"photo_{container['id']}_{container['container']['name']}"),
-                InlineKeyboardButton(text="Добавить документ",
-                                     callback_data=f"document_{container['id']}_{container['container']['name']}")
-            ]
+    inline_keyboard = [
+        [
+            InlineKeyboardButton(text="Добавить фото", callback_data=container_callback(ContainerAction.add_photo)),
+            InlineKeyboardButton(text="Добавить документ",
+                                 callback_data=container_callback(ContainerAction.add_document))
         ]
-        media_keyboard = []
-        if container["images"]:
-            media_keyboard.append(InlineKeyboardButton(text="Скачать Фото",
-                                                       callback_data=f"downloadPhoto_{container['id']}_{container['container']['name']}"))
-
-        if container["documents"]:
-            media_keyboard.append(InlineKeyboardButton(text="Скачать Документ",
-                                                       callback_data=f"downloadDocument_{container['id']}_{container['container']['name']}"))
-        inline_keyboard.append(media_keyboard)
-        container_reply = InlineKeyboardMarkup(inline_keyboard=inline_keyboard)
-        await message.answer(response_message, reply_markup=container_reply)
-
-
-@document_router.callback_query(lambda c: c.data.startswith("photo_"))
-async def add_photo(callback_query: CallbackQuery, state: FSMContext):
-    container_id = callback_query.data.split("_")[1]
+    ]
+    media_keyboard = []
+    if container["images"]:
+        media_keyboard.append(InlineKeyboardButton(text="Скачать Фото",
+                                                   callback_data=container_callback(ContainerAction.photos)))
+
+    if container["documents"]:
+        media_keyboard.append(InlineKeyboardButton(text="Скачать Документ",
+                                                   callback_data=container_callback(ContainerAction.documents)))
+    inline_keyboard.append(media_keyboard)
+
+    navigation = []
+    if offset > 0:
+        navigation.append(InlineKeyboardButton(
+            text="⬅️ Назад", callback_data=SearchPageCallback(query=query_id, offset=offset - 1).pack()))
+    if offset + 1 < count:
+        navigation.append(InlineKeyboardButton(
+            text="Вперед ➡️", callback_data=SearchPageCallback(query=query_id, offset=offset + 1).pack()))
+    inline_keyboard.append(navigation)
+    return InlineKeyboardMarkup(inline_keyboard=inline_keyboard)
+
+
+# Running prefetches, referenced so that they are not garbage collected before they finish.
+_prefetches: set[asyncio.Task] = set()
+
+
+def prefetch_visit(query: str, offset: int, count: int) -> None:
+    """Load the page the user is likely to open next into the API cache."""
+    if not 0 <= offset < count:
+        return
+    task = asyncio.create_task(terminal_api.get_container_page(query, offset, 1))
+    _prefetches.add(task)
+    task.add_done_callback(_prefetch_done)
+
+
+def _prefetch_done(task: asyncio.Task) -> None:
+    _prefetches.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logging.warning(f"Prefetch of a search page failed: {task.exception()!r}")
+
+
+async def load_visit(query: str, offset: int) -> tuple[Optional[str], Optional[InlineKeyboardMarkup], int]:
+    """Text and keyboard of one visit of the search results, fetching just that page."""
+    visits, count = await terminal_api.get_container_page(query, offset, 1)
+    if not visits:
+        return None, None, count
+    container = visits[0]
+    await name_table.remember([container['container']['name']])
+    prefetch_visit(query, offset + 1, count)
+    return (format_visit(container, offset, count),
+            create_visit_keyboard(container, NameTable.short_id(query), offset, count), count)
+
+
+# A command sent while a number is expected is left to its own handler.
+@document_router.message(TerminalDocument.container_number, ~F.text.startswith("/"))
+async def get_document(message: Message, state: FSMContext):
+    query = (message.text or "").strip()
+    text, reply_markup, _ = await load_visit(query, 0)
+    if text is None:
+        await message.answer("Контейнер не найден")
+        return
+
+    await name_table.remember([query])
+    await message.answer(text, reply_markup=reply_markup)
+
+
+@document_router.callback_query(SearchPageCallback.filter())
+async def handle_search_page(callback_query: CallbackQuery, callback_data: SearchPageCallback):
+    query = await name_table.resolve(callback_data.query)
+    if query is None:
+        await callback_query.answer("Результаты поиска устарели, повторите /search", show_alert=True)
+        return
+
+    text, reply_markup, _ = await load_visit(query, callback_data.offset)
+    if text is None:
+        await callback_query.answer("Визит больше не найден, повторите /search", show_alert=True)
+        return
+
+    await message_manager.edit(callback_query.message, text, reply_markup)
+    await callback_query.answer()
+
+
+async def get_container_name(callback_data: ContainerCallback) -> str:
+    return await name_table.resolve(callback_data.name) or f"#{callback_data.id}"
+
+
+@document_router.callback_query(ContainerCallback.filter(F.action == ContainerAction.add_photo))
+async def add_photo(callback_query: CallbackQuery, callback_data: ContainerCallback, state: FSMContext):
+    container_id = callback_data.id
     await state.update_data({"container_id": container_id})
-    container_name = callback_query.data.split("_")[2]
+    container_name = await get_container_name(callback_data)
     await callback_query.message.answer(f"Добавьте фото контейнера {container_name}")
     await state.set_state(TerminalDocument.photo)
 
 
-@document_router.callback_query(lambda c: c.data.startswith("document_"))
-async def add_document(callback_query: CallbackQuery, state: FSMContext):
-    container_id = callback_query.data.split("_")[1]
+@document_router.callback_query(ContainerCallback.filter(F.action == ContainerAction.add_document))
+async def add_document(callback_query: CallbackQuery, callback_data: ContainerCallback, state: FSMContext):
+    container_id = callback_data.id
     await state.update_data({"container_id": container_id})
-    container_name = callback_query.data.split("_")[2]
+    container_name = await get_container_name(callback_data)
     await callback_query.message.answer(f"Добавьте документ контейнера {container_name}")
     await state.set_state(TerminalDocument.document)
 
 
 @document_router.message(TerminalDocument.photo, F.content_type == ContentType.PHOTO)
 async def save_photo(message: Message, state: FSMContext):
-    terminal_api = TerminalAPI()
     container_id = (await state.get_data())["container_id"]
 
-    # Get the file ID from the photo
-    file_id = message.photo[-1].file_id
-    file = await message.bot.get_file(file_id)
-
-    # Download the photo
-    file_path = file.file_path
-    photo_url = f'https://api.telegram.org/file/bot{message.bot.token}/{file_path}'
-
-    # Download the photo from the Telegram servers
-    async with aiohttp.ClientSession() as session:
-        async with session.get(photo_url) as response:
-            photo_bytes = await response.read()
-
-    # Prepare the form data with the photo
-    data = aiohttp.FormData()
-    data.add_field('file', photo_bytes, filename="photo.jpg", content_type='image/jpeg')
-
+    # Stream the largest photo size from the Telegram servers straight into the terminal API
     try:
-        await terminal_api.add_photo(container_id, data)
-        await message.answer("Фото сохранено")
-    except Exception as e:
+        image = await relay_telegram_file(
+            message.bot,
+            message.photo[-1].file_id,
+            upload=lambda data: terminal_api.add_photo(container_id, data),
+            filename="photo.jpg",
+            content_type="image/jpeg",
+        )
+    except aiohttp.ClientError as e:
         await message.answer(f"Произошла ошибка: {e}")
+        return
+
+    if image is None:
+        await message.answer("Не удалось сохранить фото")
+        return
+
+    # The uploaded photo already lives on the Telegram servers, remember it for "Скачать Фото"
+    if 'id' in image:
+        await file_id_cache.set_many({f"image:{image['id']}": message.photo[-1].file_id})
+    # Search result pages decide whether to offer "Скачать Фото" from the cached visit.
+    await terminal_api.invalidate_cache("containers/containers_visit_list/")
+    await message.answer("Фото сохранено")
 
 
 @document_router.message(TerminalDocument.document, F.content_type == ContentType.DOCUMENT)
 async def save_document(message: Message, state: FSMContext):
-    terminal_api = TerminalAPI()
     container_id = (await state.get_data())["container_id"]
 
-    # Get the file ID from the document
-    file_id = message.document.file_id
-    file = await message.bot.get_file(file_id)
-
-    # Download the document
-    file_path = file.file_path
-    document_url = f'https://api.telegram.org/file/bot{message.bot.token}/{file_path}'
-
-    # Download the document from the Telegram servers
-    async with aiohttp.ClientSession() as session:
-        async with session.get(document_url) as response:
-            document_bytes = await response.read()
-
-    # Prepare the form data with the document
-    data = aiohttp.FormData()
-    data.add_field('file', document_bytes, filename=message.document.file_name)
-
+    # Stream the document from the Telegram servers straight into the terminal API
     try:
-        await terminal_api.add_document(container_id, data)
-        await message.answer("Документ сохранен")
-    except Exception as e:
+        document = await relay_telegram_file(
+            message.bot,
+            message.document.file_id,
+            upload=lambda data: terminal_api.add_document(container_id, data),
+            filename=message.document.file_name,
+            content_type=message.document.mime_type or "application/octet-stream",
+        )
+    except aiohttp.ClientError as e:
         await message.answer(f"Произошла ошибка: {e}")
+        return
 
+    if document is None:
+        await message.answer("Не удалось сохранить документ")
+        return
 
-@document_router.callback_query(lambda c: c.data.startswith("downloadPhoto_"))
-async def download_photo(callback_query: CallbackQuery):
-    container_id = callback_query.data.split("_")[1]
-    container_name = callback_query.data.split("_")[2]
-    terminal_api = TerminalAPI()
-    images = await terminal_api.get_photos(container_id)
-
-    for image in images:
-        image_url = f"{API_URL}{image['image']}"  # Construct full URL
-
-        # Download the image
-        async with aiohttp.ClientSession() as session:
-            async with session.get(image_url) as resp:
-                if resp.status == 200:
-                    image_data = await resp.read()
+    if 'id' in document:
+        await file_id_cache.set_many({f"document:{document['id']}": message.document.file_id})
+    await terminal_api.invalidate_cache("containers/containers_visit_list/")
+    await message.answer("Документ сохранен")
 
-                    # Save the image to a temporary file
-                    temp_filename = f"temp_{container_id}_{image['id']}.jpg"
-                    with open(temp_filename, "wb") as f:
-                        f.write(image_data)
 
-                    # Use FSInputFile to send the photo
-                    photo = FSInputFile(temp_filename)
-                    await callback_query.message.answer_photo(photo=photo)
-
-                    # Remove the temporary file after sending
-                    os.remove(temp_filename)
+@document_router.callback_query(ContainerCallback.filter(F.action == ContainerAction.photos))
+async def download_photo(callback_query: CallbackQuery, callback_data: ContainerCallback):
+    container_id = callback_data.id
+    container_name = await get_container_name(callback_data)
+    await callback_query.answer()
+    images = await terminal_api.get_photos(container_id)
 
+    files = [
+        MediaFile(key=f"image:{image['id']}", url=f"{API_URL}{image['image']}",
+                  filename=f"{container_name}_{image['id']}.jpg")
+        for image in images
+    ]
+    await send_media_files(callback_query.message, files, InputMediaPhoto)
     await callback_query.message.answer(f"Фото контейнера {container_name}")
 
 
-@document_router.callback_query(lambda c: c.data.startswith("downloadDocument_"))
-async def download_document(callback_query: CallbackQuery):
-    container_id = callback_query.data.split("_")[1]
-    container_name = callback_query.data.split("_")[2]
-    terminal_api = TerminalAPI()
+@document_router.callback_query(ContainerCallback.filter(F.action == ContainerAction.documents))
+async def download_document(callback_query: CallbackQuery, callback_data: ContainerCallback):
+    container_id = callback_data.id
+    container_name = await get_container_name(callback_data)
+    await callback_query.answer()
     documents = await terminal_api.get_documents(container_id)
 
-    for document in documents:
-        document_url = f"{API_URL}{document['document']}"
-        async with aiohttp.ClientSession() as session:
-            async with session.get(document_url) as resp:
-                if resp.status == 200:
-                    document_data = await resp.read()
-                    # Extract the original file extension
-                    file_extension = os.path.splitext(document['document'])[1]
-                    temp_filename = f"temp_{container_id}_{document['id']}{file_extension}"
-                    with open(temp_filename, "wb") as f:
-                        f.write(document_data)
-                    document = FSInputFile(temp_filename)
-                    await callback_query.message.answer_document(document=document)
-                    os.remove(temp_filename)
+    files = [
+        MediaFile(key=f"document:{document['id']}", url=f"{API_URL}{document['document']}",
+                  filename=os.path.basename(document['document']))
+        for document in documents
+    ]
+    await send_media_files(callback_query.message, files, InputMediaDocument)
     await callback_query.message.answer(f"Документ контейнера {container_name}")
+
+
+@document_router.message(Command("export"))
+async def export_visits(message: Message, command: CommandObject):
+    try:
+        visit_filter, export_format = parse_export_args(command.args)
+    except ValueError as e:
+        await message.answer(
+            f"{e}\n\nИспользование: <code>/export [номер] [from=ГГГГ-ММ-ДД] [to=ГГГГ-ММ-ДД] "
+            "[customer=клиент] [format=csv|xlsx]</code>")
+        return
+
+    await message.answer("Готовлю выгрузку…")
+    fd, path = tempfile.mkstemp(suffix=f".{export_format}")
+    os.close(fd)
+    try:
+        rows = iter_visit_rows(visit_filter)
+        if export_format == "xlsx":
+            count = await write_xlsx(rows, path)
+        else:
+            count = await write_csv(rows, path)
+
+        if not count:
+            await message.answer("По заданным условиям визиты не найдены.")
+            return
+        filename = f"visits_{visit_filter.container_name or 'all'}_{date.today().isoformat()}.{export_format}"
+        await message.answer_document(FSInputFile(path, filename=filename), caption=f"Визитов: <b>{count}</b>")
+    finally:
+        os.remove(path)
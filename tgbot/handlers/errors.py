@@ -0,0 +1,33 @@
+import logging
+
+from aiogram import Router
+from aiogram.filters import ExceptionTypeFilter
+from aiogram.types import ErrorEvent
+
+from infrastructure.api.exceptions import TerminalAPIStatusError, TerminalAPIUnavailable
+
+errors_router = Router()
+
+UNAVAILABLE_TEXT = "Сервер терминала сейчас недоступен. Попробуйте ещё раз через минуту."
+REJECTED_TEXT = "Сервер терминала отклонил запрос (HTTP {status}). Сообщите администратору."
+
+
+@errors_router.errors(ExceptionTypeFilter(TerminalAPIUnavailable))
+async def terminal_unavailable(event: ErrorEvent):
+    logging.warning(f"Update {event.update.update_id} failed: {event.exception}")
+    if event.update.callback_query:
+        await event.update.callback_query.answer(UNAVAILABLE_TEXT, show_alert=True)
+    elif event.update.message:
+        await event.update.message.answer(UNAVAILABLE_TEXT)
+    return True
+
+
+@errors_router.errors(ExceptionTypeFilter(TerminalAPIStatusError))
+async def terminal_rejected(event: ErrorEvent):
+    logging.error(f"Update {event.update.update_id} failed: {event.exception}")
+    text = REJECTED_TEXT.format(status=event.exception.status)
+    if event.update.callback_query:
+        await event.update.callback_query.answer(text, show_alert=True)
+    elif event.update.message:
+        await event.update.message.answer(text)
+    return True
@@ -1,38 +1,41 @@
-import json
 
 from aiogram import Router, F
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
-from aiogram.types import Message, CallbackQuery, InlineKeyboardButton, ReplyKeyboardRemove
+from aiogram.types import Message, CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardRemove
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram_calendar import SimpleCalendar, SimpleCalendarCallback
 
-from infrastructure.api.terminal import TerminalAPI
-from tgbot.keyboards.inline import start_keyboard, container_type_keyboard, \
-    container_loading_keyboard, transport_type_keyboard, confirmation_keyboard, back_keyboard, yes_no_keyboard
-from tgbot.misc.states import TerminalImport, TerminalDocument
-from tgbot.utils.message_manager import MessageManager
-from tgbot.utils.validators import validate_container_number
+from infrastructure.api.terminal import terminal_api
+from tgbot.keyboards.inline import start_keyboard, container_type_markup, container_loading_markup, \
+    transport_type_markup, confirmation_markup, back_markup, calendar_markup, markup_cache
+from tgbot.misc.callbacks import ClientCallback, ClientPageCallback, NameTable, ServiceCallback, \
+    ServicePageCallback, name_table
+from tgbot.misc.states import TerminalImport
+from tgbot.services.audit import audit_log
+from tgbot.services.catalogue import customer_catalogue
+from tgbot.services.containers import active_containers
+from tgbot.services.outbox import registration_outbox
+from tgbot.utils.message_manager import message_manager
+from tgbot.utils.validators import check_container_number
 
 API_URL = "https://api.trains.uz"
 PER_PAGE = 40
 order_creation_router = Router()
-terminal_api = TerminalAPI()
-message_manager = MessageManager()
 
 
-def create_paginated_keyboard(items: list, current_page: int, total_items: int,
-                              callback_prefix: str) -> InlineKeyboardBuilder:
+def create_paginated_keyboard(items: list, current_page: int, total_items: int) -> InlineKeyboardBuilder:
     keyboard = InlineKeyboardBuilder()
 
     for item in items:
-        keyboard.button(text=item['name'], callback_data=f"{callback_prefix}_{item['id']}_{item['name']}")
+        keyboard.button(text=item['name'],
+                        callback_data=ClientCallback(id=item['id'], name=NameTable.short_id(item['name'])))
 
     total_pages = (total_items - 1) // PER_PAGE + 1
     if current_page > 1:
-        keyboard.button(text="⬅️ Назад", callback_data=f"page_{current_page - 1}")
+        keyboard.button(text="⬅️ Назад", callback_data=ClientPageCallback(page=current_page - 1))
     if current_page < total_pages:
-        keyboard.button(text="Вперед ➡️", callback_data=f"page_{current_page + 1}")
+        keyboard.button(text="Вперед ➡️", callback_data=ClientPageCallback(page=current_page + 1))
 
     keyboard.adjust(2)
     return keyboard
@@ -50,7 +53,7 @@ async def get_request_type(call: CallbackQuery, state: FSMContext):
     await state.update_data(request_type=call.data.upper())
     await state.set_state(TerminalImport.container_size)
     await message_manager.update_message(call, state, "Выберите тип контейнера:",
-                                         reply_markup=container_type_keyboard.as_markup())
+                                         reply_markup=container_type_markup)
 
 
 @order_creation_router.callback_query(TerminalImport.container_size, F.data != "back")
@@ -58,27 +61,24 @@ async def get_container_type(call: CallbackQuery, state: FSMContext):
     await state.update_data(container_size=call.data.upper())
     await state.set_state(TerminalImport.container_name)
     await message_manager.update_message(call, state, "Введите номер контейнера (Например:TGHU1234567):",
-                                         reply_markup=back_keyboard.as_markup())
+                                         reply_markup=back_markup)
 
 
 @order_creation_router.message(TerminalImport.container_name)
 async def get_container_name(message: Message, state: FSMContext):
-    clean_text = validate_container_number(message.text)
-    if not clean_text:
-        await message.answer("Номер контейнера должен быть 11 символов: первые 4 буквы, затем 7 цифр.")
+    check = check_container_number(message.text)
+    if not check.valid:
+        await message.answer(f"Неверный номер контейнера <b>{check.number}</b>: {check.error}.")
         return
 
-    containers, count = await terminal_api.get_container(container_name=clean_text)
-
-    for i in range(count):
-        if containers[i]['exit_time'] is None:
-            await message.answer("Контейнер с таким номером уже существует.")
-            return
+    if await active_containers.is_active(check.number):
+        await message.answer("Контейнер с таким номером уже существует.")
+        return
 
-    await state.update_data(container_name=clean_text.upper())
+    await state.update_data(container_name=check.number)
     await state.set_state(TerminalImport.container_state)
     await message_manager.update_message(message, state, "Контейнер:",
-                                         reply_markup=container_loading_keyboard.as_markup())
+                                         reply_markup=container_loading_markup)
 
 
 @order_creation_router.callback_query(TerminalImport.container_state, F.data != "back")
@@ -92,7 +92,7 @@ async def get_loading_type(call: CallbackQuery, state: FSMContext):
     else:
         await state.set_state(TerminalImport.product_name)
         await message_manager.update_message(call, state, "Введите название продукта:",
-                                             reply_markup=back_keyboard.as_markup())
+                                             reply_markup=back_markup)
 
 
 @order_creation_router.message(TerminalImport.product_name)
@@ -102,53 +102,80 @@ async def get_product_name(message: Message, state: FSMContext):
     await show_clients_list(message, state)
 
 
+def create_clients_markup(clients: list, page: int, total_clients: int) -> InlineKeyboardMarkup:
+    keyboard = create_paginated_keyboard(clients, page, total_clients)
+    keyboard.row(InlineKeyboardButton(text="◀️ Назад", callback_data="back"))
+    return keyboard.as_markup()
+
+
 async def show_clients_list(message: Message | CallbackQuery, state: FSMContext, page: int = 1):
-    clients, total_clients = await terminal_api.get_clients((page - 1) * PER_PAGE, PER_PAGE)
+    if customer_catalogue.ready:
+        clients, total_clients = customer_catalogue.page((page - 1) * PER_PAGE, PER_PAGE)
+    else:
+        clients, total_clients = await terminal_api.get_clients((page - 1) * PER_PAGE, PER_PAGE)
     if not clients:
         await message.answer("Список клиентов пуст.")
         return
 
-    keyboard = create_paginated_keyboard(clients, page, total_clients, "client")
-    keyboard.row(InlineKeyboardButton(text="◀️ Назад", callback_data="back"))
+    await name_table.remember(client['name'] for client in clients)
+    if customer_catalogue.ready:
+        # Pages are the same for every user until the catalogue is refreshed.
+        reply_markup = markup_cache.get_or_build(("clients", customer_catalogue.version, page),
+                                                 lambda: create_clients_markup(clients, page, total_clients))
+    else:
+        reply_markup = create_clients_markup(clients, page, total_clients)
     await message_manager.update_message(
         message,
         state,
-        f"Выберите клиента (Страница {page} из {(total_clients - 1) // PER_PAGE + 1}):",
-        reply_markup=keyboard.as_markup()
+        f"Выберите клиента (Страница {page} из {(total_clients - 1) // PER_PAGE + 1}) "
+        f"или отправьте часть названия для поиска:",
+        reply_markup=reply_markup
     )
 
 
-@order_creation_router.callback_query(lambda c: c.data.startswith("page_"))
-async def handle_pagination(callback: CallbackQuery, state: FSMContext):
-    page = int(callback.data.split("_")[1])
-    await show_clients_list(callback, state, page)
+@order_creation_router.message(TerminalImport.customer_name, F.text)
+async def search_clients(message: Message, state: FSMContext):
+    if not customer_catalogue.ready:
+        await message.answer("Список клиентов ещё загружается, выберите клиента с клавиатуры.")
+        return
+
+    clients = customer_catalogue.search(message.text, PER_PAGE)
+    if not clients:
+        await message.answer("Клиенты не найдены. Попробуйте другой запрос.")
+        return
+
+    await name_table.remember(client['name'] for client in clients)
+    await message_manager.update_message(message, state, f"Найдено клиентов: {len(clients)}",
+                                         reply_markup=create_clients_markup(clients, 1, len(clients)))
+
+
+@order_creation_router.callback_query(ClientPageCallback.filter())
+async def handle_pagination(callback: CallbackQuery, callback_data: ClientPageCallback, state: FSMContext):
+    await show_clients_list(callback, state, callback_data.page)
     await callback.answer()
 
 
-@order_creation_router.callback_query(lambda c: c.data.startswith("servicepage_"))
-async def handle_pagination(callback: CallbackQuery, state: FSMContext):
-    page = int(callback.data.split("_")[1])
-    await show_services_list(callback, state, page)
+@order_creation_router.callback_query(ServicePageCallback.filter())
+async def handle_services_pagination(callback: CallbackQuery, callback_data: ServicePageCallback,
+                                     state: FSMContext):
+    await show_services_list(callback, state, callback_data.page)
     await callback.answer()
 
 
-@order_creation_router.callback_query(lambda c: c.data.startswith("client_"), TerminalImport.customer_name)
-async def handle_client_selection(callback: CallbackQuery, state: FSMContext):
-    customer_name = callback.data.split("_")[-1]
-    customer_id = int(callback.data.split("_")[1])
-    await state.update_data(customer_name=customer_name, customer_id=customer_id)
+@order_creation_router.callback_query(ClientCallback.filter(), TerminalImport.customer_name)
+async def handle_client_selection(callback: CallbackQuery, callback_data: ClientCallback, state: FSMContext):
+    customer_name = await name_table.resolve(callback_data.name) or f"#{callback_data.id}"
+    await state.update_data(customer_name=customer_name, customer_id=callback_data.id)
     await state.set_state(TerminalImport.container_owner)
     await message_manager.update_message(callback, state, "Введите Собственника контейнера:",
-                                         reply_markup=back_keyboard.as_markup())
+                                         reply_markup=back_markup)
 
 
 @order_creation_router.message(TerminalImport.container_owner)
 async def handle_customer_owner(message: Message, state: FSMContext):
     await state.update_data(container_owner=message.text)
     await state.set_state(TerminalImport.date)
-    keyboard = await SimpleCalendar().start_calendar()
-    keyboard.inline_keyboard.append([InlineKeyboardButton(text="Назад", callback_data="back")])
-    await message_manager.update_message(message, state, "Выберите дату:", reply_markup=keyboard)
+    await message_manager.update_message(message, state, "Выберите дату:", reply_markup=await calendar_markup())
 
 
 @order_creation_router.callback_query(SimpleCalendarCallback.filter(), TerminalImport.date)
@@ -157,10 +184,10 @@ async def process_simple_calendar(callback_query: CallbackQuery, callback_data:
     calendar = SimpleCalendar(show_alerts=True)
     selected, date = await calendar.process_selection(callback_query, callback_data)
     if selected:
-        await state.update_data(date=date)
+        await state.update_data(date=date.strftime('%Y-%m-%d'))
         await state.set_state(TerminalImport.transport_type)
         await message_manager.update_message(callback_query, state, "Тип транспорта:",
-                                             reply_markup=transport_type_keyboard.as_markup())
+                                             reply_markup=transport_type_markup)
 
 
 @order_creation_router.callback_query(TerminalImport.transport_type, F.data != "back")
@@ -169,7 +196,7 @@ async def handle_transport_type(callback: CallbackQuery, state: FSMContext):
     await state.set_state(TerminalImport.transport_number)
     transport = 'Вагон' if callback.data == "wagon" else 'Авто'
     await message_manager.update_message(callback, state, f"Введите номер {transport}:",
-                                         reply_markup=back_keyboard.as_markup())
+                                         reply_markup=back_markup)
 
 
 @order_creation_router.message(TerminalImport.transport_number)
@@ -190,6 +217,7 @@ async def show_services_list(message: Message | CallbackQuery, state: FSMContext
         await message.answer("Не удалось получить список сервисов. Попробуйте позже.")
         return
 
+    await name_table.remember(service['service_type']['name'] for service in services)
     keyboard = create_services_keyboard(services, page, total_services, data.get('selected_services', []))
     await message_manager.update_message(message, state, "Выберите дополнительные услуги!",
                                          reply_markup=keyboard.as_markup())
@@ -205,13 +233,14 @@ def create_services_keyboard(services: list, current_page: int, total_services:
         service_name = f"{service['service_type']['name']}"
 
         button_text = f"✅ {service_name}" if is_selected else service_name
-        keyboard.button(text=button_text, callback_data=f"ss_{service_name}___{service_id}")
+        keyboard.button(text=button_text,
+                        callback_data=ServiceCallback(id=service_id, name=NameTable.short_id(service_name)))
 
     total_pages = (total_services - 1) // PER_PAGE + 1
     if current_page > 1:
-        keyboard.button(text="⬅️ Назад", callback_data=f"servicepage_{current_page - 1}")
+        keyboard.button(text="⬅️ Назад", callback_data=ServicePageCallback(page=current_page - 1))
     if current_page < total_pages:
-        keyboard.button(text="Вперед ➡️", callback_data=f"servicepage_{current_page + 1}")
+        keyboard.button(text="Вперед ➡️", callback_data=ServicePageCallback(page=current_page + 1))
 
     keyboard.button(text="Подтвердить ✅", callback_data="confirm_services")
     keyboard.button(text="◀️ Назад", callback_data="back")
@@ -219,23 +248,24 @@ def create_services_keyboard(services: list, current_page: int, total_services:
     return keyboard
 
 
-@order_creation_router.callback_query(lambda c: c.data.startswith("ss_"), F.data != "back")
-async def handle_service_selection(callback_query: CallbackQuery, state: FSMContext):
-    service_id = int(callback_query.data.split("___")[1])
-    service_name = callback_query.data.split("___")[0].split("_")[-1]
+@order_creation_router.callback_query(ServiceCallback.filter())
+async def handle_service_selection(callback_query: CallbackQuery, callback_data: ServiceCallback,
+                                   state: FSMContext):
+    service_id = callback_data.id
+    service_name = await name_table.resolve(callback_data.name) or f"#{service_id}"
     data = await state.get_data()
     selected_services = data.get('selected_services', [])
     selected_service_names = data.get('selected_service_names', [])
     if service_id in selected_services:
         selected_services.remove(service_id)
-        selected_service_names.remove(service_name)
+        if service_name in selected_service_names:
+            selected_service_names.remove(service_name)
 
     else:
         selected_services.append(service_id)
         selected_service_names.append(service_name)
 
-    await state.update_data(selected_services=selected_services)
-    await state.update_data(selected_service_names=selected_service_names)
+    await state.update_data(selected_services=selected_services, selected_service_names=selected_service_names)
     await show_services_list(callback_query, state)
 
 
@@ -248,14 +278,13 @@ async def handle_confirm_services(callback_query: CallbackQuery, state: FSMConte
         return
 
     await message_manager.update_message(callback_query, state, "Подтвердить ✅ ?",
-                                         reply_markup=confirmation_keyboard.as_markup())
+                                         reply_markup=confirmation_markup)
     await state.set_state(TerminalImport.confirmation)
 
 
 @order_creation_router.callback_query(lambda c: c.data == "confirm", TerminalImport.confirmation, F.data != "back")
 async def handle_confirm(callback_query: CallbackQuery, state: FSMContext):
     data = await state.get_data()
-    terminal_api = TerminalAPI()
     selected_services = [{"id": service_id} for service_id in data['selected_services']]
     container_data = {
         "container_size": data['container_size'],
@@ -266,24 +295,22 @@ async def handle_confirm(callback_query: CallbackQuery, state: FSMContext):
         "container_owner": data['container_owner'],
         "transport_type": data['transport_type'],
         "transport_number": data['transport_number'],
-        "entry_time": data['date'].strftime('%Y-%m-%d'),
+        "entry_time": data['date'],
         "services": selected_services,
     }
 
-    response = await terminal_api.register_container(container_data)
-
-    from bot import bot
-    await bot.send_message(chat_id=5331201165, text=json.dumps(response[0], ensure_ascii=False, indent=4))
-    if response[-1] == 201:
-        container_id = response[0]['id']
-        await state.update_data(container_id=container_id)
-        await callback_query.message.answer("Заявка успешно создана!!", reply_markup=ReplyKeyboardRemove())
-        await callback_query.message.answer("Отправьте фото контейнера")
-        await state.set_state(TerminalDocument.photo)
-
-    else:
-        await callback_query.answer("Произошла ошибка при создании заявки. Попробуйте еще раз.")
-
+    # Delivered by the outbox workers; the user gets the container id once the terminal API accepts it.
+    item = await registration_outbox.enqueue(callback_query.message.chat.id, callback_query.from_user.id,
+                                             container_data)
+    await state.clear()
+    await callback_query.answer()
+    await callback_query.message.answer(
+        f"Заявка на контейнер <b>{container_data['container_name']}</b> принята и будет отправлена на терминал. "
+        "Как только она будет создана, придёт ID заявки.",
+        reply_markup=ReplyKeyboardRemove(),
+    )
+    audit_log.emit("registration_queued", {"outbox_id": item.id, "payload": container_data},
+                   chat_id=callback_query.message.chat.id, user_id=callback_query.from_user.id)
 
 
 @order_creation_router.callback_query(F.data == "back")
@@ -317,17 +344,17 @@ async def handle_back(callback: CallbackQuery, state: FSMContext):
             await message_manager.update_message(callback, state, "Выберите тип заявки", reply_markup=start_keyboard)
         elif previous_state == TerminalImport.container_size:
             await message_manager.update_message(callback, state, "Выберите тип контейнера:",
-                                                 reply_markup=container_type_keyboard.as_markup())
+                                                 reply_markup=container_type_markup)
         elif previous_state == TerminalImport.container_name:
             await message_manager.update_message(callback, state, "Введите номер контейнера:",
-                                                 reply_markup=back_keyboard.as_markup())
+                                                 reply_markup=back_markup)
         elif previous_state == TerminalImport.container_state:
             await message_manager.update_message(callback, state, "Контейнер:",
-                                                 reply_markup=container_loading_keyboard.as_markup())
+                                                 reply_markup=container_loading_markup)
         elif previous_state == TerminalImport.product_name:
             if data.get('container_state') != 'EMPTY':
                 await message_manager.update_message(callback, state, "Введите название продукта:",
-                                                     reply_markup=back_keyboard.as_markup())
+                                                     reply_markup=back_markup)
             else:
                 await show_clients_list(callback, state)
         elif previous_state == TerminalImport.customer_name:
@@ -335,19 +362,17 @@ async def handle_back(callback: CallbackQuery, state: FSMContext):
         elif previous_state == TerminalImport.container_owner:
 
             await message_manager.update_message(callback, state, "Введите Собственника контейнера:",
-                                                 reply_markup=back_keyboard.as_markup())
+                                                 reply_markup=back_markup)
         elif previous_state == TerminalImport.date:
-            keyboard = await SimpleCalendar().start_calendar()
-            keyboard.inline_keyboard.append([InlineKeyboardButton(text="Назад", callback_data="back")])
             await message_manager.update_message(callback, state, "Выберите дату:",
-                                                 reply_markup=keyboard)
+                                                 reply_markup=await calendar_markup())
         elif previous_state == TerminalImport.transport_type:
             await message_manager.update_message(callback, state, "Тип транспорта:",
-                                                 reply_markup=transport_type_keyboard.as_markup())
+                                                 reply_markup=transport_type_markup)
         elif previous_state == TerminalImport.transport_number:
             transport = 'Вагон' if data.get('transport_type') == "wagon" else 'Авто'
             await message_manager.update_message(callback, state, f"Введите номер {transport}:",
-                                                 reply_markup=back_keyboard.as_markup())
+                                                 reply_markup=back_markup)
         elif previous_state == TerminalImport.selected_services:
             await show_services_list(callback, state)
 
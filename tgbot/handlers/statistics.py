@@ -2,14 +2,13 @@ from aiogram import Router
 from aiogram.filters import Command
 from aiogram.types import Message
 
-from infrastructure.api.terminal import TerminalAPI
+from infrastructure.api.terminal import terminal_api
 
 statistic_router = Router()
 
 
 @statistic_router.message(Command("statistics"))
 async def get_container(message: Message):
-    terminal_api = TerminalAPI()
     statistics = await terminal_api.get_statistics()
     statistics_message = f"""
 Общшее Количество контейнеров: <b>{statistics['total_containers']}</b>
@@ -0,0 +1,37 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+
+from tgbot.handlers import bulk
+
+ROW = [1, "MSKU9070323", "40HC", "64512345", ""]
+
+
+@pytest.mark.asyncio
+async def test_confirmation_returns_before_the_train_is_registered(monkeypatch):
+    release = asyncio.Event()
+
+    async def register_train(rows, shared, chat_id, user_id, concurrency=8):
+        await release.wait()
+        for row in rows:
+            row.status, row.result = "created", "ID 1"
+        return rows
+
+    monkeypatch.setattr(bulk, "register_train", register_train)
+    message = SimpleNamespace(chat=SimpleNamespace(id=1), edit_text=AsyncMock(), answer=AsyncMock())
+    callback = SimpleNamespace(message=message, from_user=SimpleNamespace(id=2), answer=AsyncMock())
+    state = SimpleNamespace(get_data=AsyncMock(return_value={"train_rows": [ROW]}), clear=AsyncMock())
+    config = SimpleNamespace(misc=SimpleNamespace(bulk_registration_concurrency=2))
+
+    await asyncio.wait_for(bulk.train_confirm(callback, state, config), timeout=1)
+    state.clear.assert_awaited_once()
+    message.answer.assert_not_awaited()
+
+    release.set()
+    await asyncio.gather(*bulk._registrations)
+    await asyncio.sleep(0)
+    assert message.answer.await_args_list[0].args[0].startswith("Создано: <b>1</b>")
+    assert "ID 1" in message.answer.await_args_list[1].args[0]
+    assert not bulk._registrations
@@ -0,0 +1,48 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from infrastructure.api.terminal import terminal_api
+from tgbot.handlers.document import document_router, get_document, load_visit
+from tgbot.misc.callbacks import SearchPageCallback
+from tgbot.misc.states import TerminalDocument
+
+VISITS = [
+    {"id": visit_id, "container": {"name": "MSKU9070323", "size": "40HC"}, "container_state": "empty",
+     "company": {"name": "Interrail"}, "entry_time": "2024-05-01", "services": [], "images": [], "documents": []}
+    for visit_id in range(1, 4)
+]
+
+
+@pytest.mark.asyncio
+async def test_only_the_shown_page_is_fetched_and_the_next_one_prefetched(monkeypatch):
+    requested = []
+
+    async def get_container_page(container_name, offset, limit):
+        requested.append((offset, limit))
+        return VISITS[offset:offset + limit], len(VISITS)
+
+    monkeypatch.setattr(terminal_api, "get_container_page", get_container_page)
+
+    text, reply_markup, count = await load_visit("MSKU9070323", 0)
+    await asyncio.sleep(0)
+    assert requested == [(0, 1), (1, 1)]
+    assert count == 3 and text.startswith("Визит <b>1</b> из <b>3</b>")
+    assert [button.text for button in reply_markup.inline_keyboard[-1]] == ["Вперед ➡️"]
+    assert SearchPageCallback.unpack(reply_markup.inline_keyboard[-1][0].callback_data).offset == 1
+
+    requested.clear()
+    _, reply_markup, _ = await load_visit("MSKU9070323", 2)
+    await asyncio.sleep(0)
+    assert requested == [(2, 1)]
+    assert [button.text for button in reply_markup.inline_keyboard[-1]] == ["⬅️ Назад"]
+
+
+@pytest.mark.asyncio
+async def test_commands_are_not_taken_for_a_container_number():
+    handler = next(handler for handler in document_router.message.handlers if handler.callback is get_document)
+    state = TerminalDocument.container_number.state
+
+    assert (await handler.check(SimpleNamespace(text="MSKU9070323"), raw_state=state))[0]
+    assert not (await handler.check(SimpleNamespace(text="/export"), raw_state=state))[0]
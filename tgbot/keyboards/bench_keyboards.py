@@ -0,0 +1,60 @@
+"""
+Micro-benchmark of building keyboards per update versus reusing prebuilt and cached markups.
+
+Run with: python -m tgbot.keyboards.bench_keyboards
+"""
+import asyncio
+import time
+import tracemalloc
+
+from aiogram.types import InlineKeyboardButton
+from aiogram_calendar import SimpleCalendar
+
+from tgbot.handlers.order import PER_PAGE, create_clients_markup
+from tgbot.keyboards.inline import back_keyboard, back_markup, calendar_markup, markup_cache
+
+ROUNDS = 2000
+CLIENTS = [{"id": i, "name": f"ООО Клиент {i}"} for i in range(1, PER_PAGE + 1)]
+
+
+async def rebuild_calendar():
+    keyboard = await SimpleCalendar().start_calendar()
+    keyboard.inline_keyboard.append([InlineKeyboardButton(text="Назад", callback_data="back")])
+    return keyboard
+
+
+async def measure(build) -> tuple[float, float, int]:
+    """Microseconds, allocated KiB and allocated blocks per call."""
+    await build()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    started = time.perf_counter()
+    kept = [await build() for _ in range(ROUNDS)]
+    elapsed = time.perf_counter() - started
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = after.compare_to(before, "filename")
+    size = sum(stat.size_diff for stat in stats)
+    blocks = sum(stat.count_diff for stat in stats)
+    del kept
+    return elapsed / ROUNDS * 1e6, size / ROUNDS / 1024, blocks // ROUNDS
+
+
+async def main():
+    cases = [
+        ("back, as_markup() per update", lambda: asyncio.sleep(0, back_keyboard.as_markup())),
+        ("back, prebuilt", lambda: asyncio.sleep(0, back_markup)),
+        ("clients page, rebuilt", lambda: asyncio.sleep(0, create_clients_markup(CLIENTS, 2, 1000))),
+        ("clients page, cached", lambda: asyncio.sleep(0, markup_cache.get_or_build(
+            ("clients", 0, 2), lambda: create_clients_markup(CLIENTS, 2, 1000)))),
+        ("calendar, rebuilt", rebuild_calendar),
+        ("calendar, cached", calendar_markup),
+    ]
+    print(f"{'case':32} {'us/call':>10} {'KiB/call':>10} {'blocks/call':>12}")
+    for name, build in cases:
+        micros, kib, blocks = await measure(build)
+        print(f"{name:32} {micros:10.1f} {kib:10.2f} {blocks:12d}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
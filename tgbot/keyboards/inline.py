@@ -1,5 +1,10 @@
+from collections import OrderedDict
+from datetime import date
+from typing import Callable, Hashable, Optional
+
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
+from aiogram_calendar import SimpleCalendar
 
 start_keyboard = InlineKeyboardMarkup(
     inline_keyboard=[
@@ -47,4 +52,62 @@ back_keyboard.button(text="◀️ Назад", callback_data="back")
 
 yes_no_keyboard = InlineKeyboardBuilder()
 yes_no_keyboard.button(text="Да", callback_data="yes")
-yes_no_keyboard.button(text="Нет", callback_data="no")
\ No newline at end of file
+yes_no_keyboard.button(text="Нет", callback_data="no")
+
+# Markups of the static keyboards, built once. Telegram objects are frozen, so they are shared safely;
+# handlers use these instead of calling as_markup() on every update.
+transport_type_markup = transport_type_keyboard.as_markup()
+container_type_markup = container_type_keyboard.as_markup()
+container_loading_markup = container_loading_keyboard.as_markup()
+confirmation_markup = confirmation_keyboard.as_markup()
+back_markup = back_keyboard.as_markup()
+yes_no_markup = yes_no_keyboard.as_markup()
+
+
+class MarkupCache:
+    """
+    LRU cache of built markups. Keys must include everything the markup depends on, e.g. the version
+    of the items it lists, so that a stale markup is never returned.
+    """
+
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._markups: OrderedDict[Hashable, InlineKeyboardMarkup] = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[InlineKeyboardMarkup]:
+        markup = self._markups.get(key)
+        if markup is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._markups.move_to_end(key)
+        return markup
+
+    def put(self, key: Hashable, markup: InlineKeyboardMarkup) -> InlineKeyboardMarkup:
+        self._markups[key] = markup
+        if len(self._markups) > self.max_size:
+            self._markups.popitem(last=False)
+        return markup
+
+    def get_or_build(self, key: Hashable, build: Callable[[], InlineKeyboardMarkup]) -> InlineKeyboardMarkup:
+        markup = self.get(key)
+        return markup if markup is not None else self.put(key, build())
+
+    def metrics(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._markups)}
+
+
+markup_cache = MarkupCache()
+
+
+async def calendar_markup() -> InlineKeyboardMarkup:
+    """Date picker for the current month with a back button, built once per day."""
+    today = date.today()
+    markup = markup_cache.get(("calendar", today))
+    if markup is None:
+        keyboard = await SimpleCalendar().start_calendar(year=today.year, month=today.month)
+        keyboard.inline_keyboard.append([InlineKeyboardButton(text="Назад", callback_data="back")])
+        markup = markup_cache.put(("calendar", today), keyboard)
+    return markup
@@ -0,0 +1,19 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from tgbot.utils.message_manager import message_manager
+
+
+class EditBatchMiddleware(BaseMiddleware):
+    """Sends the message edits a handler makes through the MessageManager once, when the handler is done."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        async with message_manager.batch():
+            return await handler(event, data)
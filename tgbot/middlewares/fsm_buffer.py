@@ -0,0 +1,140 @@
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiogram.fsm.storage.redis import RedisStorage
+from aiogram.types import TelegramObject
+
+
+class FSMBufferStats:
+    """
+    Storage round-trips the handlers asked for (requested) versus the ones actually made (performed).
+    An update_data or clear counts as the two round-trips the plain FSMContext makes for it.
+    """
+
+    def __init__(self):
+        self.updates = 0
+        self.requested = 0
+        self.performed = 0
+
+    def metrics(self) -> dict:
+        return {
+            "updates": self.updates,
+            "requested_round_trips": self.requested,
+            "performed_round_trips": self.performed,
+            "saved_round_trips": self.requested - self.performed,
+        }
+
+
+fsm_buffer_stats = FSMBufferStats()
+
+
+class BufferedFSMContext(FSMContext):
+    """
+    FSMContext that reads the storage at most once per update and writes back once at the end of it.
+
+    The state is taken from the value the FSM middleware already loaded, the data is loaded on first
+    use. Changes stay in memory until flush(), which writes state and data together, in one pipeline
+    for Redis storage.
+    """
+
+    def __init__(self, storage: BaseStorage, key: StorageKey, state: Optional[str]):
+        super().__init__(storage, key)
+        self._state = state
+        self._data: Optional[Dict[str, Any]] = None
+        self._state_dirty = False
+        self._data_dirty = False
+
+    async def _load_data(self) -> Dict[str, Any]:
+        if self._data is None:
+            self._data = await self.storage.get_data(key=self.key)
+            fsm_buffer_stats.performed += 1
+        return self._data
+
+    async def set_state(self, state: StateType = None) -> None:
+        fsm_buffer_stats.requested += 1
+        self._state = state.state if isinstance(state, State) else state
+        self._state_dirty = True
+
+    async def get_state(self) -> Optional[str]:
+        fsm_buffer_stats.requested += 1
+        return self._state
+
+    async def set_data(self, data: Dict[str, Any]) -> None:
+        fsm_buffer_stats.requested += 1
+        self._data = data.copy()
+        self._data_dirty = True
+
+    async def get_data(self) -> Dict[str, Any]:
+        fsm_buffer_stats.requested += 1
+        return (await self._load_data()).copy()
+
+    async def update_data(self, data: Optional[Dict[str, Any]] = None, **kwargs: Any) -> Dict[str, Any]:
+        if data:
+            kwargs.update(data)
+        fsm_buffer_stats.requested += 2
+        current = await self._load_data()
+        current.update(kwargs)
+        self._data_dirty = True
+        return current.copy()
+
+    async def clear(self) -> None:
+        await self.set_state(None)
+        await self.set_data({})
+
+    async def flush(self) -> None:
+        """Write the changed state and data to the storage."""
+        if not (self._state_dirty or self._data_dirty):
+            return
+        if isinstance(self.storage, RedisStorage):
+            await self._flush_redis(self.storage)
+        else:
+            if self._state_dirty:
+                await self.storage.set_state(key=self.key, state=self._state)
+                fsm_buffer_stats.performed += 1
+            if self._data_dirty:
+                await self.storage.set_data(key=self.key, data=self._data)
+                fsm_buffer_stats.performed += 1
+        self._state_dirty = self._data_dirty = False
+
+    async def _flush_redis(self, storage: RedisStorage) -> None:
+        # Same commands RedisStorage.set_state/set_data send, queued in a single round-trip.
+        async with storage.redis.pipeline(transaction=True) as pipe:
+            if self._state_dirty:
+                state_key = storage.key_builder.build(self.key, "state")
+                if self._state is None:
+                    pipe.delete(state_key)
+                else:
+                    pipe.set(state_key, self._state, ex=storage.state_ttl)
+            if self._data_dirty:
+                data_key = storage.key_builder.build(self.key, "data")
+                if not self._data:
+                    pipe.delete(data_key)
+                else:
+                    pipe.set(data_key, storage.json_dumps(self._data), ex=storage.data_ttl)
+            await pipe.execute()
+        fsm_buffer_stats.performed += 1
+
+
+class FSMBufferMiddleware(BaseMiddleware):
+    """Gives handlers a BufferedFSMContext and writes it back after the handler, even if the handler failed."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        state: Optional[FSMContext] = data.get("state")
+        if state is None:
+            return await handler(event, data)
+
+        buffered = BufferedFSMContext(state.storage, state.key, data.get("raw_state"))
+        data["state"] = buffered
+        fsm_buffer_stats.updates += 1
+        try:
+            return await handler(event, data)
+        finally:
+            await buffered.flush()
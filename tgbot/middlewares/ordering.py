@@ -0,0 +1,128 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.middlewares.user_context import EVENT_CONTEXT_KEY, EventContext
+from aiogram.fsm.context import FSMContext
+from aiogram.types import CallbackQuery, TelegramObject
+
+
+class OrderingStats:
+    """How often an update had to wait for an earlier one of its chat, and how many taps were dropped."""
+
+    def __init__(self):
+        self.serialized = 0
+        self.debounced = 0
+
+    def metrics(self) -> dict:
+        return {"waited_for_same_chat": self.serialized, "debounced_callbacks": self.debounced}
+
+
+ordering_stats = OrderingStats()
+
+
+class KeyedLock:
+    """One FIFO asyncio lock per key, dropped again as soon as nobody holds or waits for it."""
+
+    def __init__(self):
+        self._locks: Dict[Hashable, asyncio.Lock] = {}
+        self._users: Dict[Hashable, int] = {}
+
+    def locked(self, key: Hashable) -> bool:
+        lock = self._locks.get(key)
+        return lock is not None and lock.locked()
+
+    async def acquire(self, key: Hashable) -> None:
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        self._users[key] = self._users.get(key, 0) + 1
+        try:
+            await lock.acquire()
+        except BaseException:
+            self._forget(key)
+            raise
+
+    def release(self, key: Hashable) -> None:
+        self._locks[key].release()
+        self._forget(key)
+
+    def _forget(self, key: Hashable) -> None:
+        self._users[key] -= 1
+        if not self._users[key]:
+            del self._users[key]
+            del self._locks[key]
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+
+# Held while an update of the chat is handled; also taken by background code that changes a chat's FSM state.
+chat_locks = KeyedLock()
+
+
+class ChatOrderMiddleware(BaseMiddleware):
+    """
+    Runs the updates of one chat one at a time, in arrival order; other chats are not held up.
+
+    The FSM state is loaded before this middleware runs, so after waiting for an earlier update
+    it is loaded again to see what that update left behind.
+    """
+
+    def __init__(self, locks: KeyedLock = chat_locks):
+        self.locks = locks
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        context: Optional[EventContext] = data.get(EVENT_CONTEXT_KEY)
+        key = context and (context.chat_id or context.user_id)
+        if key is None:
+            return await handler(event, data)
+
+        contended = self.locks.locked(key)
+        await self.locks.acquire(key)
+        try:
+            state: Optional[FSMContext] = data.get("state")
+            if contended and state is not None:
+                ordering_stats.serialized += 1
+                data["raw_state"] = await state.get_state()
+            return await handler(event, data)
+        finally:
+            self.locks.release(key)
+
+
+class CallbackDebounceMiddleware(BaseMiddleware):
+    """
+    Drops a callback identical to one from the same user on the same message within window seconds,
+    so a double tap does not toggle twice or repeat the API calls and edits. The duplicate is still
+    answered to stop the button spinner.
+    """
+
+    def __init__(self, window: float = 1.0):
+        self.window = window
+        self._seen: Dict[tuple, float] = {}
+
+    def _is_duplicate(self, key: tuple) -> bool:
+        now = time.monotonic()
+        if len(self._seen) > 10_000:
+            self._seen = {seen: at for seen, at in self._seen.items() if now - at < self.window}
+        last = self._seen.get(key)
+        self._seen[key] = now
+        return last is not None and now - last < self.window
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if isinstance(event, CallbackQuery):
+            message_id = event.message.message_id if event.message else event.inline_message_id
+            if self._is_duplicate((event.from_user.id, message_id, event.data)):
+                ordering_stats.debounced += 1
+                await event.answer()
+                return None
+        return await handler(event, data)
@@ -0,0 +1,38 @@
+from unittest.mock import AsyncMock
+
+import pytest
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from tgbot.middlewares.fsm_buffer import FSMBufferMiddleware, fsm_buffer_stats
+from tgbot.misc.states import TerminalImport
+
+
+@pytest.mark.asyncio
+async def test_reads_are_served_from_memory_and_written_back_once():
+    storage = MemoryStorage()
+    key = StorageKey(bot_id=1, chat_id=2, user_id=2)
+    await storage.set_data(key, {"container_size": "20"})
+    storage.get_data = AsyncMock(wraps=storage.get_data)
+    storage.set_data = AsyncMock(wraps=storage.set_data)
+    storage.set_state = AsyncMock(wraps=storage.set_state)
+
+    async def handler(event, data):
+        state = data["state"]
+        await state.get_data()
+        await state.update_data(container_name="ABCU1234560")
+        await state.update_data(container_state="loaded")
+        assert (await state.get_data())["container_name"] == "ABCU1234560"
+        await state.set_state(TerminalImport.transport_type)
+
+    before = fsm_buffer_stats.requested - fsm_buffer_stats.performed
+    await FSMBufferMiddleware()(handler, None, {"state": FSMContext(storage, key), "raw_state": None})
+
+    assert storage.get_data.await_count == 1
+    assert storage.set_data.await_count == 1
+    assert storage.set_state.await_count == 1
+    assert await storage.get_state(key) == TerminalImport.transport_type.state
+    assert await storage.get_data(key) == {"container_size": "20", "container_name": "ABCU1234560",
+                                           "container_state": "loaded"}
+    assert fsm_buffer_stats.requested - fsm_buffer_stats.performed - before == 4
@@ -0,0 +1,51 @@
+import asyncio
+import datetime
+from unittest.mock import AsyncMock
+
+import pytest
+from aiogram.dispatcher.middlewares.user_context import EVENT_CONTEXT_KEY, EventContext
+from aiogram.types import CallbackQuery, Chat, Message, User
+
+from tgbot.middlewares.ordering import CallbackDebounceMiddleware, ChatOrderMiddleware
+
+
+@pytest.mark.asyncio
+async def test_same_chat_runs_in_order_other_chats_in_parallel():
+    middleware = ChatOrderMiddleware()
+    log = []
+
+    async def handler(event, data):
+        log.append(("start", event))
+        await asyncio.sleep(0.05)
+        log.append(("end", event))
+
+    def run(chat_id, name):
+        context = EventContext(chat=Chat(id=chat_id, type="private"), user=User(id=chat_id, is_bot=False,
+                                                                                first_name="x"))
+        return middleware(handler, name, {EVENT_CONTEXT_KEY: context})
+
+    await asyncio.gather(run(1, "a1"), run(1, "a2"), run(2, "b1"))
+
+    assert log.index(("end", "a1")) < log.index(("start", "a2"))
+    assert log.index(("start", "b1")) < log.index(("end", "a1"))
+    assert len(middleware.locks) == 0
+
+
+@pytest.mark.asyncio
+async def test_double_tap_is_debounced(monkeypatch):
+    answer = AsyncMock()
+    monkeypatch.setattr(CallbackQuery, "answer", answer)
+    middleware = CallbackDebounceMiddleware(window=1.0)
+    handler = AsyncMock()
+    user = User(id=1, is_bot=False, first_name="x")
+    message = Message(message_id=10, date=datetime.datetime.now(), chat=Chat(id=1, type="private"))
+
+    def tap(data):
+        return CallbackQuery(id="1", from_user=user, chat_instance="1", message=message, data=data)
+
+    await middleware(handler, tap("ss_5"), {})
+    await middleware(handler, tap("ss_5"), {})
+    await middleware(handler, tap("ss_6"), {})
+
+    assert handler.await_count == 2
+    answer.assert_awaited_once()
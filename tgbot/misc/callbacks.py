@@ -0,0 +1,96 @@
+import base64
+import hashlib
+from collections import OrderedDict
+from enum import Enum
+from typing import Iterable, Optional
+
+from aiogram.filters.callback_data import CallbackData
+
+from infrastructure.api.cache import BaseCache, MemoryCache
+
+
+class NameTable:
+    """
+    Server-side table of names that do not fit into callback data.
+
+    A name is referred to by a short id derived from its hash, so every bot process computes the same
+    id without coordination. The id -> name mapping is kept in the given cache backend (Redis when
+    the bot runs with it) behind a small in-process front.
+    """
+
+    ID_BYTES = 6  # 8 base64 characters
+
+    def __init__(self, cache: BaseCache, ttl: int = 30 * 24 * 3600, local_size: int = 50_000):
+        self.cache = cache
+        self.ttl = ttl
+        self.local_size = local_size
+        self._local: OrderedDict[str, str] = OrderedDict()
+
+    def set_cache(self, cache: BaseCache):
+        self.cache = cache
+
+    @classmethod
+    def short_id(cls, name: str) -> str:
+        digest = hashlib.blake2b(name.encode(), digest_size=cls.ID_BYTES).digest()
+        return base64.urlsafe_b64encode(digest).decode()
+
+    def _keep(self, short_id: str, name: str) -> None:
+        self._local[short_id] = name
+        self._local.move_to_end(short_id)
+        if len(self._local) > self.local_size:
+            self._local.popitem(last=False)
+
+    async def remember(self, names: Iterable[str]) -> None:
+        """Store names that are about to be put on buttons. Names this process already stored are skipped."""
+        for name in names:
+            short_id = self.short_id(name)
+            if short_id not in self._local:
+                await self.cache.set(f"name:{short_id}", name, self.ttl)
+                self._keep(short_id, name)
+
+    async def resolve(self, short_id: str) -> Optional[str]:
+        name = self._local.get(short_id)
+        if name is None:
+            name = await self.cache.get(f"name:{short_id}")
+            if name is not None:
+                self._keep(short_id, name)
+        return name
+
+
+name_table = NameTable(MemoryCache(max_size=50_000))
+
+
+class ClientCallback(CallbackData, prefix="cl"):
+    id: int
+    name: str  # NameTable short id
+
+
+class ClientPageCallback(CallbackData, prefix="cp"):
+    page: int
+
+
+class ServiceCallback(CallbackData, prefix="sv"):
+    id: int
+    name: str  # NameTable short id
+
+
+class ServicePageCallback(CallbackData, prefix="sp"):
+    page: int
+
+
+class SearchPageCallback(CallbackData, prefix="sr"):
+    query: str  # NameTable short id
+    offset: int
+
+
+class ContainerAction(str, Enum):
+    add_photo = "ap"
+    add_document = "ad"
+    photos = "p"
+    documents = "d"
+
+
+class ContainerCallback(CallbackData, prefix="ct"):
+    action: ContainerAction
+    id: int
+    name: str  # NameTable short id
@@ -25,3 +25,18 @@ class TerminalDocument(StatesGroup):
     container_id = State()
     photo = State()
     document = State()
+
+
+class BulkContainers(StatesGroup):
+    numbers = State()
+
+
+class BulkRegistration(StatesGroup):
+    container_state = State()
+    customer_name = State()
+    container_owner = State()
+    date = State()
+    transport_type = State()
+    selected_services = State()
+    rows = State()
+    confirmation = State()
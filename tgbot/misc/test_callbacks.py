@@ -0,0 +1,45 @@
+import random
+import string
+
+import pytest
+
+from infrastructure.api.cache import MemoryCache
+from tgbot.misc.callbacks import ClientCallback, ContainerAction, ContainerCallback, NameTable, ServiceCallback
+
+ALPHABET = string.printable + "АБВГДЕЁЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯабвгдеёжзийклмнопрстуфхцчшщъыьэюя«»—№_:💼"
+
+
+def random_name(rng: random.Random) -> str:
+    return "".join(rng.choice(ALPHABET) for _ in range(rng.randint(1, 200)))
+
+
+@pytest.mark.asyncio
+async def test_round_trip_fuzz():
+    rng = random.Random(6346)
+    table = NameTable(MemoryCache(max_size=10_000), local_size=100)
+
+    for _ in range(2000):
+        name = random_name(rng)
+        item_id = rng.randint(0, 2 ** 53)
+        await table.remember([name])
+        short_id = NameTable.short_id(name)
+        callbacks = [
+            ClientCallback(id=item_id, name=short_id),
+            ServiceCallback(id=item_id, name=short_id),
+            ContainerCallback(action=rng.choice(list(ContainerAction)), id=item_id, name=short_id),
+        ]
+        for callback in callbacks:
+            packed = callback.pack()
+            assert len(packed.encode()) <= 64
+            assert type(callback).unpack(packed) == callback
+        assert await table.resolve(short_id) == name
+
+
+@pytest.mark.asyncio
+async def test_names_survive_local_eviction_and_other_processes():
+    cache = MemoryCache(max_size=100)
+    await NameTable(cache, local_size=1).remember(["ООО «Рога_и_Копыта»", "Another"])
+
+    other_process = NameTable(cache)
+    assert await other_process.resolve(NameTable.short_id("ООО «Рога_и_Копыта»")) == "ООО «Рога_и_Копыта»"
+    assert await other_process.resolve(NameTable.short_id("unknown")) is None
@@ -0,0 +1,183 @@
+import asyncio
+import html
+import json
+import logging
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Optional
+
+from aiogram import Bot
+from aiogram import exceptions
+from redis.asyncio import Redis
+
+# Telegram rejects messages longer than this.
+MESSAGE_LIMIT = 4096
+
+
+@dataclass
+class AuditEvent:
+    """Something worth keeping a record of, e.g. a registered container."""
+
+    kind: str
+    data: dict
+    chat_id: Optional[int] = None
+    user_id: Optional[int] = None
+    at: float = field(default_factory=time.time)
+
+    def to_json(self, **kwargs) -> str:
+        return json.dumps(asdict(self), ensure_ascii=False, default=str, **kwargs)
+
+
+class BaseAuditSink:
+    """Destination of audit events. Receives them in batches."""
+
+    async def write(self, events: list[AuditEvent]) -> None:
+        raise NotImplementedError
+
+
+class TelegramAuditSink(BaseAuditSink):
+    """Posts events to an admin chat, packing as many of them into one message as fit."""
+
+    def __init__(self, bot: Bot, chat_id: int):
+        self.bot = bot
+        self.chat_id = chat_id
+
+    @staticmethod
+    def format(event: AuditEvent) -> str:
+        moment = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(event.at))
+        body = html.escape(json.dumps(event.data, ensure_ascii=False, indent=2, default=str))
+        return f"<b>{event.kind}</b> {moment} chat {event.chat_id}\n<pre>{body}</pre>"
+
+    async def write(self, events: list[AuditEvent]) -> None:
+        messages, current = [], ""
+        for event in events:
+            # An event too long for one message is cut down to its headline.
+            text = self.format(event)
+            if len(text) > MESSAGE_LIMIT:
+                text = f"<b>{event.kind}</b> (слишком длинное, см. журнал)"
+            if current and len(current) + len(text) + 2 > MESSAGE_LIMIT:
+                messages.append(current)
+                current = ""
+            current = f"{current}\n\n{text}" if current else text
+        if current:
+            messages.append(current)
+
+        for text in messages:
+            try:
+                await self.bot.send_message(self.chat_id, text, disable_notification=True)
+            except exceptions.TelegramRetryAfter as e:
+                await asyncio.sleep(e.retry_after)
+                await self.bot.send_message(self.chat_id, text, disable_notification=True)
+
+
+class JsonlAuditSink(BaseAuditSink):
+    """Appends events to a file, one JSON object per line."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _append(self, lines: str) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+    async def write(self, events: list[AuditEvent]) -> None:
+        await asyncio.to_thread(self._append, "".join(event.to_json() + "\n" for event in events))
+
+
+class RedisAuditSink(BaseAuditSink):
+    """Adds events to a capped Redis stream in one pipelined round-trip."""
+
+    def __init__(self, redis: Redis, key: str = "audit", max_len: int = 100_000):
+        self.redis = redis
+        self.key = key
+        self.max_len = max_len
+
+    async def write(self, events: list[AuditEvent]) -> None:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for event in events:
+                pipe.xadd(self.key, {"event": event.to_json()}, maxlen=self.max_len, approximate=True)
+            await pipe.execute()
+
+
+class AuditLog:
+    """
+    In-process audit queue. emit() never waits; a background consumer hands the events to the sinks
+    in batches of up to batch_size, or whatever has gathered after flush_interval seconds.
+    """
+
+    def __init__(self, batch_size: int = 20, flush_interval: float = 5.0, max_queue: int = 10_000):
+        self.sinks: list[BaseAuditSink] = []
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.emitted = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed_writes = 0
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._consumer: Optional[asyncio.Task] = None
+
+    def configure(self, sinks: list[BaseAuditSink], batch_size: int, flush_interval: float):
+        self.sinks = sinks
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+    def emit(self, kind: str, data: dict, chat_id: Optional[int] = None, user_id: Optional[int] = None) -> None:
+        """Queue an event. When the queue is full the event is dropped rather than slowing the caller."""
+        try:
+            self._queue.put_nowait(AuditEvent(kind=kind, data=data, chat_id=chat_id, user_id=user_id))
+            self.emitted += 1
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def start(self) -> None:
+        self._consumer = asyncio.create_task(self._consume())
+
+    async def stop(self) -> None:
+        """Stop the consumer and write out what is still queued."""
+        if self._consumer:
+            self._consumer.cancel()
+            await asyncio.gather(self._consumer, return_exceptions=True)
+            self._consumer = None
+        while not self._queue.empty():
+            await self._write(self._take_batch())
+
+    def _take_batch(self) -> list[AuditEvent]:
+        batch = []
+        while len(batch) < self.batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _consume(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._write(batch)
+
+    async def _write(self, batch: list[AuditEvent]) -> None:
+        results = await asyncio.gather(*(sink.write(batch) for sink in self.sinks), return_exceptions=True)
+        for sink, result in zip(self.sinks, results):
+            if isinstance(result, BaseException):
+                self.failed_writes += 1
+                logging.error(f"Audit sink {type(sink).__name__} failed to write {len(batch)} events: {result!r}")
+        self.written += len(batch)
+
+    def metrics(self) -> dict:
+        return {
+            "emitted": self.emitted,
+            "written": self.written,
+            "queued": self._queue.qsize(),
+            "dropped": self.dropped,
+            "failed_writes": self.failed_writes,
+            "sinks": ", ".join(type(sink).__name__ for sink in self.sinks) or "-",
+        }
+
+
+audit_log = AuditLog()
@@ -1,6 +1,11 @@
 import asyncio
+import hashlib
+import json
 import logging
-from typing import Union
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Optional, Union
 
 from aiogram import Bot
 from aiogram import exceptions
@@ -51,33 +56,195 @@ async def send_message(
     return False
 
 
+class TokenBucket:
+    """Allows rate acquisitions per second on average, with bursts of up to capacity."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class ChatRateLimiter:
+    """Keeps at least interval seconds between two messages to the same chat."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._next_allowed: dict[Union[int, str], float] = {}
+
+    async def acquire(self, chat_id: Union[int, str]) -> None:
+        now = time.monotonic()
+        allowed = self._next_allowed.get(chat_id, now)
+        self._next_allowed[chat_id] = max(allowed, now) + self.interval
+        if allowed > now:
+            await asyncio.sleep(allowed - now)
+
+
+@dataclass
+class BroadcastReport:
+    """Outcome of a broadcast."""
+
+    total: int = 0
+    sent: int = 0
+    skipped: int = 0
+    blocked: list = field(default_factory=list)
+    failed: dict = field(default_factory=dict)
+    flood_waits: int = 0
+    duration: float = 0.0
+
+
+class BroadcastCursor:
+    """
+    Persists how far a broadcast got, so an interrupted one can be resumed without re-sending.
+
+    The cursor is the number of leading recipients that are all done. It is tied to the recipients
+    and text of the broadcast and removed once the broadcast completes.
+    """
+
+    def __init__(self, path: str, users: list, text: str):
+        self.path = path
+        self.key = hashlib.sha256(json.dumps([users, text], default=str).encode()).hexdigest()
+        self.position = 0
+        self._done: set[int] = set()
+
+    def load(self) -> int:
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        if saved.get("key") == self.key:
+            self.position = saved["position"]
+        return self.position
+
+    def mark_done(self, index: int) -> None:
+        self._done.add(index)
+        while self.position in self._done:
+            self._done.remove(self.position)
+            self.position += 1
+
+    def save(self) -> None:
+        with open(self.path, "w") as f:
+            json.dump({"key": self.key, "position": self.position}, f)
+
+    def clear(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
 async def broadcast(
     bot: Bot,
     users: list[Union[str, int]],
     text: str,
     disable_notification: bool = False,
     reply_markup: InlineKeyboardMarkup = None,
-) -> int:
+    rate: float = 25,
+    per_chat_interval: float = 1.0,
+    concurrency: int = 10,
+    max_attempts: int = 3,
+    cursor_path: Optional[str] = None,
+) -> BroadcastReport:
     """
-    Simple broadcaster.
+    Concurrent rate-limited broadcaster.
+
+    Messages go out through a global token bucket (rate messages per second, a margin below Telegram's
+    ~30/s) and a per-chat interval. A flood-control answer pauses every sender for retry_after seconds
+    instead of only the one that hit it.
+
     :param bot: Bot instance.
     :param users: List of users.
     :param text: Text of the message.
     :param disable_notification: Disable notification or not.
     :param reply_markup: Reply markup.
-    :return: Count of messages.
+    :param rate: Global messages per second.
+    :param per_chat_interval: Minimum seconds between messages to the same chat.
+    :param concurrency: Number of messages in flight.
+    :param max_attempts: Attempts per recipient when Telegram asks to retry later.
+    :param cursor_path: File to persist progress in; a broadcast with the same users and text resumes from it.
+    :return: Delivery report.
     """
-    count = 0
+    started = time.monotonic()
+    report = BroadcastReport(total=len(users))
+    bucket = TokenBucket(rate)
+    chat_limiter = ChatRateLimiter(per_chat_interval)
+    resume = asyncio.Event()
+    resume.set()
+
+    cursor = BroadcastCursor(cursor_path, users, text) if cursor_path else None
+    start_index = cursor.load() if cursor else 0
+    report.skipped = start_index
+
+    queue: asyncio.Queue = asyncio.Queue()
+    for index in range(start_index, len(users)):
+        queue.put_nowait(index)
+
+    async def deliver(user_id: Union[int, str]) -> None:
+        attempts = 0
+        while attempts < max_attempts:
+            await resume.wait()
+            await chat_limiter.acquire(user_id)
+            await bucket.acquire()
+            try:
+                await bot.send_message(user_id, text, disable_notification=disable_notification,
+                                       reply_markup=reply_markup)
+            except exceptions.TelegramRetryAfter as e:
+                report.flood_waits += 1
+                # Only the sender that starts the pause spends an attempt; the others were caught by the
+                # same flood limit and retry once it is over.
+                if resume.is_set():
+                    attempts += 1
+                    logging.warning(f"Flood limit is exceeded, pausing the broadcast for {e.retry_after} seconds")
+                    resume.clear()
+                    await asyncio.sleep(e.retry_after)
+                    resume.set()
+                continue
+            except exceptions.TelegramForbiddenError:
+                report.blocked.append(user_id)
+            except exceptions.TelegramAPIError as e:
+                report.failed[user_id] = e.message
+            else:
+                report.sent += 1
+            return
+        report.failed[user_id] = "flood limit retries exhausted"
+
+    completed = 0
+
+    async def worker() -> None:
+        nonlocal completed
+        while not queue.empty():
+            index = queue.get_nowait()
+            await deliver(users[index])
+            completed += 1
+            if cursor:
+                cursor.mark_done(index)
+                if completed % 50 == 0:
+                    cursor.save()
+
     try:
-        for user_id in users:
-            if await send_message(
-                bot, user_id, text, disable_notification, reply_markup
-            ):
-                count += 1
-            await asyncio.sleep(
-                0.05
-            )  # 20 messages per second (Limit: 30 messages per second)
+        await asyncio.gather(*(worker() for _ in range(min(concurrency, len(users)) or 1)))
     finally:
-        logging.info(f"{count} messages successful sent.")
+        report.duration = time.monotonic() - started
+        if cursor:
+            if cursor.position >= len(users):
+                cursor.clear()
+            else:
+                cursor.save()
+        logging.info(
+            f"Broadcast: {report.sent}/{report.total} sent, {len(report.blocked)} blocked, "
+            f"{len(report.failed)} failed, {report.skipped} skipped in {report.duration:.1f}s"
+        )
 
-    return count
+    return report
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from infrastructure.api.terminal import TerminalAPI, terminal_api
+from tgbot.utils.search import CustomerIndex
+
+
+class CustomerCatalogue:
+    """
+    Local copy of the terminal customer list, refreshed in the background.
+
+    The whole list is fetched in large pages at startup and then every refresh_interval seconds.
+    Readers always get the last complete snapshot, so a running refresh never blocks them.
+    """
+
+    def __init__(self, api: TerminalAPI, refresh_interval: int = 600, page_size: int = 500):
+        self.api = api
+        self.refresh_interval = refresh_interval
+        self.page_size = page_size
+        self.customers: list[dict] = []
+        self.index = CustomerIndex([])
+        self.version = 0
+        self.refreshed_at: Optional[float] = None
+        self.refresh_duration: Optional[float] = None
+        self.refresh_failures = 0
+        self.refreshing = False
+        self._task: Optional[asyncio.Task] = None
+
+    def configure(self, refresh_interval: int, page_size: int):
+        self.refresh_interval = refresh_interval
+        self.page_size = page_size
+
+    @property
+    def ready(self) -> bool:
+        return self.refreshed_at is not None
+
+    @property
+    def age(self) -> Optional[float]:
+        """Seconds since the last successful refresh."""
+        if self.refreshed_at is None:
+            return None
+        return time.monotonic() - self.refreshed_at
+
+    def page(self, offset: int, limit: int) -> tuple[list, int]:
+        """Slice of the catalogue in the same shape as TerminalAPI.get_clients."""
+        customers = self.customers
+        return customers[offset:offset + limit], len(customers)
+
+    def search(self, query: str, limit: int) -> list[dict]:
+        """Customers whose names match the query, see CustomerIndex."""
+        return self.index.search(query, limit)
+
+    async def refresh(self) -> None:
+        """Fetch the full customer list and swap it in once complete."""
+        self.refreshing = True
+        started = time.monotonic()
+        try:
+            customers = []
+            async for page in self.api.iter_pages(f"{self.api.API_URL}customers/list/", page_size=self.page_size):
+                customers.extend(page)
+        except Exception:
+            self.refresh_failures += 1
+            logging.exception("Customer catalogue refresh failed, serving the previous snapshot")
+            return
+        finally:
+            self.refreshing = False
+
+        self.index = CustomerIndex(customers)
+        self.customers = customers
+        self.version += 1
+        self.refreshed_at = time.monotonic()
+        self.refresh_duration = self.refreshed_at - started
+        logging.info(f"Customer catalogue refreshed: {len(customers)} customers in {self.refresh_duration:.2f}s")
+
+    async def _run(self) -> None:
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.refresh_interval)
+
+    async def start(self) -> None:
+        """Start the background refresh loop. Registered on the dispatcher startup."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def metrics(self) -> dict:
+        return {
+            "items": len(self.customers),
+            "version": self.version,
+            "age_seconds": round(self.age, 1) if self.age is not None else None,
+            "refresh_duration_seconds": round(self.refresh_duration, 3) if self.refresh_duration is not None else None,
+            "refreshing": self.refreshing,
+            "refresh_failures": self.refresh_failures,
+        }
+
+
+customer_catalogue = CustomerCatalogue(terminal_api)
@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import time
+from typing import Iterable, Optional
+
+from infrastructure.api.terminal import TerminalAPI, terminal_api
+
+
+def is_active(visit: dict) -> bool:
+    """A container visit is active until the container has left the terminal."""
+    return visit.get('exit_time') is None
+
+
+class ActiveContainerIndex:
+    """
+    Local set of the numbers of containers currently at the terminal (visits without an exit time).
+
+    The set is rebuilt in the background every refresh_interval seconds and updated in between by this
+    process: numbers it registers are added, and numbers found to have left are dropped. Changes made
+    while a rebuild is running are replayed onto the new set, so none is lost by the swap.
+
+    A number missing from a fresh snapshot is answered locally; a number in the set, or any number while
+    the snapshot is missing or older than max_age, is confirmed against the API. A container registered
+    outside this process (another bot worker, the terminal's own UI) after the last rebuild is therefore
+    missed for up to max_age seconds; max_age=0 confirms every number with the API.
+    """
+
+    def __init__(self, api: TerminalAPI, refresh_interval: int = 300, page_size: int = 1000, max_age: int = 360):
+        self.api = api
+        self.refresh_interval = refresh_interval
+        self.page_size = page_size
+        self.max_age = max_age
+        self.active: set[str] = set()
+        # Changes made while a rebuild is running, as (added, container_name); None when not rebuilding.
+        self._changes: Optional[list[tuple[bool, str]]] = None
+        self.refreshed_at: Optional[float] = None
+        self.refresh_duration: Optional[float] = None
+        self.refresh_failures = 0
+        self.refreshing = False
+        self.local_answers = 0
+        self.api_checks = 0
+        self.stale_hits = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def configure(self, refresh_interval: int, page_size: int, max_age: int):
+        self.refresh_interval = refresh_interval
+        self.page_size = page_size
+        self.max_age = max_age
+
+    @property
+    def age(self) -> Optional[float]:
+        """Seconds since the last successful refresh."""
+        if self.refreshed_at is None:
+            return None
+        return time.monotonic() - self.refreshed_at
+
+    @property
+    def fresh(self) -> bool:
+        return self.age is not None and self.age <= self.max_age
+
+    def add(self, container_names: Iterable[str]) -> None:
+        for name in container_names:
+            self.active.add(name.upper())
+            if self._changes is not None:
+                self._changes.append((True, name.upper()))
+
+    def discard(self, container_name: str) -> None:
+        self.active.discard(container_name.upper())
+        if self._changes is not None:
+            self._changes.append((False, container_name.upper()))
+
+    async def has_open_visit(self, container_name: str) -> bool:
+        """Ask the API, walking every page of the container's visits: the open one need not be on the first."""
+        async for page in self.api.iter_pages(f"{self.api.API_URL}containers/containers_visit_list/",
+                                              params={'container_name': container_name}, page_size=100):
+            # The API matches on a part of the number.
+            if any(is_active(visit) for visit in page if visit['container']['name'].upper() == container_name):
+                return True
+        return False
+
+    async def is_active(self, container_name: str) -> bool:
+        """Whether a visit of this container is open, asking the API only when the index cannot rule it out."""
+        container_name = container_name.upper()
+        if self.fresh and container_name not in self.active:
+            self.local_answers += 1
+            return False
+
+        self.api_checks += 1
+        if await self.has_open_visit(container_name):
+            self.add([container_name])
+            return True
+        if container_name in self.active:
+            self.stale_hits += 1
+            self.discard(container_name)
+        return False
+
+    async def find_active(self, container_names: Iterable[str], concurrency: int = 8) -> set[str]:
+        """Which of the containers are at the terminal. The API checks of probable hits run concurrently."""
+        slots = asyncio.Semaphore(concurrency)
+
+        async def check(container_name: str) -> tuple[str, bool]:
+            async with slots:
+                return container_name, await self.is_active(container_name)
+
+        results = await asyncio.gather(*(check(name.upper()) for name in container_names))
+        return {name for name, active in results if active}
+
+    async def refresh(self) -> None:
+        """Walk the visit list and swap in the numbers of the active containers once complete."""
+        self.refreshing = True
+        self._changes = []
+        started = time.monotonic()
+        try:
+            active = set()
+            async for page in self.api.iter_pages(f"{self.api.API_URL}containers/containers_visit_list/",
+                                                  page_size=self.page_size):
+                active.update(visit['container']['name'].upper() for visit in page if is_active(visit))
+        except Exception:
+            self.refresh_failures += 1
+            logging.exception("Active container index refresh failed, keeping the previous snapshot")
+            return
+        finally:
+            self.refreshing = False
+            changes, self._changes = self._changes, None
+
+        for added, name in changes:
+            if added:
+                active.add(name)
+            else:
+                active.discard(name)
+        self.active = active
+        self.refreshed_at = time.monotonic()
+        self.refresh_duration = self.refreshed_at - started
+        logging.info(f"Active container index refreshed: {len(active)} containers in {self.refresh_duration:.2f}s")
+
+    async def _run(self) -> None:
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.refresh_interval)
+
+    async def start(self) -> None:
+        """Start the background refresh loop. Registered on the dispatcher startup."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def metrics(self) -> dict:
+        return {
+            "active": len(self.active),
+            "age_seconds": round(self.age, 1) if self.age is not None else None,
+            "refresh_duration_seconds": round(self.refresh_duration, 3) if self.refresh_duration is not None else None,
+            "refreshing": self.refreshing,
+            "refresh_failures": self.refresh_failures,
+            "answered_locally": self.local_answers,
+            "checked_with_api": self.api_checks,
+            "stale_hits": self.stale_hits,
+        }
+
+
+active_containers = ActiveContainerIndex(terminal_api)
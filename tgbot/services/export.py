@@ -0,0 +1,130 @@
+import csv
+import re
+from dataclasses import dataclass
+from datetime import date
+from typing import AsyncIterator, Optional
+
+from openpyxl import Workbook
+
+from infrastructure.api.terminal import terminal_api
+from tgbot.utils.search import fold
+from tgbot.utils.validators import validate_container_number
+
+HEADER = ["ID", "Контейнер", "Размер", "Состояние", "Клиент", "Дата прибытия", "Дата убытия",
+          "Транспорт", "Номер транспорта", "Услуги"]
+FORMATS = ("csv", "xlsx")
+# "from=2024-01-01 customer=Uzbek Trans format=xlsx": a value runs until the next key.
+OPTION_RE = re.compile(r"(\w+)=(.*?)(?=\s+\w+=|$)")
+
+
+@dataclass
+class VisitFilter:
+    """
+    Which visits to export. The container number goes to the API; the dates and the customer are
+    checked locally, because the visit list cannot filter by them.
+    """
+
+    container_name: Optional[str] = None
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
+    customer: Optional[str] = None
+
+    def params(self) -> dict:
+        return {'container_name': self.container_name} if self.container_name else {}
+
+    def matches(self, visit: dict) -> bool:
+        entry_date = (visit.get('entry_time') or "")[:10]
+        if self.date_from and entry_date < self.date_from.isoformat():
+            return False
+        if self.date_to and entry_date > self.date_to.isoformat():
+            return False
+        if self.container_name and visit['container']['name'].upper() != self.container_name:
+            return False
+        if self.customer and fold(self.customer) not in fold((visit.get('company') or {}).get('name') or ""):
+            return False
+        return True
+
+
+def parse_export_args(args: Optional[str]) -> tuple[VisitFilter, str]:
+    """
+    Parse "[container] [from=YYYY-MM-DD] [to=YYYY-MM-DD] [customer=name] [format=csv|xlsx]".
+    Raises ValueError with a message for the user.
+    """
+    args = (args or "").strip()
+    visit_filter = VisitFilter()
+    first, _, rest = args.partition(" ")
+    if first and "=" not in first:
+        visit_filter.container_name = validate_container_number(first)
+        if visit_filter.container_name is None:
+            raise ValueError(f"Неверный номер контейнера: {first}")
+        args = rest
+
+    export_format = "csv"
+    for key, value in OPTION_RE.findall(args.strip()):
+        value = value.strip()
+        if key in ("from", "to"):
+            try:
+                day = date.fromisoformat(value)
+            except ValueError:
+                raise ValueError(f"Неверная дата {value}, нужен формат ГГГГ-ММ-ДД")
+            if key == "from":
+                visit_filter.date_from = day
+            else:
+                visit_filter.date_to = day
+        elif key == "customer":
+            visit_filter.customer = value or None
+        elif key == "format" and value.lower() in FORMATS:
+            export_format = value.lower()
+        else:
+            raise ValueError(f"Неизвестный параметр {key}={value}")
+    return visit_filter, export_format
+
+
+def visit_row(visit: dict) -> list:
+    container = visit.get('container') or {}
+    return [
+        visit.get('id'),
+        container.get('name'),
+        container.get('size'),
+        visit.get('container_state'),
+        (visit.get('company') or {}).get('name'),
+        visit.get('entry_time'),
+        visit.get('exit_time'),
+        visit.get('transport_type'),
+        visit.get('transport_number'),
+        "; ".join(service['service_type']['name'] for service in visit.get('services') or []),
+    ]
+
+
+async def iter_visit_rows(visit_filter: VisitFilter, page_size: int = 500) -> AsyncIterator[list]:
+    """Rows of the matching visits, fetched page by page; at most one page is held in memory."""
+    async for page in terminal_api.iter_pages(f"{terminal_api.API_URL}containers/containers_visit_list/",
+                                              params=visit_filter.params(), page_size=page_size):
+        for visit in page:
+            if visit_filter.matches(visit):
+                yield visit_row(visit)
+
+
+async def write_csv(rows: AsyncIterator[list], path: str) -> int:
+    """Write the rows as they arrive. Semicolons and a BOM make Excel open the file as a table."""
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8-sig") as file:
+        writer = csv.writer(file, delimiter=";")
+        writer.writerow(HEADER)
+        async for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+async def write_xlsx(rows: AsyncIterator[list], path: str) -> int:
+    """Write the rows with a write-only workbook, which streams them to disk."""
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Визиты")
+    sheet.append(HEADER)
+    count = 0
+    async for row in rows:
+        sheet.append(row)
+        count += 1
+    workbook.save(path)
+    return count
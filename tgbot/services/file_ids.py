@@ -0,0 +1,101 @@
+import asyncio
+import sqlite3
+import threading
+from typing import Optional
+
+from redis.asyncio import Redis
+
+
+class BaseFileIdStore:
+    """Persistent mapping of terminal media keys (e.g. "image:12") to Telegram file ids."""
+
+    async def get_many(self, keys: list[str]) -> dict[str, str]:
+        raise NotImplementedError
+
+    async def set_many(self, file_ids: dict[str, str]) -> None:
+        raise NotImplementedError
+
+
+class SQLiteFileIdStore(BaseFileIdStore):
+    """File id store in a local SQLite file. Queries run in a worker thread."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS file_ids (key TEXT PRIMARY KEY, file_id TEXT NOT NULL)"
+            )
+        return self._connection
+
+    def _get_many(self, keys: list[str]) -> dict[str, str]:
+        with self._lock:
+            placeholders = ",".join("?" * len(keys))
+            rows = self._connect().execute(
+                f"SELECT key, file_id FROM file_ids WHERE key IN ({placeholders})", keys
+            ).fetchall()
+        return dict(rows)
+
+    def _set_many(self, file_ids: dict[str, str]) -> None:
+        with self._lock:
+            connection = self._connect()
+            connection.executemany("INSERT OR REPLACE INTO file_ids (key, file_id) VALUES (?, ?)", file_ids.items())
+            connection.commit()
+
+    async def get_many(self, keys: list[str]) -> dict[str, str]:
+        if not keys:
+            return {}
+        return await asyncio.to_thread(self._get_many, keys)
+
+    async def set_many(self, file_ids: dict[str, str]) -> None:
+        if file_ids:
+            await asyncio.to_thread(self._set_many, file_ids)
+
+
+class RedisFileIdStore(BaseFileIdStore):
+    """File id store in a Redis hash, shared between bot replicas."""
+
+    def __init__(self, redis: Redis, key: str = "telegram_file_ids"):
+        self.redis = redis
+        self.key = key
+
+    async def get_many(self, keys: list[str]) -> dict[str, str]:
+        if not keys:
+            return {}
+        values = await self.redis.hmget(self.key, keys)
+        return {key: value.decode() for key, value in zip(keys, values) if value is not None}
+
+    async def set_many(self, file_ids: dict[str, str]) -> None:
+        if file_ids:
+            await self.redis.hset(self.key, mapping=file_ids)
+
+
+class FileIdCache:
+    """Front of the configured file id store that also counts hits and misses."""
+
+    def __init__(self, store: BaseFileIdStore):
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+
+    def set_store(self, store: BaseFileIdStore):
+        self.store = store
+
+    async def get_many(self, keys: list[str]) -> dict[str, str]:
+        found = await self.store.get_many(keys)
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    async def set_many(self, file_ids: dict[str, str]) -> None:
+        await self.store.set_many(file_ids)
+
+    def metrics(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "store": type(self.store).__name__}
+
+
+file_id_cache = FileIdCache(SQLiteFileIdStore("file_ids.sqlite3"))
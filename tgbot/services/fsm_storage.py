@@ -0,0 +1,77 @@
+import logging
+
+from aiogram.fsm.storage.redis import DefaultKeyBuilder, RedisStorage
+from redis.asyncio import ConnectionPool, Redis
+
+from tgbot.config import RedisConfig
+
+# Prefix aiogram's DefaultKeyBuilder uses when none is given; FSM keys written before the
+# namespace was introduced start with it.
+LEGACY_FSM_PREFIX = "fsm"
+MIGRATION_BATCH = 500
+
+
+def create_redis(config: RedisConfig) -> Redis:
+    """Redis client on a bounded connection pool, shared by the FSM storage, caches and queues."""
+    pool = ConnectionPool.from_url(
+        config.dsn(),
+        max_connections=config.max_connections,
+        socket_timeout=config.socket_timeout,
+        socket_connect_timeout=config.socket_connect_timeout,
+        socket_keepalive=True,
+        health_check_interval=config.health_check_interval,
+        retry_on_timeout=True,
+    )
+    return Redis(connection_pool=pool)
+
+
+def create_storage(redis: Redis, config: RedisConfig) -> RedisStorage:
+    """FSM storage under "<key_prefix>:fsm" whose records expire after the configured TTLs."""
+    return RedisStorage(
+        redis=redis,
+        key_builder=DefaultKeyBuilder(prefix=f"{config.key_prefix}:fsm", with_bot_id=True, with_destiny=True),
+        state_ttl=config.state_ttl,
+        data_ttl=config.data_ttl,
+    )
+
+
+async def migrate_legacy_keys(redis: Redis, bot_id: int, config: RedisConfig) -> int:
+    """
+    Move FSM records of this bot from the old "fsm:" keys into the namespace, so wizards in progress
+    survive the switch. Records that already exist in the namespace win. Every moved record gets
+    the TTL of its kind. Safe to run on every start and from several processes at once.
+
+    :return: Number of records moved.
+    """
+    moved = 0
+    keys = []
+    async for key in redis.scan_iter(match=f"{LEGACY_FSM_PREFIX}:{bot_id}:*", count=MIGRATION_BATCH):
+        key = key.decode() if isinstance(key, bytes) else key
+        if key.endswith((":state", ":data")):
+            keys.append(key)
+        if len(keys) >= MIGRATION_BATCH:
+            moved += await _move(redis, keys, config)
+            keys = []
+    if keys:
+        moved += await _move(redis, keys, config)
+    if moved:
+        logging.info(f"Migrated {moved} FSM records to the '{config.key_prefix}' namespace")
+    return moved
+
+
+async def _move(redis: Redis, keys: list[str], config: RedisConfig) -> int:
+    async with redis.pipeline(transaction=False) as pipe:
+        for key in keys:
+            pipe.renamenx(key, f"{config.key_prefix}:{key}")
+        renamed = await pipe.execute(raise_on_error=False)
+
+        for key, result in zip(keys, renamed):
+            new_key = f"{config.key_prefix}:{key}"
+            if result is True:
+                ttl = config.state_ttl if key.endswith(":state") else config.data_ttl
+                pipe.expire(new_key, ttl)
+            elif result is False:
+                # Newer record already in the namespace; the legacy one is stale.
+                pipe.delete(key)
+        await pipe.execute()
+    return sum(1 for result in renamed if result is True)
@@ -0,0 +1,136 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional, Type, Union
+
+import aiohttp
+from aiogram import Bot
+from aiogram.types import BufferedInputFile, InputMediaDocument, InputMediaPhoto, Message
+from aiohttp.payload import AsyncIterablePayload
+
+from infrastructure.api.terminal import terminal_api
+from tgbot.services.file_ids import file_id_cache
+
+# Size of the pieces a relayed file is moved in. Together with the download read buffer this bounds
+# the memory one transfer can hold, independent of the file size.
+RELAY_CHUNK_SIZE = 64 * 1024
+RELAY_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=60)
+# Telegram accepts at most 10 items per media group.
+MEDIA_GROUP_SIZE = 10
+DOWNLOAD_CONCURRENCY = 5
+DOWNLOAD_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=30)
+
+
+@dataclass
+class MediaFile:
+    """A container photo or document stored on the terminal API. key identifies it in the file id cache."""
+
+    key: str
+    url: str
+    filename: str
+
+
+class SizedStreamPayload(AsyncIterablePayload):
+    """Streamed payload with a length known upfront, so the multipart body still gets a Content-Length."""
+
+    def __init__(self, value, size: Optional[int], *args, **kwargs):
+        super().__init__(value, *args, **kwargs)
+        self._size = size
+
+
+async def relay_telegram_file(bot: Bot, file_id: str,
+                              upload: Callable[[aiohttp.FormData], Awaitable[Optional[dict]]],
+                              filename: str, content_type: str = "application/octet-stream") -> Optional[dict]:
+    """
+    Pipe a file from the Telegram servers into a terminal API upload chunk by chunk.
+
+    :param bot: Bot instance, used to resolve the file path and the file server URL.
+    :param file_id: Telegram file id.
+    :param upload: Coroutine function posting the form, e.g. terminal_api.add_photo bound to a container.
+    :param filename: File name sent to the terminal API.
+    :param content_type: Content type of the file part.
+    :return: The record created by the upload, or None if the terminal API rejected the file.
+    """
+    file = await bot.get_file(file_id)
+    url = bot.session.api.file_url(bot.token, file.file_path)
+
+    async with terminal_api.session.get(url, timeout=RELAY_TIMEOUT, read_bufsize=RELAY_CHUNK_SIZE) as response:
+        response.raise_for_status()
+        payload = SizedStreamPayload(response.content.iter_chunked(RELAY_CHUNK_SIZE), size=file.file_size,
+                                     content_type=content_type)
+        data = aiohttp.FormData()
+        data.add_field('file', payload, filename=filename)
+        return await upload(data)
+
+
+async def _download(url: str, semaphore: asyncio.Semaphore) -> Optional[bytes]:
+    async with semaphore:
+        try:
+            async with terminal_api.session.get(url, timeout=DOWNLOAD_TIMEOUT) as response:
+                if response.status == 200:
+                    return await response.read()
+                logging.warning(f"Download of {url} failed with HTTP {response.status}")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logging.warning(f"Download of {url} failed: {e!r}")
+    return None
+
+
+async def send_media_files(message: Message, files: list[MediaFile],
+                           media_type: Type[Union[InputMediaPhoto, InputMediaDocument]]) -> int:
+    """
+    Send files to the chat in media groups, re-using Telegram file ids where they are known.
+
+    Files without a cached file id are downloaded concurrently into memory through a shared
+    semaphore. The next group is already being downloaded while the current one is sent, so at most
+    two groups are held in memory. File ids of newly uploaded files are stored for the next time.
+
+    :param message: Message to answer in the same chat.
+    :param files: Files to send.
+    :param media_type: InputMediaPhoto or InputMediaDocument.
+    :return: Number of files sent.
+    """
+    semaphore = asyncio.Semaphore(DOWNLOAD_CONCURRENCY)
+    cached = await file_id_cache.get_many([file.key for file in files])
+    groups = [files[i:i + MEDIA_GROUP_SIZE] for i in range(0, len(files), MEDIA_GROUP_SIZE)]
+
+    async def fetch(file: MediaFile) -> Optional[Union[str, BufferedInputFile]]:
+        if file.key in cached:
+            return cached[file.key]
+        content = await _download(file.url, semaphore)
+        return BufferedInputFile(content, filename=file.filename) if content is not None else None
+
+    def start_group(group: list[MediaFile]) -> asyncio.Future:
+        return asyncio.gather(*(fetch(file) for file in group))
+
+    sent = 0
+    pending = start_group(groups[0]) if groups else None
+    for index, group in enumerate(groups):
+        contents = await pending
+        pending = start_group(groups[index + 1]) if index + 1 < len(groups) else None
+
+        ready = [(file, content) for file, content in zip(group, contents) if content is not None]
+        if len(ready) == 1:
+            if media_type is InputMediaPhoto:
+                messages = [await message.answer_photo(photo=ready[0][1])]
+            else:
+                messages = [await message.answer_document(document=ready[0][1])]
+        elif ready:
+            messages = await message.answer_media_group(media=[media_type(media=content) for _, content in ready])
+        else:
+            messages = []
+
+        await file_id_cache.set_many({
+            file.key: _sent_file_id(sent_message)
+            for (file, content), sent_message in zip(ready, messages)
+            if isinstance(content, BufferedInputFile) and _sent_file_id(sent_message)
+        })
+        sent += len(ready)
+    return sent
+
+
+def _sent_file_id(message: Message) -> Optional[str]:
+    if message.photo:
+        return message.photo[-1].file_id
+    if message.document:
+        return message.document.file_id
+    return None
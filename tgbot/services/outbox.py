@@ -0,0 +1,357 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from redis.asyncio import Redis
+
+from infrastructure.api.exceptions import TerminalAPIUnavailable
+from infrastructure.api.resilience import backoff_delay
+from infrastructure.api.terminal import terminal_api
+from tgbot.middlewares.ordering import chat_locks
+from tgbot.misc.states import TerminalDocument
+from tgbot.services.audit import audit_log
+from tgbot.services.containers import active_containers
+
+
+# 201 for a new visit; 200 when the API replays the answer to an idempotency key it already accepted.
+ACCEPTED_STATUSES = (200, 201)
+# Timeouts and rate limiting on the API side: the payload is fine, try again later.
+RETRY_STATUSES = (408, 429)
+
+
+def is_replay(response: Optional[dict], payload: dict, idempotency_key: str) -> bool:
+    """
+    Whether a 409 answer is about this very registration, made by an earlier attempt whose answer was lost:
+    it echoes the idempotency key, or carries the id of a visit of the same container.
+    A conflict with any other visit is a real duplicate.
+    """
+    response = response or {}
+    if response.get('idempotency_key') == idempotency_key:
+        return True
+    container = response.get('container')
+    name = container.get('name') if isinstance(container, dict) else response.get('container_name')
+    return response.get('id') is not None and str(name or "").upper() == payload['container_name'].upper()
+
+
+def registration_outcome(status: int, response: Optional[dict], payload: dict, idempotency_key: str) -> str:
+    """How an answer of register_container is handled: "created", "retry" or "rejected"."""
+    if status in ACCEPTED_STATUSES or (status == 409 and is_replay(response, payload, idempotency_key)):
+        return "created"
+    if status in RETRY_STATUSES:
+        return "retry"
+    return "rejected"
+
+
+@dataclass
+class OutboxItem:
+    """A container registration waiting to be delivered. id doubles as the idempotency key."""
+
+    chat_id: int
+    user_id: int
+    payload: dict
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    attempts: int = 0
+    created_at: float = field(default_factory=time.time)
+
+    def to_json(self) -> str:
+        return json.dumps(self.__dict__, ensure_ascii=False)
+
+    @staticmethod
+    def from_json(raw) -> "OutboxItem":
+        return OutboxItem(**json.loads(raw))
+
+
+class BaseOutboxStore:
+    """Durable queue of outbox items. Claimed items are leased and become due again if not resolved."""
+
+    async def add(self, item: OutboxItem) -> None:
+        raise NotImplementedError
+
+    async def claim_due(self, limit: int, lease: float) -> list[OutboxItem]:
+        raise NotImplementedError
+
+    async def reschedule(self, item: OutboxItem, delay: float) -> None:
+        raise NotImplementedError
+
+    async def remove(self, item: OutboxItem) -> None:
+        raise NotImplementedError
+
+    async def pending(self) -> int:
+        raise NotImplementedError
+
+
+class SQLiteOutboxStore(BaseOutboxStore):
+    """Outbox in a local SQLite file. Queries run in a worker thread."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS outbox (id TEXT PRIMARY KEY, item TEXT NOT NULL, due_at REAL NOT NULL)"
+            )
+        return self._connection
+
+    def _execute(self, query: str, *params) -> list:
+        with self._lock:
+            return self._connect().execute(query, params).fetchall()
+
+    def _claim_due(self, limit: int, lease: float) -> list[OutboxItem]:
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                rows = connection.execute(
+                    "SELECT id, item FROM outbox WHERE due_at <= ? ORDER BY due_at LIMIT ?", (now, limit)
+                ).fetchall()
+                connection.executemany("UPDATE outbox SET due_at = ? WHERE id = ?",
+                                       [(now + lease, item_id) for item_id, _ in rows])
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        return [OutboxItem.from_json(item) for _, item in rows]
+
+    async def add(self, item: OutboxItem) -> None:
+        await asyncio.to_thread(self._execute, "INSERT INTO outbox (id, item, due_at) VALUES (?, ?, ?)",
+                                item.id, item.to_json(), time.time())
+
+    async def claim_due(self, limit: int, lease: float) -> list[OutboxItem]:
+        return await asyncio.to_thread(self._claim_due, limit, lease)
+
+    async def reschedule(self, item: OutboxItem, delay: float) -> None:
+        await asyncio.to_thread(self._execute, "UPDATE outbox SET item = ?, due_at = ? WHERE id = ?",
+                                item.to_json(), time.time() + delay, item.id)
+
+    async def remove(self, item: OutboxItem) -> None:
+        await asyncio.to_thread(self._execute, "DELETE FROM outbox WHERE id = ?", item.id)
+
+    async def pending(self) -> int:
+        rows = await asyncio.to_thread(self._execute, "SELECT COUNT(*) FROM outbox")
+        return rows[0][0]
+
+
+class RedisOutboxStore(BaseOutboxStore):
+    """Outbox in Redis: items in a hash and due times in a sorted set, shared between bot replicas."""
+
+    # Atomically take due ids and push their due time forward by the lease.
+    CLAIM_SCRIPT = """
+    local ids = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[3])
+    for _, id in ipairs(ids) do
+        redis.call('ZADD', KEYS[1], ARGV[2], id)
+    end
+    return ids
+    """
+
+    def __init__(self, redis: Redis, prefix: str = "outbox"):
+        self.redis = redis
+        self.items_key = f"{prefix}:items"
+        self.due_key = f"{prefix}:due"
+        self._claim = redis.register_script(self.CLAIM_SCRIPT)
+
+    async def add(self, item: OutboxItem) -> None:
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self.items_key, item.id, item.to_json())
+            pipe.zadd(self.due_key, {item.id: time.time()})
+            await pipe.execute()
+
+    async def claim_due(self, limit: int, lease: float) -> list[OutboxItem]:
+        now = time.time()
+        ids = await self._claim(keys=[self.due_key], args=[now, now + lease, limit])
+        if not ids:
+            return []
+        raw_items = await self.redis.hmget(self.items_key, ids)
+        return [OutboxItem.from_json(raw) for raw in raw_items if raw is not None]
+
+    async def reschedule(self, item: OutboxItem, delay: float) -> None:
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self.items_key, item.id, item.to_json())
+            pipe.zadd(self.due_key, {item.id: time.time() + delay})
+            await pipe.execute()
+
+    async def remove(self, item: OutboxItem) -> None:
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hdel(self.items_key, item.id)
+            pipe.zrem(self.due_key, item.id)
+            await pipe.execute()
+
+    async def pending(self) -> int:
+        return await self.redis.zcard(self.due_key)
+
+
+class RegistrationOutbox:
+    """
+    Accepts container registrations immediately and delivers them to the terminal API in the background.
+
+    A poller claims due items from the store, no more than there are idle workers so that none waits out
+    its lease in memory, and a pool of workers posts them with the item id as idempotency key.
+    Unavailable API -> retried with backoff; rejected payload -> dropped and the user is told why;
+    success -> the user gets the container id and is asked for photos.
+    """
+
+    def __init__(self, store: BaseOutboxStore, workers: int = 4, lease: float = 120.0,
+                 poll_interval: float = 2.0, max_attempts: int = 30):
+        self.store = store
+        self.workers = workers
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.delivered = 0
+        self.rejected = 0
+        self.retried = 0
+        self._idle = 0
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._wakeup = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+        self._bot: Optional[Bot] = None
+        self._dispatcher: Optional[Dispatcher] = None
+
+    def configure(self, store: BaseOutboxStore, workers: int, max_attempts: int, poll_interval: float):
+        self.store = store
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+
+    async def enqueue(self, chat_id: int, user_id: int, payload: dict, item_id: Optional[str] = None) -> OutboxItem:
+        """Queue a registration. Pass item_id to keep the idempotency key of an earlier attempt."""
+        item = OutboxItem(chat_id=chat_id, user_id=user_id, payload=payload)
+        if item_id is not None:
+            item.id = item_id
+        await self.store.add(item)
+        self._wakeup.set()
+        return item
+
+    async def start(self, bot: Bot, dispatcher: Dispatcher) -> None:
+        """Start the poller and the workers. Registered on the dispatcher startup."""
+        self._bot = bot
+        self._dispatcher = dispatcher
+        self._tasks = [asyncio.create_task(self._poll())]
+        self._tasks += [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _poll(self) -> None:
+        while True:
+            try:
+                free = self._idle - self._queue.qsize()
+                if free > 0:
+                    for item in await self.store.claim_due(free, self.lease):
+                        self._queue.put_nowait(item)
+            except Exception:
+                logging.exception("Outbox poll failed")
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _work(self) -> None:
+        while True:
+            self._idle += 1
+            try:
+                item = await self._queue.get()
+            finally:
+                self._idle -= 1
+            try:
+                await self._deliver(item)
+            except Exception:
+                logging.exception(f"Outbox item {item.id} delivery crashed, it will be retried after the lease")
+            self._wakeup.set()
+
+    async def _deliver(self, item: OutboxItem) -> None:
+        item.attempts += 1
+        try:
+            response, status = await terminal_api.register_container(item.payload, idempotency_key=item.id)
+        except TerminalAPIUnavailable as e:
+            await self._retry_later(item, str(e))
+            return
+        outcome = registration_outcome(status, response, item.payload, item.id)
+        if outcome == "retry":
+            await self._retry_later(item, f"HTTP {status}")
+            return
+
+        await self.store.remove(item)
+        if outcome == "created":
+            self.delivered += 1
+            active_containers.add([item.payload['container_name']])
+            await self._notify_success(item, response)
+        else:
+            self.rejected += 1
+            logging.error(f"Outbox item {item.id} rejected with HTTP {status}: {response}")
+            await self._notify_failure(item, json.dumps(response, ensure_ascii=False))
+            audit_log.emit("container_rejected", {"outbox_id": item.id, "status": status, "response": response,
+                                                  "payload": item.payload}, chat_id=item.chat_id, user_id=item.user_id)
+
+    async def _retry_later(self, item: OutboxItem, reason: str) -> None:
+        if item.attempts >= self.max_attempts:
+            await self.store.remove(item)
+            self.rejected += 1
+            await self._notify_failure(item, "сервер терминала недоступен")
+            audit_log.emit("container_abandoned", {"outbox_id": item.id, "attempts": item.attempts,
+                                                   "payload": item.payload},
+                           chat_id=item.chat_id, user_id=item.user_id)
+            return
+        self.retried += 1
+        delay = max(5.0, backoff_delay(item.attempts, base=5.0, cap=300.0))
+        logging.warning(f"Outbox item {item.id} not delivered ({reason}), retry #{item.attempts} in {delay:.0f}s")
+        await self.store.reschedule(item, delay)
+
+    async def _notify_success(self, item: OutboxItem, response: Optional[dict]) -> None:
+        container_id = (response or {}).get('id')
+        text = f"Заявка на контейнер <b>{item.payload['container_name']}</b> успешно создана!!"
+        if container_id is not None:
+            text += f" ID: <b>{container_id}</b>"
+            key = StorageKey(bot_id=self._bot.id, chat_id=item.chat_id, user_id=item.user_id)
+            state = FSMContext(storage=self._dispatcher.storage, key=key)
+            # Ask for photos right away unless the user has already started something else. An update of this
+            # chat must not read or overwrite the state in between: the storage's event isolation (a Redis lock
+            # when the chat is handled by another bot process) and the chat lock of this process are taken in
+            # the order the update middlewares take them.
+            async with self._dispatcher.fsm.events_isolation.lock(key):
+                await chat_locks.acquire(item.chat_id)
+                try:
+                    if await state.get_state() is None:
+                        await state.update_data(container_id=container_id)
+                        await state.set_state(TerminalDocument.photo)
+                        text += "\nОтправьте фото контейнера"
+                finally:
+                    chat_locks.release(item.chat_id)
+        await self._bot.send_message(item.chat_id, text)
+        audit_log.emit("container_registered", {"outbox_id": item.id, "attempts": item.attempts, "response": response},
+                       chat_id=item.chat_id, user_id=item.user_id)
+
+    async def _notify_failure(self, item: OutboxItem, reason: str) -> None:
+        await self._bot.send_message(
+            item.chat_id,
+            f"Не удалось зарегистрировать контейнер <b>{item.payload['container_name']}</b>: {reason}",
+        )
+
+    def metrics(self) -> dict:
+        return {
+            "queued_in_memory": self._queue.qsize(),
+            "delivered": self.delivered,
+            "rejected": self.rejected,
+            "retried": self.retried,
+            "store": type(self.store).__name__,
+        }
+
+
+registration_outbox = RegistrationOutbox(SQLiteOutboxStore("outbox.sqlite3"))
@@ -0,0 +1,35 @@
+import asyncio
+import json
+from unittest.mock import AsyncMock
+
+import pytest
+
+from tgbot.services.audit import AuditEvent, AuditLog, JsonlAuditSink, MESSAGE_LIMIT, TelegramAuditSink
+
+
+@pytest.mark.asyncio
+async def test_events_are_batched_to_sinks(tmp_path):
+    path = tmp_path / "audit.jsonl"
+    log = AuditLog()
+    log.configure([JsonlAuditSink(str(path))], batch_size=10, flush_interval=0.05)
+    await log.start()
+    for number in range(25):
+        log.emit("container_registered", {"id": number}, chat_id=1)
+    await asyncio.sleep(0.2)
+    await log.stop()
+
+    lines = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [line["data"]["id"] for line in lines] == list(range(25))
+    assert log.metrics()["written"] == 25
+
+
+@pytest.mark.asyncio
+async def test_telegram_sink_packs_events_into_few_messages():
+    bot = AsyncMock()
+    events = [AuditEvent(kind="container_registered", data={"payload": "x" * 500}) for _ in range(20)]
+    await TelegramAuditSink(bot, chat_id=1).write(events)
+
+    texts = [call.args[1] for call in bot.send_message.await_args_list]
+    assert 1 < len(texts) < len(events)
+    assert all(len(text) <= MESSAGE_LIMIT for text in texts)
+    assert sum(text.count("container_registered") for text in texts) == len(events)
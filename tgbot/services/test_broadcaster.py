@@ -0,0 +1,31 @@
+import asyncio
+
+import pytest
+from aiogram import exceptions
+from aiogram.methods import SendMessage
+
+from tgbot.services.broadcaster import broadcast
+
+
+class FloodedBot:
+    """Answers the first flooded_calls sends with a flood-control error."""
+
+    def __init__(self, flooded_calls: int):
+        self.flooded_calls = flooded_calls
+        self.calls = 0
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.calls += 1
+        flooded = self.calls <= self.flooded_calls
+        await asyncio.sleep(0.01)
+        if flooded:
+            raise exceptions.TelegramRetryAfter(method=SendMessage(chat_id=chat_id, text=text),
+                                                message="Too Many Requests", retry_after=0)
+
+
+@pytest.mark.asyncio
+async def test_senders_caught_by_someone_elses_pause_keep_their_attempt():
+    report = await broadcast(FloodedBot(flooded_calls=5), [1, 2, 3, 4, 5], "hi", concurrency=5, max_attempts=1)
+    # Only the sender that started the pause spent its single attempt.
+    assert report.sent == 4
+    assert list(report.failed.values()) == ["flood limit retries exhausted"]
@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+from tgbot.services.containers import ActiveContainerIndex
+
+
+def visit(name: str, exit_time=None) -> dict:
+    return {"container": {"name": name}, "exit_time": exit_time}
+
+
+class VisitListAPI:
+    API_URL = "https://terminal/"
+
+    def __init__(self, visits: list):
+        self.visits = visits
+        self.lookups = []
+
+    async def iter_pages(self, url, params=None, page_size=100):
+        visits = self.visits
+        if params and "container_name" in params:
+            self.lookups.append(params["container_name"])
+            # The API matches on a part of the number.
+            visits = [visit for visit in visits if params["container_name"] in visit["container"]["name"]]
+        for offset in range(0, len(visits), page_size):
+            yield visits[offset:offset + page_size]
+
+
+@pytest.mark.asyncio
+async def test_only_probable_hits_reach_the_api():
+    api = VisitListAPI([visit("MSCU1234565"), visit("TGHU7654321", exit_time="2024-05-01T10:00:00")])
+    index = ActiveContainerIndex(api, page_size=1)
+    await index.refresh()
+    assert index.active == {"MSCU1234565"}
+
+    assert not await index.is_active("tghu7654321")
+    assert not await index.is_active("ABCU0000001")
+    assert api.lookups == []
+
+    assert await index.is_active("MSCU1234565")
+    assert api.lookups == ["MSCU1234565"]
+
+
+@pytest.mark.asyncio
+async def test_stale_or_missing_snapshot_falls_back_to_the_api():
+    api = VisitListAPI([visit("MSCU1234565")])
+    index = ActiveContainerIndex(api, max_age=0)
+    assert await index.is_active("MSCU1234565")
+    assert api.lookups == ["MSCU1234565"]
+
+    # A number that has left since the snapshot is confirmed once and then dropped.
+    index = ActiveContainerIndex(api)
+    await index.refresh()
+    api.visits = [visit("MSCU1234565", exit_time="2024-05-01T10:00:00")]
+    assert not await index.is_active("MSCU1234565")
+    assert index.active == set() and index.stale_hits == 1
+
+
+@pytest.mark.asyncio
+async def test_a_truncated_partial_match_is_not_a_duplicate():
+    api = VisitListAPI([visit("MSCU12345651", exit_time="2024-05-01T10:00:00"), visit("MSCU1234565")])
+    index = ActiveContainerIndex(api, max_age=0)
+    assert not await index.is_active("MSCU123456")
+
+
+@pytest.mark.asyncio
+async def test_an_open_visit_past_the_first_page_is_found():
+    api = VisitListAPI([visit("MSCU1234565", exit_time=f"2024-05-{day:02}T10:00:00") for day in range(1, 29)] * 5
+                       + [visit("MSCU1234565")])
+    index = ActiveContainerIndex(api, max_age=0)
+    assert await index.is_active("MSCU1234565")
+
+
+class PausedVisitListAPI(VisitListAPI):
+    """Stops the full walk after its first page until resumed."""
+
+    def __init__(self, visits: list):
+        super().__init__(visits)
+        self.paused = asyncio.Event()
+        self.resume = asyncio.Event()
+
+    async def iter_pages(self, url, params=None, page_size=100):
+        first = True
+        async for page in super().iter_pages(url, params, page_size):
+            yield page
+            if first and not params:
+                first = False
+                self.paused.set()
+                await self.resume.wait()
+
+
+@pytest.mark.asyncio
+async def test_changes_made_during_a_refresh_survive_the_swap():
+    api = PausedVisitListAPI([visit("MSCU1234565"), visit("TGHU7654321")])
+    index = ActiveContainerIndex(api, page_size=1)
+    refresh = asyncio.create_task(index.refresh())
+    await api.paused.wait()
+
+    index.add(["ABCU0000001"])
+    index.discard("TGHU7654321")
+    api.resume.set()
+    await refresh
+
+    assert index.active == {"MSCU1234565", "ABCU0000001"}
@@ -0,0 +1,60 @@
+import csv
+from datetime import date
+
+import pytest
+from openpyxl import load_workbook
+
+from tgbot.services.export import HEADER, VisitFilter, parse_export_args, visit_row, write_csv, write_xlsx
+
+VISITS = [
+    {"id": 1, "container": {"name": "MSKU9070323", "size": "40HC"}, "company": {"name": "Узбекистон Темир Йуллари"},
+     "entry_time": "2024-05-01T10:00:00", "exit_time": None, "services": [{"service_type": {"name": "Выгрузка"}}]},
+    {"id": 2, "container": {"name": "MSKU9070323", "size": "40HC"}, "company": {"name": "Interrail"},
+     "entry_time": "2024-06-15T08:30:00", "exit_time": "2024-06-20T12:00:00", "services": []},
+]
+
+
+def test_parse_export_args():
+    visit_filter, export_format = parse_export_args("msku9070323 from=2024-05-01 customer=Uzbek temir format=xlsx")
+    assert visit_filter == VisitFilter(container_name="MSKU9070323", date_from=date(2024, 5, 1),
+                                       customer="Uzbek temir")
+    assert export_format == "xlsx"
+    assert parse_export_args(None) == (VisitFilter(), "csv")
+    with pytest.raises(ValueError):
+        parse_export_args("to=01.05.2024")
+
+
+def test_filters_are_applied_locally():
+    assert [visit["id"] for visit in VISITS if VisitFilter(date_to=date(2024, 5, 31)).matches(visit)] == [1]
+    assert [visit["id"] for visit in VISITS if VisitFilter(customer="узбек").matches(visit)] == [1]
+    assert [visit["id"] for visit in VISITS if VisitFilter(date_from=date(2024, 5, 2)).matches(visit)] == [2]
+
+
+@pytest.mark.asyncio
+async def test_rows_are_written_as_they_arrive(tmp_path):
+    async def rows():
+        for visit in VISITS:
+            yield visit_row(visit)
+
+    path = tmp_path / "visits.csv"
+    assert await write_csv(rows(), str(path)) == 2
+    with open(path, newline="", encoding="utf-8-sig") as file:
+        written = list(csv.reader(file, delimiter=";"))
+    assert written[0] == HEADER
+    assert written[1][:3] == ["1", "MSKU9070323", "40HC"] and written[1][-1] == "Выгрузка"
+
+
+@pytest.mark.asyncio
+async def test_rows_are_written_to_a_workbook(tmp_path):
+    async def rows():
+        for visit in VISITS:
+            yield visit_row(visit)
+
+    path = tmp_path / "visits.xlsx"
+    assert await write_xlsx(rows(), str(path)) == 2
+    workbook = load_workbook(path, read_only=True)
+    written = list(workbook["Визиты"].iter_rows(values_only=True))
+    workbook.close()
+    assert list(written[0]) == HEADER
+    assert written[1][:3] == (1, "MSKU9070323", "40HC") and written[1][-1] == "Выгрузка"
+    assert written[2][6] == "2024-06-20T12:00:00"
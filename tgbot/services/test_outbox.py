@@ -0,0 +1,155 @@
+import asyncio
+
+import pytest
+from aiogram import Dispatcher
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage, SimpleEventIsolation
+
+from infrastructure.api.terminal import terminal_api
+from tgbot.middlewares.ordering import chat_locks
+from tgbot.misc.states import TerminalImport
+from tgbot.services.outbox import OutboxItem, RegistrationOutbox, SQLiteOutboxStore
+
+
+@pytest.mark.asyncio
+async def test_claimed_items_are_leased(tmp_path):
+    store = SQLiteOutboxStore(str(tmp_path / "outbox.sqlite3"))
+    item = OutboxItem(chat_id=1, user_id=2, payload={"container_name": "ABCU1234560"})
+    await store.add(item)
+
+    claimed = await store.claim_due(10, lease=60)
+    assert [claimed_item.id for claimed_item in claimed] == [item.id]
+    assert await store.claim_due(10, lease=60) == []
+
+    # An expired lease makes the item due again.
+    await store.reschedule(claimed[0], delay=0)
+    assert [claimed_item.id for claimed_item in await store.claim_due(10, lease=60)] == [item.id]
+
+
+@pytest.mark.asyncio
+async def test_items_survive_restart(tmp_path):
+    path = str(tmp_path / "outbox.sqlite3")
+    item = OutboxItem(chat_id=1, user_id=2, payload={"container_name": "ABCU1234560"})
+    await SQLiteOutboxStore(path).add(item)
+
+    store = SQLiteOutboxStore(path)
+    assert await store.pending() == 1
+    restored = (await store.claim_due(10, lease=60))[0]
+    assert restored == item
+
+    await store.remove(restored)
+    assert await store.pending() == 0
+
+
+class RecordingBot:
+    id = 42
+
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text):
+        self.sent.append((chat_id, text))
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("status, response, pending, notice", [
+    (409, {"id": 77, "container": {"name": "MSKU9070323"}}, 0, "ID: <b>77</b>"),
+    (409, {"id": 5, "container": {"name": "TGHU1234567"}}, 0, "Не удалось зарегистрировать"),
+    (409, {"detail": "already registered"}, 0, "Не удалось зарегистрировать"),
+    (200, {"id": 77}, 0, "ID: <b>77</b>"),
+    (429, {"detail": "slow down"}, 1, None),
+    (400, {"container_size": ["bad"]}, 0, "Не удалось зарегистрировать"),
+])
+async def test_answers_of_the_api(tmp_path, monkeypatch, status, response, pending, notice):
+    async def register_container(data, idempotency_key=None):
+        return response, status
+
+    monkeypatch.setattr(terminal_api, "register_container", register_container)
+    bot = RecordingBot()
+    outbox = RegistrationOutbox(SQLiteOutboxStore(str(tmp_path / "outbox.sqlite3")))
+    outbox._bot, outbox._dispatcher = bot, Dispatcher(storage=MemoryStorage())
+    item = await outbox.enqueue(1, 2, {"container_name": "MSKU9070323"})
+
+    await outbox._deliver(item)
+    assert await outbox.store.pending() == pending
+    if notice is None:
+        assert bot.sent == [] and outbox.retried == 1
+    else:
+        assert notice in bot.sent[0][1]
+
+
+@pytest.mark.asyncio
+async def test_only_idle_workers_get_items(tmp_path, monkeypatch):
+    release = asyncio.Event()
+    in_flight = 0
+
+    async def register_container(data, idempotency_key=None):
+        nonlocal in_flight
+        in_flight += 1
+        await release.wait()
+        return {"id": 1}, 201
+
+    monkeypatch.setattr(terminal_api, "register_container", register_container)
+    outbox = RegistrationOutbox(SQLiteOutboxStore(str(tmp_path / "outbox.sqlite3")), workers=2, poll_interval=0.01)
+    for _ in range(5):
+        await outbox.enqueue(1, 2, {"container_name": "MSKU9070323"})
+    await outbox.start(RecordingBot(), Dispatcher(storage=MemoryStorage()))
+    try:
+        await asyncio.sleep(0.2)
+        # Two items are being delivered; the other three stay due in the store instead of waiting out
+        # their lease in memory.
+        assert in_flight == 2
+        assert len(await outbox.store.claim_due(10, lease=60)) == 3
+    finally:
+        release.set()
+        await outbox.stop()
+
+
+@pytest.mark.asyncio
+async def test_success_waits_for_the_update_running_in_the_chat(tmp_path, monkeypatch):
+    async def register_container(data, idempotency_key=None):
+        return {"id": 77}, 201
+
+    monkeypatch.setattr(terminal_api, "register_container", register_container)
+    storage = MemoryStorage()
+    outbox = RegistrationOutbox(SQLiteOutboxStore(str(tmp_path / "outbox.sqlite3")))
+    outbox._bot, outbox._dispatcher = RecordingBot(), Dispatcher(storage=storage)
+    item = await outbox.enqueue(1, 2, {"container_name": "MSKU9070323"})
+    state = FSMContext(storage=storage, key=StorageKey(bot_id=RecordingBot.id, chat_id=1, user_id=2))
+
+    await chat_locks.acquire(1)
+    delivery = asyncio.create_task(outbox._deliver(item))
+    await asyncio.sleep(0.05)
+    # The update holding the chat starts a new order; the outbox must not put the chat into the photo step.
+    await state.set_state(TerminalImport.request_type)
+    chat_locks.release(1)
+    await delivery
+
+    assert await state.get_state() == TerminalImport.request_type.state
+    assert await state.get_data() == {}
+
+
+@pytest.mark.asyncio
+async def test_success_waits_for_the_update_running_in_another_process(tmp_path, monkeypatch):
+    async def register_container(data, idempotency_key=None):
+        return {"id": 77}, 201
+
+    monkeypatch.setattr(terminal_api, "register_container", register_container)
+    storage = MemoryStorage()
+    # Stands in for the Redis isolation shared by the bot processes: the chat lock of this process is free.
+    isolation = SimpleEventIsolation()
+    outbox = RegistrationOutbox(SQLiteOutboxStore(str(tmp_path / "outbox.sqlite3")))
+    outbox._bot, outbox._dispatcher = RecordingBot(), Dispatcher(storage=storage, events_isolation=isolation)
+    item = await outbox.enqueue(1, 2, {"container_name": "MSKU9070323"})
+    key = StorageKey(bot_id=RecordingBot.id, chat_id=1, user_id=2)
+    state = FSMContext(storage=storage, key=key)
+
+    async with isolation.lock(key):
+        delivery = asyncio.create_task(outbox._deliver(item))
+        await asyncio.sleep(0.05)
+        await state.set_state(TerminalImport.request_type)
+    await delivery
+
+    assert await state.get_state() == TerminalImport.request_type.state
+    assert await state.get_data() == {}
@@ -0,0 +1,125 @@
+import asyncio
+import io
+
+import pytest
+from openpyxl import Workbook
+
+from infrastructure.api.terminal import terminal_api
+from tgbot.services.containers import active_containers
+from tgbot.services.outbox import registration_outbox
+from tgbot.services.train import normalize_size, parse_csv, parse_text, parse_xlsx, register_train
+from tgbot.utils.validators import check_digit
+
+SHARED = {"container_state": "empty", "customer_id": 7, "container_owner": "MSC", "transport_type": "wagon",
+          "date": "2024-05-01", "selected_services": [3, 4]}
+
+
+def test_sizes_are_normalized():
+    assert normalize_size("40 hc") == normalize_size("40'HC") == "40HC"
+    assert normalize_size("20") == "20"
+    assert normalize_size("30") is None
+
+
+def test_pasted_list():
+    rows = parse_text("MSKU9070323 40hc 64512345\n\ncsqu3054383, 20, 64512346, ХЛОПОК\nCSQU3054383 20 1\n"
+                      "TGHU1234560 40 2\nTGHU1234567 30 3\nTGHU1234567\n")
+    assert [(row.container_name, row.container_size, row.wagon_number) for row in rows[:2]] == [
+        ("MSKU9070323", "40HC", "64512345"), ("CSQU3054383", "20", "64512346")]
+    assert rows[1].product_name == "ХЛОПОК"
+    assert [row.error for row in rows[2:]] == [
+        "повторяется в списке",
+        "неверная контрольная цифра, ожидалась 7",
+        "неизвестный размер «30», допустимы 20, 20HC, 40, 40HC, 45",
+        "повторяется в списке",
+    ]
+
+
+def test_csv_with_header():
+    content = "Контейнер;Размер;Вагон\nMSKU9070323;40HC;64512345\nCSQU3054383;20;64512346\n".encode("utf-8-sig")
+    rows = parse_csv(content)
+    assert [(row.line, row.container_name, row.error) for row in rows] == [
+        (2, "MSKU9070323", None), (3, "CSQU3054383", None)]
+
+
+def test_xlsx_with_header_and_product_column():
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(["Контейнер", "Размер", "Вагон", "Продукт"])
+    sheet.append(["MSKU9070323", "40HC", 64512345])
+    sheet.append([])
+    sheet.append(["csqu3054383", 20, "64512346", "Хлопок"])
+    content = io.BytesIO()
+    workbook.save(content)
+
+    rows = parse_xlsx(content.getvalue())
+    assert [(row.line, row.container_name, row.container_size, row.wagon_number, row.product_name, row.error)
+            for row in rows] == [(2, "MSKU9070323", "40HC", "64512345", "", None),
+                                 (4, "CSQU3054383", "20", "64512346", "Хлопок", None)]
+
+
+@pytest.mark.asyncio
+async def test_rows_are_registered_with_bounded_concurrency(monkeypatch):
+    in_flight = 0
+    peak = 0
+
+    async def register_container(data, idempotency_key=None):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        if data["container_name"] == "CSQU3054383":
+            return {"detail": "bad"}, 400
+        return {"id": int(data["transport_number"])}, 201
+
+    async def find_active(names, concurrency=8):
+        return {"TGHU1234567"}
+
+    monkeypatch.setattr(terminal_api, "register_container", register_container)
+    monkeypatch.setattr(active_containers, "find_active", find_active)
+    rows = parse_text("\n".join(f"{number} 40 {wagon}" for number, wagon in [
+        ("MSKU9070323", 1), ("CSQU3054383", 2), ("TGHU1234567", 3), ("TGHU1234560", 4)]))
+    numbers = [f"MSCU{serial:06d}" for serial in range(100, 110)]
+    rows += parse_text("\n".join(f"{number}{check_digit(number)} 20 {wagon}"
+                                  for wagon, number in enumerate(numbers, start=5)))
+
+    await register_train(rows, SHARED, chat_id=1, user_id=1, concurrency=2)
+    assert [(row.status, row.result) for row in rows] == [
+        ("created", "ID 1"), ("rejected", "отклонён (HTTP 400)"), ("exists", "уже на терминале"),
+        ("invalid", "неверная контрольная цифра, ожидалась 7")] + [("created", f"ID {wagon}") for wagon in range(5, 15)]
+    assert peak == 2
+
+
+@pytest.mark.asyncio
+async def test_answers_are_classified_like_the_outbox_does(monkeypatch):
+    answers = {
+        "1": ({}, 201),
+        "2": ({"id": 8, "container": {"name": "CSQU3054383"}}, 409),
+        "3": ({"id": 9, "container": {"name": "ABCU0000001"}}, 409),
+        "4": ({"detail": "slow down"}, 429),
+    }
+    queued = []
+
+    async def register_container(data, idempotency_key=None):
+        if data["transport_number"] == "5":
+            raise RuntimeError("unexpected body")
+        return answers[data["transport_number"]]
+
+    async def enqueue(chat_id, user_id, payload, item_id=None):
+        queued.append((payload["container_name"], item_id))
+
+    async def find_active(names, concurrency=8):
+        return set()
+
+    monkeypatch.setattr(terminal_api, "register_container", register_container)
+    monkeypatch.setattr(registration_outbox, "enqueue", enqueue)
+    monkeypatch.setattr(active_containers, "find_active", find_active)
+    numbers = [f"{number}{check_digit(number)}" for number in ("MSKU907032", "CSQU305438", "TGHU123456",
+                                                                "MSCU100000", "MSCU100001")]
+    rows = parse_text("\n".join(f"{number} 40 {wagon}" for wagon, number in enumerate(numbers, start=1)))
+
+    await register_train(rows, SHARED, chat_id=1, user_id=1)
+    assert [(row.status, row.result) for row in rows] == [
+        ("created", "создан"), ("created", "ID 8"), ("rejected", "отклонён (HTTP 409)"),
+        ("queued", "в очереди на отправку"), ("failed", "ошибка, попробуйте ещё раз")]
+    assert [name for name, _ in queued] == [numbers[3]] and queued[0][1]
@@ -0,0 +1,164 @@
+import asyncio
+import csv
+import io
+import logging
+import re
+import uuid
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from openpyxl import load_workbook
+
+from infrastructure.api.exceptions import TerminalAPIUnavailable
+from infrastructure.api.terminal import terminal_api
+from tgbot.services.audit import audit_log
+from tgbot.services.containers import active_containers
+from tgbot.services.outbox import registration_outbox, registration_outcome
+from tgbot.utils.validators import check_container_number
+
+CONTAINER_SIZES = ("20", "20HC", "40", "40HC", "45")
+SIZE_RE = re.compile(r"[\s'\"`’-]+")
+CELL_SEPARATORS_RE = re.compile(r"[\s,;]+")
+
+
+def normalize_size(size: str) -> Optional[str]:
+    """Size as the terminal spells it ("40 hc" and "40'HC" become "40HC"), None for sizes it does not know."""
+    size = SIZE_RE.sub("", size).upper()
+    return size if size in CONTAINER_SIZES else None
+
+
+@dataclass
+class TrainRow:
+    """One container of a train: a line of the pasted list or a row of the uploaded table."""
+
+    line: int
+    container_name: str
+    container_size: str = ""
+    wagon_number: str = ""
+    product_name: str = ""
+    error: Optional[str] = None
+    status: str = "pending"
+    result: str = ""
+
+    def payload(self, shared: dict) -> dict:
+        return {
+            "container_size": self.container_size,
+            "container_name": self.container_name,
+            "container_state": shared['container_state'],
+            "product_name": self.product_name,
+            "company_id": shared['customer_id'],
+            "container_owner": shared['container_owner'],
+            "transport_type": shared['transport_type'],
+            "transport_number": self.wagon_number,
+            "entry_time": shared['date'],
+            "services": [{"id": service_id} for service_id in shared['selected_services']],
+        }
+
+
+def build_rows(records: Iterable[list[str]]) -> list[TrainRow]:
+    """
+    Turn records of (container, size, wagon[, product]) into checked rows.
+
+    A first record that does not start with a container number is taken for a header and skipped.
+    """
+    rows = []
+    seen = set()
+    for line, cells in enumerate(records, start=1):
+        cells = [str(cell).strip() if cell is not None else "" for cell in cells]
+        if not any(cells):
+            continue
+        check = check_container_number(cells[0])
+        if line == 1 and not check.valid and not any(char.isdigit() for char in cells[0]):
+            continue
+        cells += [""] * (4 - len(cells))
+        row = TrainRow(line=line, container_name=check.number, wagon_number=cells[2], product_name=cells[3])
+        size = normalize_size(cells[1])
+        if not check.valid:
+            row.error = check.error
+        elif check.number in seen:
+            row.error = "повторяется в списке"
+        elif size is None:
+            row.error = f"неизвестный размер «{cells[1]}», допустимы {', '.join(CONTAINER_SIZES)}"
+        elif not row.wagon_number:
+            row.error = "не указан номер вагона"
+        row.container_size = size or cells[1]
+        seen.add(check.number)
+        rows.append(row)
+    return rows
+
+
+def parse_text(text: str) -> list[TrainRow]:
+    """A pasted list, one container per line: number, size and wagon separated by spaces, commas or tabs."""
+    return build_rows(CELL_SEPARATORS_RE.split(line.strip(), maxsplit=3) for line in text.splitlines())
+
+
+def parse_csv(content: bytes) -> list[TrainRow]:
+    text = content.decode("utf-8-sig", errors="replace")
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    return build_rows(csv.reader(io.StringIO(text), dialect))
+
+
+def parse_xlsx(content: bytes) -> list[TrainRow]:
+    """First sheet of a workbook, read with the same rules as a CSV file."""
+    workbook = load_workbook(io.BytesIO(content), read_only=True, data_only=True)
+    try:
+        return build_rows(list(row) for row in workbook.worksheets[0].iter_rows(values_only=True))
+    finally:
+        workbook.close()
+
+
+async def register_train(rows: list[TrainRow], shared: dict, chat_id: int, user_id: int,
+                         concurrency: int = 8) -> list[TrainRow]:
+    """
+    Register the valid rows with at most concurrency requests in flight and record the outcome on each row.
+
+    Containers already at the terminal are skipped. Answers are classified like the outbox does; rows the API
+    could not be reached for or asked to retry later are handed to the registration outbox under the same
+    idempotency key, so they are still delivered exactly once. A failure of one row does not stop the others.
+    """
+    valid = [row for row in rows if row.error is None]
+    present = await active_containers.find_active((row.container_name for row in valid), concurrency=concurrency)
+    slots = asyncio.Semaphore(concurrency)
+
+    async def hand_to_outbox(row: TrainRow, payload: dict, key: str, reason: str) -> None:
+        logging.warning(f"Train row {row.container_name} not delivered ({reason}), handing it to the outbox")
+        await registration_outbox.enqueue(chat_id, user_id, payload, item_id=key)
+        row.status, row.result = "queued", "в очереди на отправку"
+
+    async def register(row: TrainRow) -> None:
+        payload = row.payload(shared)
+        key = uuid.uuid4().hex
+        try:
+            async with slots:
+                try:
+                    response, status = await terminal_api.register_container(payload, idempotency_key=key)
+                except TerminalAPIUnavailable as e:
+                    await hand_to_outbox(row, payload, key, str(e))
+                    return
+            outcome = registration_outcome(status, response, payload, key)
+            if outcome == "retry":
+                await hand_to_outbox(row, payload, key, f"HTTP {status}")
+            elif outcome == "created":
+                active_containers.add([row.container_name])
+                container_id = (response or {}).get('id')
+                row.status, row.result = "created", f"ID {container_id}" if container_id is not None else "создан"
+                audit_log.emit("container_registered", {"bulk": True, "response": response},
+                               chat_id=chat_id, user_id=user_id)
+            else:
+                row.status, row.result = "rejected", f"отклонён (HTTP {status})"
+                audit_log.emit("container_rejected", {"bulk": True, "status": status, "response": response,
+                                                      "payload": payload}, chat_id=chat_id, user_id=user_id)
+        except Exception:
+            logging.exception(f"Train row {row.container_name} failed")
+            row.status, row.result = "failed", "ошибка, попробуйте ещё раз"
+
+    for row in rows:
+        if row.error is not None:
+            row.status, row.result = "invalid", row.error
+        elif row.container_name in present:
+            row.status, row.result = "exists", "уже на терминале"
+    await asyncio.gather(*(register(row) for row in valid if row.container_name not in present))
+    return rows
@@ -0,0 +1,214 @@
+import asyncio
+import logging
+import multiprocessing
+import signal
+import time
+from multiprocessing.sharedctypes import Synchronized
+from typing import Any, Callable, Dict, Optional
+
+from aiogram import Bot, Dispatcher
+from aiohttp import web
+
+from tgbot.config import WebhookConfig
+
+# spawn, not fork: workers are started from inside a running event loop, which must not be copied.
+mp = multiprocessing.get_context("spawn")
+
+WorkerTarget = Callable[[int, Any, Synchronized], None]
+
+
+def update_chat_id(update: Dict[str, Any]) -> int:
+    """Chat an update belongs to: the chat of the message, else the user, else the update id."""
+    for name, event in update.items():
+        if not isinstance(event, dict):
+            continue
+        message = event.get("message") if name == "callback_query" else event
+        if isinstance(message, dict) and isinstance(message.get("chat"), dict):
+            return message["chat"]["id"]
+        if isinstance(event.get("from"), dict):
+            return event["from"]["id"]
+    return update.get("update_id", 0)
+
+
+async def consume_updates(dp: Dispatcher, bot: Bot, updates, processed: Synchronized,
+                          max_concurrent_updates: int) -> None:
+    """
+    Worker side: feed the updates from the supervisor queue into the dispatcher until the stop sentinel.
+
+    Updates of different chats run concurrently (at most max_concurrent_updates), updates of one chat
+    run one after another in the order they arrived.
+    """
+    workflow_data = {"dispatcher": dp, "bots": [bot], **dp.workflow_data}
+    await dp.emit_startup(bot=bot, **workflow_data)
+    slots = asyncio.Semaphore(max_concurrent_updates)
+    # Bounds the updates taken off the queue but not finished yet, including those waiting for their chat.
+    backlog = asyncio.Semaphore(max_concurrent_updates * 10)
+    tails: Dict[int, asyncio.Task] = {}
+
+    async def process(update: Dict[str, Any], previous: Optional[asyncio.Task]) -> None:
+        try:
+            # Wait for the chat's turn before taking a slot, so updates queued behind a busy chat do not
+            # hold slots that other chats could use.
+            if previous:
+                await asyncio.wait([previous])
+            async with slots:
+                await dp.feed_raw_update(bot, update, **workflow_data)
+        except Exception:
+            logging.exception(f"Update {update.get('update_id')} failed")
+        finally:
+            with processed.get_lock():
+                processed.value += 1
+            backlog.release()
+
+    def forget(chat_id: int, task: asyncio.Task) -> None:
+        if tails.get(chat_id) is task:
+            del tails[chat_id]
+
+    try:
+        while True:
+            await backlog.acquire()
+            update = await asyncio.to_thread(updates.get)
+            if update is None:
+                break
+            chat_id = update_chat_id(update)
+            task = asyncio.create_task(process(update, tails.get(chat_id)))
+            tails[chat_id] = task
+            task.add_done_callback(lambda done, chat_id=chat_id: forget(chat_id, done))
+        if tails:
+            await asyncio.wait(list(tails.values()))
+    finally:
+        await dp.emit_shutdown(bot=bot, **workflow_data)
+
+
+def _worker_process(target: WorkerTarget, index: int, updates, processed: Synchronized) -> None:
+    # Ctrl+C reaches the whole process group; workers stop on the supervisor's sentinel instead.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    target(index, updates, processed)
+
+
+class WorkerHandle:
+    """A worker process with its own update queue. The queue outlives restarts of the process."""
+
+    def __init__(self, index: int, target: WorkerTarget):
+        self.index = index
+        self.target = target
+        self.updates = mp.Queue()
+        self.processed = mp.Value("q", 0)
+        self.routed = 0
+        self.restarts = 0
+        self.process: Optional[multiprocessing.process.BaseProcess] = None
+
+    def start(self) -> None:
+        self.process = mp.Process(target=_worker_process, name=f"bot-worker-{self.index}",
+                                  args=(self.target, self.index, self.updates, self.processed), daemon=True)
+        self.process.start()
+
+    @property
+    def depth(self) -> int:
+        """Updates waiting in the queue of this worker."""
+        try:
+            return self.updates.qsize()
+        except NotImplementedError:  # macOS
+            return self.routed - self.processed.value
+
+    def metrics(self) -> dict:
+        return {
+            "pid": self.process.pid if self.process else None,
+            "alive": bool(self.process and self.process.is_alive()),
+            "queue_depth": self.depth,
+            "routed": self.routed,
+            "processed": self.processed.value,
+            "restarts": self.restarts,
+        }
+
+
+class Supervisor:
+    """
+    Receives webhook updates and hands each one to a worker process chosen by its chat id, so a chat
+    always lands on the same worker and its FSM updates stay in order. Workers share state through Redis.
+
+    Crashed workers are started again; updates the crashed process had already taken are lost.
+    """
+
+    def __init__(self, bot: Bot, config: WebhookConfig, target: WorkerTarget, workers: int,
+                 monitor_interval: float = 1.0, report_interval: float = 60.0):
+        self.bot = bot
+        self.config = config
+        self.workers = [WorkerHandle(index, target) for index in range(workers)]
+        self.monitor_interval = monitor_interval
+        self.report_interval = report_interval
+        self.stopping = False
+
+    def route(self, update: Dict[str, Any]) -> WorkerHandle:
+        worker = self.workers[update_chat_id(update) % len(self.workers)]
+        worker.routed += 1
+        worker.updates.put(update)
+        return worker
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        if self.stopping:
+            return web.Response(status=503)
+        if self.config.secret_token and \
+                request.headers.get("X-Telegram-Bot-Api-Secret-Token") != self.config.secret_token:
+            return web.Response(status=401, text="Unauthorized")
+        self.route(await request.json())
+        return web.Response()
+
+    async def health(self, request: web.Request) -> web.Response:
+        workers = [worker.metrics() for worker in self.workers]
+        healthy = not self.stopping and all(worker["alive"] for worker in workers)
+        return web.json_response({"status": "ok" if healthy else "degraded", "workers": workers},
+                                 status=200 if healthy else 503)
+
+    async def monitor(self) -> None:
+        last_report = time.monotonic()
+        while not self.stopping:
+            for worker in self.workers:
+                if not worker.process.is_alive() and not self.stopping:
+                    logging.error(f"Worker {worker.index} exited with code {worker.process.exitcode}, restarting")
+                    worker.restarts += 1
+                    worker.start()
+            if time.monotonic() - last_report >= self.report_interval:
+                last_report = time.monotonic()
+                logging.info("Worker queue depth: " + ", ".join(
+                    f"#{worker.index}={worker.depth}" for worker in self.workers))
+            await asyncio.sleep(self.monitor_interval)
+
+    async def stop(self, timeout: float = 30.0) -> None:
+        """Let every worker finish its queue, then stop it; workers still running after timeout are killed."""
+        self.stopping = True
+        for worker in self.workers:
+            worker.updates.put(None)
+        deadline = time.monotonic() + timeout
+        for worker in self.workers:
+            await asyncio.to_thread(worker.process.join, max(0.0, deadline - time.monotonic()))
+            if worker.process.is_alive():
+                logging.warning(f"Worker {worker.index} did not stop in time, terminating")
+                worker.process.terminate()
+
+    async def run(self) -> None:
+        """Start the workers and serve the webhook until cancelled."""
+        for worker in self.workers:
+            worker.start()
+
+        app = web.Application()
+        app.router.add_post(self.config.path, self.handle_update)
+        app.router.add_get("/health", self.health)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, host=self.config.host, port=self.config.port).start()
+        await self.bot.set_webhook(
+            url=f"{self.config.url.rstrip('/')}{self.config.path}",
+            secret_token=self.config.secret_token,
+            max_connections=self.config.max_connections,
+        )
+        logging.info(f"Supervisor listening on {self.config.host}:{self.config.port}{self.config.path} "
+                     f"with {len(self.workers)} workers")
+        monitor = asyncio.create_task(self.monitor())
+        try:
+            await asyncio.Event().wait()
+        finally:
+            self.stopping = True
+            monitor.cancel()
+            await runner.cleanup()
+            await self.stop()
@@ -0,0 +1,59 @@
+import asyncio
+import multiprocessing
+import queue
+
+import pytest
+
+from tgbot.supervisor import consume_updates, update_chat_id
+
+
+def test_update_chat_id():
+    message = {"update_id": 1, "message": {"message_id": 1, "chat": {"id": -100500}, "from": {"id": 42}}}
+    callback = {"update_id": 2, "callback_query": {"id": "1", "from": {"id": 42},
+                                                   "message": {"message_id": 1, "chat": {"id": -100500}}}}
+    inline = {"update_id": 3, "inline_query": {"id": "1", "from": {"id": 42}, "query": ""}}
+
+    assert update_chat_id(message) == -100500
+    assert update_chat_id(callback) == -100500
+    assert update_chat_id(inline) == 42
+    assert update_chat_id({"update_id": 4}) == 4
+
+
+class BlockingDispatcher:
+    """Feeds updates by recording them; updates of chat 1 block until released."""
+
+    workflow_data = {}
+
+    def __init__(self):
+        self.started = []
+        self.release = asyncio.Event()
+
+    async def emit_startup(self, **kwargs):
+        pass
+
+    async def emit_shutdown(self, **kwargs):
+        pass
+
+    async def feed_raw_update(self, bot, update, **kwargs):
+        self.started.append(update["update_id"])
+        if update["message"]["chat"]["id"] == 1:
+            await self.release.wait()
+
+
+@pytest.mark.asyncio
+async def test_busy_chat_does_not_hold_the_slots_of_other_chats():
+    dp = BlockingDispatcher()
+    updates = queue.Queue()
+    for update_id, chat_id in [(1, 1), (2, 1), (3, 1), (4, 2)]:
+        updates.put({"update_id": update_id, "message": {"message_id": update_id, "chat": {"id": chat_id}}})
+    processed = multiprocessing.Value("q", 0)
+
+    consumer = asyncio.create_task(consume_updates(dp, None, updates, processed, max_concurrent_updates=2))
+    await asyncio.sleep(0.3)
+    # Updates 2 and 3 wait for update 1 of their chat without taking a slot, so chat 2 gets one.
+    assert dp.started == [1, 4]
+
+    dp.release.set()
+    updates.put(None)
+    await consumer
+    assert dp.started == [1, 4, 2, 3] and processed.value == 4
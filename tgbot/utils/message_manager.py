@@ -1,8 +1,26 @@
+import hashlib
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 from typing import Union, Optional
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup
 from aiogram.fsm.context import FSMContext
 
+# Number of messages whose last rendering is remembered.
+RENDERED_CACHE_SIZE = 10_000
+
+# Edits requested inside the running batch, by (chat_id, message_id), waiting to be sent at its end.
+_pending_edits: ContextVar[Optional[dict]] = ContextVar("pending_edits", default=None)
+
+
 class MessageManager:
+    def __init__(self):
+        self._rendered: OrderedDict[tuple, str] = OrderedDict()
+        self.edits = 0
+        self.skipped = 0
+        self.coalesced = 0
+
     async def get_current_message(self, state: FSMContext) -> str:
         """Get formatted current message from state data."""
         data = await state.get_data()
@@ -39,6 +57,68 @@ class MessageManager:
         full_message = f"{current_message}\n\n<b>{additional_text}</b>".strip()
 
         if isinstance(message, Message):
-            await message.answer(full_message, parse_mode="HTML", reply_markup=reply_markup)
+            sent = await message.answer(full_message, parse_mode="HTML", reply_markup=reply_markup)
+            self._remember(sent, self._fingerprint(full_message, reply_markup))
         elif isinstance(message, CallbackQuery):
-            await message.message.edit_text(full_message, parse_mode="HTML", reply_markup=reply_markup)
+            pending = _pending_edits.get()
+            if pending is None:
+                await self.edit(message.message, full_message, reply_markup)
+                return
+            key = (message.message.chat.id, message.message.message_id)
+            if key in pending:
+                self.coalesced += 1
+            pending[key] = (message.message, full_message, reply_markup)
+
+    async def edit(self, message: Message, text: str, reply_markup: Optional[InlineKeyboardMarkup] = None):
+        """Edit the message, unless it already shows exactly this text and keyboard."""
+        fingerprint = self._fingerprint(text, reply_markup)
+        key = (message.chat.id, message.message_id)
+        if self._rendered.get(key) == fingerprint:
+            self.skipped += 1
+            return
+        try:
+            await message.edit_text(text, parse_mode="HTML", reply_markup=reply_markup)
+        except TelegramBadRequest as e:
+            # Rendered by another process or before a restart; the message is as we want it anyway.
+            if "message is not modified" not in e.message:
+                raise
+            self.skipped += 1
+        else:
+            self.edits += 1
+        self._remember(message, fingerprint)
+
+    @asynccontextmanager
+    async def batch(self):
+        """
+        Hold back edits made inside the block and send only the last one per message when it ends.
+        If the block raises, the held edits are dropped and the exception propagates unchanged.
+        """
+        if _pending_edits.get() is not None:
+            yield
+            return
+        pending = {}
+        token = _pending_edits.set(pending)
+        try:
+            yield
+        finally:
+            _pending_edits.reset(token)
+        for message, text, reply_markup in pending.values():
+            await self.edit(message, text, reply_markup)
+
+    @staticmethod
+    def _fingerprint(text: str, reply_markup: Optional[InlineKeyboardMarkup]) -> str:
+        markup = reply_markup.model_dump_json(exclude_none=True) if reply_markup else ""
+        return hashlib.blake2b(f"{text}\0{markup}".encode(), digest_size=16).hexdigest()
+
+    def _remember(self, message: Message, fingerprint: str):
+        key = (message.chat.id, message.message_id)
+        self._rendered[key] = fingerprint
+        self._rendered.move_to_end(key)
+        if len(self._rendered) > RENDERED_CACHE_SIZE:
+            self._rendered.popitem(last=False)
+
+    def metrics(self) -> dict:
+        return {"edits": self.edits, "skipped_unchanged": self.skipped, "coalesced": self.coalesced}
+
+
+message_manager = MessageManager()
@@ -0,0 +1,74 @@
+import re
+from collections import defaultdict
+
+CYRILLIC_TO_LATIN = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'yo', 'ж': 'j', 'з': 'z', 'и': 'i',
+    'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't',
+    'у': 'u', 'ф': 'f', 'х': 'x', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sh', 'ъ': '', 'ы': 'i', 'ь': '',
+    'э': 'e', 'ю': 'yu', 'я': 'ya', 'ў': 'o', 'қ': 'q', 'ғ': 'g', 'ҳ': 'h',
+}
+# Latin spellings that the transliteration above produces differently, e.g. "Xorazm" vs "Хорезм" -> "xorezm".
+LATIN_ALIASES = (('kh', 'x'), ('h', 'x'), ('c', 'ts'), ('w', 'v'))
+
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+_APOSTROPHES = re.compile(r"[‘’ʻʼ`']")
+
+
+def fold(text: str) -> str:
+    """Reduce a Cyrillic or Latin name to lowercase ASCII words so both scripts compare equal."""
+    text = _APOSTROPHES.sub('', text.lower())
+    text = ''.join(CYRILLIC_TO_LATIN.get(char, char) for char in text)
+    for source, target in LATIN_ALIASES:
+        text = text.replace(source, target)
+    return _NON_WORD.sub(' ', text).strip()
+
+
+def trigrams(text: str) -> set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class CustomerIndex:
+    """
+    In-memory prefix and trigram index over customer names.
+
+    A query matches by word prefixes first ("uzb tra" -> "Uzbekistan Trans"), and falls back to
+    trigram similarity to tolerate typos.
+    """
+
+    def __init__(self, items: list[dict], max_prefix: int = 12, min_similarity: float = 0.35):
+        self.items = items
+        self.min_similarity = min_similarity
+        self.max_prefix = max_prefix
+        self._prefixes: dict[str, set[int]] = defaultdict(set)
+        self._trigrams: dict[str, set[int]] = defaultdict(set)
+
+        for position, item in enumerate(items):
+            folded = fold(item['name'])
+            for word in folded.split():
+                for length in range(1, min(len(word), max_prefix) + 1):
+                    self._prefixes[word[:length]].add(position)
+            for trigram in trigrams(folded):
+                self._trigrams[trigram].add(position)
+
+    def search(self, query: str, limit: int = 10) -> list[dict]:
+        folded = fold(query)
+        if not folded:
+            return []
+
+        matches = None
+        for word in folded.split():
+            positions = self._prefixes.get(word[:self.max_prefix], set())
+            matches = positions if matches is None else matches & positions
+        if matches:
+            return [self.items[position] for position in sorted(matches)[:limit]]
+
+        query_trigrams = trigrams(folded)
+        scores: dict[int, int] = defaultdict(int)
+        for trigram in query_trigrams:
+            for position in self._trigrams.get(trigram, ()):
+                scores[position] += 1
+        threshold = self.min_similarity * len(query_trigrams)
+        ranked = sorted((position for position, score in scores.items() if score >= threshold),
+                        key=lambda position: (-scores[position], position))
+        return [self.items[position] for position in ranked[:limit]]
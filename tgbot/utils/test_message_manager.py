@@ -0,0 +1,66 @@
+import datetime
+from unittest.mock import AsyncMock
+
+import pytest
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import CallbackQuery, Chat, Message, User
+
+from tgbot.keyboards.inline import back_keyboard
+from tgbot.utils.message_manager import MessageManager
+
+
+@pytest.fixture
+def edit_text(monkeypatch):
+    edit_text = AsyncMock()
+    monkeypatch.setattr(Message, "edit_text", edit_text)
+    return edit_text
+
+
+def make_callback():
+    user = User(id=1, is_bot=False, first_name="x")
+    message = Message(message_id=10, date=datetime.datetime.now(), chat=Chat(id=1, type="private"))
+    return CallbackQuery(id="1", from_user=user, chat_instance="1", message=message, data="page_2")
+
+
+@pytest.mark.asyncio
+async def test_unchanged_edit_is_skipped(edit_text):
+    manager = MessageManager()
+    state = FSMContext(MemoryStorage(), StorageKey(bot_id=1, chat_id=1, user_id=1))
+    await state.update_data(container_name="ABCU1234560")
+
+    await manager.update_message(make_callback(), state, "Клиенты:", reply_markup=back_keyboard.as_markup())
+    await manager.update_message(make_callback(), state, "Клиенты:", reply_markup=back_keyboard.as_markup())
+    await manager.update_message(make_callback(), state, "Клиенты:")
+
+    assert edit_text.await_count == 2
+    assert manager.metrics() == {"edits": 2, "skipped_unchanged": 1, "coalesced": 0}
+
+
+@pytest.mark.asyncio
+async def test_edits_in_a_batch_are_coalesced(edit_text):
+    manager = MessageManager()
+    state = FSMContext(MemoryStorage(), StorageKey(bot_id=1, chat_id=1, user_id=1))
+
+    async with manager.batch():
+        await manager.update_message(make_callback(), state, "Первый")
+        await manager.update_message(make_callback(), state, "Второй")
+        assert edit_text.await_count == 0
+
+    edit_text.assert_awaited_once()
+    assert "Второй" in edit_text.await_args.args[0]
+    assert manager.coalesced == 1
+
+
+@pytest.mark.asyncio
+async def test_a_failed_handler_keeps_its_exception_and_its_edits_are_dropped(edit_text):
+    manager = MessageManager()
+    state = FSMContext(MemoryStorage(), StorageKey(bot_id=1, chat_id=1, user_id=1))
+
+    with pytest.raises(KeyError, match="customer_id"):
+        async with manager.batch():
+            await manager.update_message(make_callback(), state, "Клиенты:")
+            raise KeyError("customer_id")
+
+    edit_text.assert_not_awaited()
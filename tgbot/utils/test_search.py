@@ -0,0 +1,31 @@
+from tgbot.utils.search import CustomerIndex, fold
+
+CUSTOMERS = [
+    {'id': 1, 'name': 'Узбекистон Темир Йуллари'},
+    {'id': 2, 'name': 'Uzbekistan Trans Logistic'},
+    {'id': 3, 'name': "O'zbekiston Xorazm Savdo"},
+    {'id': 4, 'name': 'ООО "Хорезм Транс"'},
+    {'id': 5, 'name': 'Interrail Central Asia'},
+]
+
+
+def test_fold_matches_cyrillic_and_latin_spellings():
+    assert fold('Узбекистан') == fold('Uzbekistan')
+    assert fold("O‘zbekiston") == fold("O'zbekiston") == fold('Ozbekiston')
+    assert fold('Хорезм') == fold('Xorezm') == fold('Khorezm')
+
+
+def test_search_by_word_prefixes():
+    index = CustomerIndex(CUSTOMERS)
+    assert [item['id'] for item in index.search('uzb')] == [1, 2]
+    assert [item['id'] for item in index.search('узб тра')] == [2]
+    assert [item['id'] for item in index.search('хорезм')] == [4]
+
+
+def test_search_tolerates_typos():
+    index = CustomerIndex(CUSTOMERS)
+    assert index.search('intrerail')[0]['id'] == 5
+
+
+def test_search_empty_query():
+    assert CustomerIndex(CUSTOMERS).search(' !? ') == []
@@ -0,0 +1,30 @@
+from tgbot.utils.validators import check_container_number, check_digit, parse_container_numbers, \
+    validate_container_number
+
+
+def test_check_digit_of_known_numbers():
+    assert check_digit("CSQU305438") == 3
+    assert check_digit("MSKU907032") == 3
+    # A=10, U=32 (11 and 22 are skipped): 10 + 20 + 40 + 256 = 326, 326 % 11 = 7.
+    assert check_digit("AAAU000000") == 7
+
+
+def test_numbers_are_normalized():
+    assert validate_container_number(" csqu 305438-3 ") == "CSQU3054383"
+    # Cyrillic С and М typed on a Russian layout.
+    assert validate_container_number("СSQU3054383") == "CSQU3054383"
+    assert validate_container_number("мsku9070323") == "MSKU9070323"
+
+
+def test_invalid_numbers_are_explained():
+    assert check_container_number("CSQU3054384").error.startswith("неверная контрольная цифра")
+    assert check_container_number("CSQX3054383").error == "4-я буква должна быть U, J или Z"
+    assert check_container_number("CSQU305438").error == "нужно 11 символов: 4 буквы и 7 цифр"
+    assert validate_container_number("CSQU3054384") is None
+
+
+def test_pasted_list():
+    checks = parse_container_numbers("CSQU3054383\n\n msku 9070323 ;CSQU3054384,\ncsqu3054383\n")
+    assert [check.number for check in checks] == ["CSQU3054383", "MSKU9070323", "CSQU3054384", "CSQU3054383"]
+    assert [check.valid for check in checks] == [True, True, False, False]
+    assert checks[3].error == "повторяется в списке"
@@ -1,11 +1,89 @@
 # utils/validators.py
 import re
+import string
+from dataclasses import dataclass
 from typing import Optional
 
+# ISO 6346: owner code, equipment category (U freight, J detachable equipment, Z trailer), serial, check digit.
+CONTAINER_NUMBER_RE = re.compile(r'^[A-Z]{3}[UJZ]\d{6}\d$')
+SHAPE_RE = re.compile(r'^[A-Z]{4}\d{7}$')
+SEPARATORS_RE = re.compile(r'[\s\-_./]+')
+LIST_SEPARATORS_RE = re.compile(r'[\n,;]+')
+
+# Cyrillic letters that look like Latin ones, typed from a Russian keyboard layout.
+LOOKALIKES = str.maketrans("АВЕКМНОРСТУХавекмнорстух", "ABEKMHOPCTYXABEKMHOPCTYX")
+
+
+def _letter_values() -> dict[str, int]:
+    """Check digit values of letters: from A=10 up, skipping multiples of 11 (B=12, L=23, V=34)."""
+    values = {}
+    value = 10
+    for letter in string.ascii_uppercase:
+        if value % 11 == 0:
+            value += 1
+        values[letter] = value
+        value += 1
+    return values
+
+
+CHAR_VALUES = {**_letter_values(), **{digit: int(digit) for digit in string.digits}}
+
+
+def normalize_container_number(container_number: str) -> str:
+    """Upper case, Cyrillic look-alikes replaced by Latin letters, spaces and separators removed."""
+    return SEPARATORS_RE.sub('', container_number.translate(LOOKALIKES).upper())
+
+
+def check_digit(container_number: str) -> int:
+    """ISO 6346 check digit of the first 10 characters of a normalized container number."""
+    total = sum(CHAR_VALUES[char] << position for position, char in enumerate(container_number[:10]))
+    return total % 11 % 10
+
+
+@dataclass(frozen=True)
+class ContainerNumberCheck:
+    raw: str
+    number: str
+    error: Optional[str] = None
+
+    @property
+    def valid(self) -> bool:
+        return self.error is None
+
+
+def check_container_number(container_number: str) -> ContainerNumberCheck:
+    """Normalize a container number and tell what, if anything, is wrong with it."""
+    number = normalize_container_number(container_number)
+    if not SHAPE_RE.match(number):
+        error = "нужно 11 символов: 4 буквы и 7 цифр"
+    elif not CONTAINER_NUMBER_RE.match(number):
+        error = "4-я буква должна быть U, J или Z"
+    elif int(number[10]) != check_digit(number):
+        error = f"неверная контрольная цифра, ожидалась {check_digit(number)}"
+    else:
+        error = None
+    return ContainerNumberCheck(raw=container_number, number=number, error=error)
+
 
 def validate_container_number(container_number: str) -> Optional[str]:
-    """Validate container number format."""
-    clean_text = re.sub(r'\s+', '', container_number)
-    if re.match(r'^[A-Za-z]{4}\d{7}$', clean_text):
-        return clean_text
-    return None
+    """Validate container number format and check digit. Returns the normalized number."""
+    check = check_container_number(container_number)
+    return check.number if check.valid else None
+
+
+def parse_container_numbers(text: str) -> list[ContainerNumberCheck]:
+    """
+    Check every container number of a pasted list, one per line (commas and semicolons work too).
+    Blank lines are skipped and repeated numbers are reported as errors.
+    """
+    checks = []
+    seen = set()
+    for line in LIST_SEPARATORS_RE.split(text):
+        if not line.strip():
+            continue
+        check = check_container_number(line.strip())
+        if check.valid and check.number in seen:
+            check = ContainerNumberCheck(raw=check.raw, number=check.number, error="повторяется в списке")
+        seen.add(check.number)
+        checks.append(check)
+    return checks
@@ -0,0 +1,96 @@
+import asyncio
+import logging
+from typing import Any, Dict
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from tgbot.config import WebhookConfig
+
+
+class LimitedRequestHandler(SimpleRequestHandler):
+    """
+    Webhook handler that answers Telegram immediately and processes updates in the background,
+    with at most max_concurrent_updates of them running at once.
+
+    On shutdown it stops taking updates and waits up to drain_timeout seconds for the running ones.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, max_concurrent_updates: int,
+                 drain_timeout: float = 30.0, **kwargs: Any):
+        super().__init__(dispatcher=dispatcher, bot=bot, handle_in_background=True, **kwargs)
+        self.semaphore = asyncio.Semaphore(max_concurrent_updates)
+        self.drain_timeout = drain_timeout
+        self.closing = False
+
+    async def _background_feed_update(self, bot: Bot, update: Dict[str, Any]) -> None:
+        async with self.semaphore:
+            await super()._background_feed_update(bot, update)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self.closing:
+            # Telegram keeps the update and delivers it again, possibly to another replica.
+            return web.Response(status=503)
+        return await super().handle(request)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._background_feed_update_tasks)
+
+    async def close(self) -> None:
+        self.closing = True
+        if self._background_feed_update_tasks:
+            logging.info(f"Waiting for {self.in_flight} updates to finish")
+            await asyncio.wait(self._background_feed_update_tasks, timeout=self.drain_timeout)
+        await super().close()
+
+
+def build_webhook_app(dp: Dispatcher, bot: Bot, config: WebhookConfig) -> web.Application:
+    """
+    Build the aiohttp application serving Telegram updates on config.path and a health check on /health.
+
+    :param dp: The dispatcher instance.
+    :param bot: The bot instance.
+    :param config: Webhook settings.
+    :return: aiohttp application.
+    """
+    app = web.Application()
+    handler = LimitedRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        max_concurrent_updates=config.max_concurrent_updates,
+        secret_token=config.secret_token,
+    )
+    handler.register(app, path=config.path)
+
+    async def health(request: web.Request) -> web.Response:
+        status = 503 if handler.closing else 200
+        return web.json_response({"status": "stopping" if handler.closing else "ok",
+                                  "updates_in_flight": handler.in_flight}, status=status)
+
+    app.router.add_get("/health", health)
+
+    async def set_webhook(bot: Bot):
+        await bot.set_webhook(
+            url=f"{config.url.rstrip('/')}{config.path}",
+            secret_token=config.secret_token,
+            max_connections=config.max_connections,
+        )
+
+    dp.startup.register(set_webhook)
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, config: WebhookConfig) -> None:
+    """Serve the webhook application until the task is cancelled, then shut it down gracefully."""
+    runner = web.AppRunner(build_webhook_app(dp, bot, config))
+    await runner.setup()
+    site = web.TCPSite(runner, host=config.host, port=config.port)
+    await site.start()
+    logging.info(f"Webhook server listening on {config.host}:{config.port}{config.path}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()